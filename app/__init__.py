@@ -1,6 +1,6 @@
 from app.config import Settings, get_settings
 from app.crypto import Cryptor
-from app.models import Base, Config, InterceptionRule, Command, RequestLog
+from app.models import Base, Config, InterceptionRule, TacticsTemplate, Command, Device, DeviceMethod, RequestLog
 from app.auth import verify_password, get_password_hash, create_access_token, decode_access_token
 from app.schemas import (
     LoginRequest, LoginResponse, ChangePasswordRequest,
@@ -18,7 +18,7 @@ from app.middleware import ProxyMiddleware, AuthMiddleware
 __all__ = [
     "Settings", "get_settings",
     "Cryptor",
-    "Base", "Config", "InterceptionRule", "Command", "RequestLog",
+    "Base", "Config", "InterceptionRule", "TacticsTemplate", "Command", "Device", "DeviceMethod", "RequestLog",
     "verify_password", "get_password_hash", "create_access_token", "decode_access_token",
     "LoginRequest", "LoginResponse", "ChangePasswordRequest",
     "CreateRuleRequest", "UpdateRuleRequest", "UpdateCommandRequest",
@@ -0,0 +1,246 @@
+import asyncio
+import json
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import Deque, Dict, List, Optional
+
+from app.method_patterns import MethodMatcher, method_pattern_errors
+from app.runtime_config import RuntimeConfig, get_runtime_config
+
+METHOD_LIMITS_KEY = "admission_method_limits"
+# 令牌桶只保留最近活跃的设备，被淘汰的设备回来时按满桶计算
+DEVICE_BUCKETS_MAX = 10000
+HOLD_EWMA_ALPHA = 0.2
+
+RATE_LIMITED = "rate_limited"
+QUEUE_FULL = "queue_full"
+DEADLINE = "deadline"
+TIMEOUT = "timeout"
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, scope: str, retry_after: float):
+        super().__init__(f"Request shed by admission control ({scope}: {reason})")
+        self.reason = reason
+        self.scope = scope
+        self.retry_after = retry_after
+
+
+def parse_method_limits(value: str) -> str:
+    # 配置为 {"方法名或模式": 最大并发数}，方法名模式与规则相同，精确 > 最长前缀 > 其他模式
+    try:
+        limits = json.loads(value) if value.strip() else {}
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Method limits are not valid JSON: {e}")
+    if not isinstance(limits, dict):
+        raise ValueError("Method limits must be an object keyed by method name")
+    for pattern, limit in limits.items():
+        errors = method_pattern_errors(pattern)
+        if errors:
+            raise ValueError(f"Method limit '{pattern}': {errors[0]}")
+        if isinstance(limit, bool) or not isinstance(limit, int) or limit <= 0:
+            raise ValueError(f"Method limit '{pattern}' must be a positive integer")
+    return json.dumps(limits, ensure_ascii=False)
+
+
+class TokenBucket:
+    def __init__(self, tokens: float, now: float):
+        self.tokens = tokens
+        self.updated_at = now
+
+    def take(self, rate: float, burst: float, now: float) -> float:
+        # 取到令牌返回 0，否则返回下一个令牌还需等待的秒数
+        self.tokens = min(burst, self.tokens + (now - self.updated_at) * rate)
+        self.updated_at = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return 0.0
+        return (1.0 - self.tokens) / rate
+
+
+class Gate:
+    # 并发上限加有界 FIFO 等待队列，释放名额时直接交给队首的等待者
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self.limit = limit
+        self.inflight = 0
+        self.waiters: Deque[asyncio.Future] = deque()
+        self.hold: Optional[float] = None
+        self.admitted = 0
+        self.queued = 0
+        self.shed: Dict[str, int] = {}
+
+    def expected_wait(self, position: int) -> Optional[float]:
+        if self.hold is None or not self.limit:
+            return None
+        return self.hold * position / self.limit
+
+    def reject(self, reason: str, expected: Optional[float]) -> AdmissionRejected:
+        self.shed[reason] = self.shed.get(reason, 0) + 1
+        return AdmissionRejected(reason, self.name, expected or self.hold or 1.0)
+
+    async def acquire(self, deadline: float, queue_size: int):
+        if not self.limit or (self.inflight < self.limit and not self.waiters):
+            self.inflight += 1
+            self.admitted += 1
+            return
+        position = len(self.waiters) + 1
+        expected = self.expected_wait(position)
+        if len(self.waiters) >= queue_size:
+            raise self.reject(QUEUE_FULL, expected)
+        remaining = deadline - time.monotonic()
+        # 按平均占用时间估算排到的时间，赶不上截止时间的请求不再排队，直接快速失败
+        if remaining <= 0 or (expected is not None and expected > remaining):
+            raise self.reject(DEADLINE, expected)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        self.queued += 1
+        try:
+            await asyncio.wait_for(waiter, remaining)
+        except asyncio.TimeoutError:
+            self._discard(waiter)
+            raise self.reject(TIMEOUT, self.expected_wait(len(self.waiters) + 1))
+        except asyncio.CancelledError:
+            # 取消的同时可能已经拿到名额，需要归还
+            if waiter.done() and not waiter.cancelled():
+                self.release(None)
+            else:
+                self._discard(waiter)
+            raise
+
+    def _discard(self, waiter: asyncio.Future):
+        try:
+            self.waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def release(self, held: Optional[float]):
+        if held is not None:
+            self.hold = held if self.hold is None else self.hold + HOLD_EWMA_ALPHA * (held - self.hold)
+        self.inflight -= 1
+        self.wake()
+
+    def wake(self):
+        while self.waiters and (not self.limit or self.inflight < self.limit):
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                self.inflight += 1
+                self.admitted += 1
+                waiter.set_result(None)
+
+    def snapshot(self) -> dict:
+        return {
+            "limit": self.limit,
+            "inflight": self.inflight,
+            "waiting": len(self.waiters),
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "shed": dict(self.shed),
+            "avg_hold_ms": round(self.hold * 1000, 2) if self.hold is not None else None,
+        }
+
+
+class AdmissionController:
+    def __init__(self, runtime: RuntimeConfig):
+        self.runtime = runtime
+        self.gate = Gate("global", runtime.get("admission_max_inflight"))
+        self.method_gates: Dict[str, Gate] = {}
+        self.matcher: MethodMatcher[Gate] = MethodMatcher()
+        self.buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self.admitted = 0
+        self.shed: Dict[str, int] = {}
+        self.load_method_limits()
+
+    def load_method_limits(self):
+        limits = json.loads(self.runtime.get(METHOD_LIMITS_KEY) or "{}")
+        gates: Dict[str, Gate] = {}
+        matcher: MethodMatcher[Gate] = MethodMatcher()
+        for pattern, limit in limits.items():
+            gate = self.method_gates.get(pattern) or Gate(pattern, limit)
+            gate.limit = limit
+            gates[pattern] = gate
+            matcher.add(pattern, gate)
+        # 删除的上限不再限制，放行仍在排队的请求
+        for pattern, gate in self.method_gates.items():
+            if pattern not in gates:
+                gate.limit = 0
+        for gate in list(self.method_gates.values()) + list(gates.values()):
+            gate.wake()
+        self.method_gates, self.matcher = gates, matcher
+
+    def on_config_change(self, changed: Dict[str, str], raw: Dict[str, str]):
+        if "admission_max_inflight" in changed:
+            self.gate.limit = self.runtime.get("admission_max_inflight")
+            self.gate.wake()
+        if METHOD_LIMITS_KEY in changed:
+            self.load_method_limits()
+
+    def check_rate(self, email: Optional[str], now: float):
+        rate = self.runtime.get("admission_device_rate")
+        if not email or not rate:
+            return
+        burst = max(1, self.runtime.get("admission_device_burst"))
+        bucket = self.buckets.get(email)
+        if bucket is None:
+            bucket = self.buckets[email] = TokenBucket(burst, now)
+            if len(self.buckets) > DEVICE_BUCKETS_MAX:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(email)
+        wait = bucket.take(rate, burst, now)
+        if wait:
+            raise AdmissionRejected(RATE_LIMITED, "device", wait)
+
+    @asynccontextmanager
+    async def admit(self, method: str, email: Optional[str]):
+        now = time.monotonic()
+        deadline = now + self.runtime.get("admission_queue_timeout_ms") / 1000
+        queue_size = self.runtime.get("admission_queue_size")
+        gates: List[Gate] = self.matcher.resolve(method or "")[:1] + [self.gate]
+        acquired: List[Gate] = []
+        try:
+            self.check_rate(email, now)
+            # 先占方法名额再占全局名额，热点方法在自己的队列里等待，不占用全局名额
+            for gate in gates:
+                await gate.acquire(deadline, queue_size)
+                acquired.append(gate)
+        except AdmissionRejected as e:
+            for gate in acquired:
+                gate.release(None)
+            self.shed[e.reason] = self.shed.get(e.reason, 0) + 1
+            raise
+        except BaseException:
+            for gate in acquired:
+                gate.release(None)
+            raise
+        self.admitted += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            held = time.monotonic() - started
+            for gate in reversed(acquired):
+                gate.release(held)
+
+    def snapshot(self) -> dict:
+        return {
+            "admitted": self.admitted,
+            "shed": dict(self.shed),
+            "queue_size": self.runtime.get("admission_queue_size"),
+            "queue_timeout_ms": self.runtime.get("admission_queue_timeout_ms"),
+            "device_rate": self.runtime.get("admission_device_rate"),
+            "device_burst": self.runtime.get("admission_device_burst"),
+            "devices_tracked": len(self.buckets),
+            "global": self.gate.snapshot(),
+            "methods": {pattern: gate.snapshot() for pattern, gate in self.method_gates.items()},
+        }
+
+
+@lru_cache()
+def get_admission() -> AdmissionController:
+    controller = AdmissionController(get_runtime_config())
+    get_runtime_config().on_change(controller.on_config_change)
+    return controller
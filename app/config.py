@@ -12,6 +12,39 @@ class Settings(BaseSettings):
     LINSPIRER_HOST: str = "0.0.0.0"
     LINSPIRER_PORT: int = 8080
     LINSPIRER_JWT_SECRET: str
+    LINSPIRER_UPSTREAM_TIMEOUT: float = 30.0
+    LINSPIRER_UPSTREAM_CONNECT_TIMEOUT: float = 5.0
+    LINSPIRER_RETRY_MAX: int = 2
+    LINSPIRER_RETRY_BACKOFF_MS: int = 100
+    LINSPIRER_RETRY_BUDGET_RATIO: float = 0.2
+    LINSPIRER_RETRY_BUDGET_MIN_PER_SECOND: float = 1.0
+    LINSPIRER_BREAKER_FAILURE_THRESHOLD: int = 5
+    LINSPIRER_BREAKER_OPEN_SECONDS: float = 30.0
+    LINSPIRER_IDEMPOTENT_METHODS: str = "com.linspirer.tactics.gettactics"
+    LINSPIRER_TACTICS_METHOD: str = "com.linspirer.tactics.gettactics"
+    LINSPIRER_LOG_RETENTION_DAYS: int = 0
+    LINSPIRER_LOG_ARCHIVE_DAYS: int = 0
+    LINSPIRER_DEVICE_FLUSH_INTERVAL: float = 5.0
+    LINSPIRER_ADMISSION_MAX_INFLIGHT: int = 100
+    LINSPIRER_ADMISSION_QUEUE_SIZE: int = 200
+    LINSPIRER_ADMISSION_QUEUE_TIMEOUT_MS: int = 2000
+    LINSPIRER_ADMISSION_DEVICE_RATE: float = 0.0
+    LINSPIRER_ADMISSION_DEVICE_BURST: int = 20
+    LINSPIRER_HEDGE_ENABLED: bool = False
+    LINSPIRER_HEDGE_MIN_DELAY_MS: int = 50
+    LINSPIRER_LB_STRATEGY: str = "least_outstanding"
+    LINSPIRER_HEALTH_CHECK_INTERVAL: float = 10.0
+    LINSPIRER_HEALTH_CHECK_PATH: str = "/"
+    LINSPIRER_OUTLIER_CONSECUTIVE_FAILURES: int = 5
+    LINSPIRER_OUTLIER_EJECTION_SECONDS: float = 30.0
+    LINSPIRER_OUTLIER_MAX_EJECTION_PERCENT: int = 50
+    LINSPIRER_CONFIG_POLL_INTERVAL: float = 1.0
+    LINSPIRER_LIVE_TAIL_BUFFER: int = 1000
+    LINSPIRER_LIVE_TAIL_CLIENT_QUEUE: int = 500
+    LINSPIRER_LIVE_TAIL_MAX_CLIENTS: int = 20
+    LINSPIRER_LIVE_TAIL_BUFFER_BYTES: int = 8388608
+    LINSPIRER_COMPRESSION_MIN_SIZE: int = 1024
+    LINSPIRER_STATIC_MAX_AGE: int = 31536000
     
     class Config:
         env_file = ".env"
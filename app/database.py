@@ -1,31 +1,141 @@
+import logging
 import os
 import sqlite3
+import time
+from sqlalchemy import event, exc
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.log_partitions import LEGACY_TABLE, create_table_sql, partition_names_sync
+from app.models import RequestLog
 
 DATABASE_URL = os.getenv("LINSPIRER_DB_PATH", "sqlite+aiosqlite:///./data/linspirer.db")
 DB_PATH = DATABASE_URL.replace("sqlite+aiosqlite:///", "")
+LOG_DATABASE_URL = os.getenv(
+    "LINSPIRER_LOG_DB_PATH", "sqlite+aiosqlite:///" + os.path.join(os.path.dirname(DB_PATH) or ".", "logs.db")
+)
+LOG_DB_PATH = LOG_DATABASE_URL.replace("sqlite+aiosqlite:///", "")
+LOG_ARCHIVE_DIR = os.getenv("LINSPIRER_LOG_ARCHIVE_DIR", os.path.join(os.path.dirname(LOG_DB_PATH) or ".", "archive"))
+READ_POOL_SIZE = int(os.getenv("LINSPIRER_DB_READ_POOL_SIZE", "4"))
+LOG_MIGRATION_CHUNK = 10000
+POOL_TIMEOUT = float(os.getenv("LINSPIRER_DB_POOL_TIMEOUT", "30"))
 
 Base = declarative_base()
 
-db_dir = os.path.dirname(DB_PATH)
-if db_dir:
-    os.makedirs(db_dir, exist_ok=True)
+logger = logging.getLogger(__name__)
+
+for db_dir in {os.path.dirname(DB_PATH), os.path.dirname(LOG_DB_PATH)}:
+    if db_dir:
+        os.makedirs(db_dir, exist_ok=True)
+
+
+class TimedPool(AsyncAdaptedQueuePool):
+    # 记录从请求连接到拿到连接的等待时间，用于判断连接池是否过小
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            self.checkouts += 1
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+
+    def snapshot(self) -> dict:
+        return {
+            "size": self.size(),
+            "checked_out": self.checkedout(),
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "avg_wait_ms": round(self.total_wait / self.checkouts * 1000, 3) if self.checkouts else None,
+            "max_wait_ms": round(self.max_wait * 1000, 3),
+        }
 
-async_engine = create_async_engine(DATABASE_URL, connect_args={"check_same_thread": False}, echo=False)
+
+def make_engine(url: str, pool_size: int, read_only: bool = False):
+    engine = create_async_engine(
+        url,
+        connect_args={"check_same_thread": False},
+        poolclass=TimedPool,
+        pool_size=pool_size,
+        max_overflow=0,
+        pool_timeout=POOL_TIMEOUT,
+        echo=False,
+    )
+    if read_only:
+        event.listen(engine.sync_engine, "connect", set_query_only)
+    return engine
+
+
+def set_query_only(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA query_only = ON")
+    cursor.close()
+
+
+# 所有写入共用一个连接，在连接池中排队串行执行；查询走独立的只读连接池，慢查询不再阻塞日志写入
+async_engine = make_engine(DATABASE_URL, 1)
 engine = async_engine
-async_session_maker = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+read_engine = make_engine(DATABASE_URL, READ_POOL_SIZE, read_only=True)
+# 请求日志单独存放一个文件，日志写入、检查点和清理不再锁住控制面的表
+log_engine = make_engine(LOG_DATABASE_URL, 1)
+log_read_engine = make_engine(LOG_DATABASE_URL, READ_POOL_SIZE, read_only=True)
+
+# 会话按表路由到对应的库，同一个会话既能查规则也能查日志
+async_session_maker = async_sessionmaker(
+    async_engine, binds={RequestLog: log_engine}, class_=AsyncSession, expire_on_commit=False
+)
+read_session_maker = async_sessionmaker(
+    read_engine, binds={RequestLog: log_read_engine}, class_=AsyncSession, expire_on_commit=False
+)
+
+
+def pool_snapshot() -> dict:
+    return {
+        "writer": async_engine.pool.snapshot(),
+        "reader": read_engine.pool.snapshot(),
+        "log_writer": log_engine.pool.snapshot(),
+        "log_reader": log_read_engine.pool.snapshot(),
+    }
+
+
+def rebuild_rule_targets(cursor: sqlite3.Cursor):
+    from app.models import split_emails
+    
+    # 把 email 列中逗号分隔的邮箱拆分为 rule_targets 的行
+    cursor.execute('DELETE FROM rule_targets')
+    rows = cursor.execute(
+        "SELECT id, method_name, email FROM interception_rules WHERE is_global = 0 AND email IS NOT NULL AND email != ''"
+    ).fetchall()
+    cursor.executemany(
+        'INSERT OR IGNORE INTO rule_targets (rule_id, email, method_name) VALUES (?, ?, ?)',
+        [(rule_id, email, method_name) for rule_id, method_name, emails in rows for email in split_emails(emails)]
+    )
 
 
-def init_db_sync():
+def init_db_sync(db_path: str = None, log_db_path: str = None):
     from app.auth import get_password_hash
     
-    db_dir = os.path.dirname(DB_PATH)
+    db_path = db_path or DB_PATH
+    db_dir = os.path.dirname(db_path)
     if db_dir:
         os.makedirs(db_dir, exist_ok=True)
     
-    conn = sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
+    # WAL 模式下只读连接可以和写连接并发
+    cursor.execute('PRAGMA journal_mode = WAL')
     
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS config (
@@ -36,22 +146,33 @@ def init_db_sync():
         )
     ''')
     
-    # 更新CHECK约束：添加randomize_app_duration
+    # 旧库先补齐新增列，下面重建表时才能一并复制
+    for column in ('conditions TEXT', 'priority INTEGER DEFAULT 0'):
+        try:
+            cursor.execute(f'ALTER TABLE interception_rules ADD COLUMN {column}')
+        except sqlite3.OperationalError:
+            pass
+    # 上次重建失败（如全新数据库）遗留的临时表列定义可能已过时
+    cursor.execute('DROP TABLE IF EXISTS interception_rules_new')
+    
+    # 重建规则表：动作由应用内的转换注册表校验，旧库上的action CHECK约束在这里去掉
     try:
         # 1. 禁用外键约束（如果有）
         cursor.execute('PRAGMA foreign_keys = OFF')
         
-        # 2. 创建新表，带有正确的CHECK约束
+        # 2. 创建新表
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS interception_rules_new (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 method_name TEXT NOT NULL,
                 email TEXT,
-                action TEXT NOT NULL CHECK(action IN ('passthrough', 'modify', 'replace', 'randomize_app_duration')),
+                action TEXT NOT NULL,
                 custom_response TEXT,
                 remark TEXT,
                 is_enabled BOOLEAN DEFAULT 1,
                 is_global BOOLEAN DEFAULT 1,
+                conditions TEXT,
+                priority INTEGER DEFAULT 0,
                 created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
                 updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
             )
@@ -61,10 +182,10 @@ def init_db_sync():
         cursor.execute('''
             INSERT INTO interception_rules_new (
                 id, method_name, email, action, custom_response, remark, 
-                is_enabled, is_global, created_at, updated_at
+                is_enabled, is_global, conditions, priority, created_at, updated_at
             ) SELECT 
                 id, method_name, email, action, custom_response, remark, 
-                is_enabled, is_global, created_at, updated_at
+                is_enabled, is_global, conditions, priority, created_at, updated_at
             FROM interception_rules
         ''')
         
@@ -85,17 +206,33 @@ def init_db_sync():
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             method_name TEXT NOT NULL,
             email TEXT,
-            action TEXT NOT NULL CHECK(action IN ('passthrough', 'modify', 'replace', 'randomize_app_duration')),
+            action TEXT NOT NULL,
             custom_response TEXT,
             remark TEXT,
             is_enabled BOOLEAN DEFAULT 1,
             is_global BOOLEAN DEFAULT 1,
+            conditions TEXT,
+            priority INTEGER DEFAULT 0,
             created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
             updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
         )''')
     
     # 索引已在表替换过程中创建，无需重复
     
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'rule_targets'")
+    has_rule_targets = cursor.fetchone() is not None
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS rule_targets (
+            rule_id INTEGER NOT NULL,
+            email TEXT NOT NULL,
+            method_name TEXT NOT NULL,
+            PRIMARY KEY (rule_id, email)
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_rule_targets_email_method ON rule_targets(email, method_name)')
+    if not has_rule_targets:
+        rebuild_rule_targets(cursor)
+    
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS commands (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -107,25 +244,9 @@ def init_db_sync():
         )
     ''')
     
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS request_logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            method TEXT,
-            request_body TEXT,
-            response_body TEXT,
-            intercepted_request TEXT,
-            intercepted_response TEXT,
-            request_interception_action TEXT,
-            response_interception_action TEXT,
-            email TEXT,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    try:
-        cursor.execute('ALTER TABLE request_logs ADD COLUMN email TEXT')
-    except sqlite3.OperationalError:
-        pass
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_commands_status_received_at ON commands(status, received_at)')
+    # 不按状态筛选时的默认列表
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_commands_received_at ON commands(received_at)')
     
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS tactics_templates (
@@ -140,10 +261,35 @@ def init_db_sync():
         )
     ''')
     
-    try:
-        cursor.execute('ALTER TABLE tactics_templates ADD COLUMN is_applied BOOLEAN DEFAULT 0')
-    except sqlite3.OperationalError:
-        pass
+    for column in ('is_applied BOOLEAN DEFAULT 0', 'email TEXT'):
+        try:
+            cursor.execute(f'ALTER TABLE tactics_templates ADD COLUMN {column}')
+        except sqlite3.OperationalError:
+            pass
+    
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'devices'")
+    has_devices = cursor.fetchone() is not None
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS devices (
+            email TEXT PRIMARY KEY,
+            first_seen DATETIME,
+            last_seen DATETIME,
+            request_count INTEGER DEFAULT 0,
+            last_method TEXT,
+            model TEXT,
+            swdid TEXT
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_devices_last_seen ON devices(last_seen)')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS device_methods (
+            email TEXT NOT NULL,
+            method TEXT NOT NULL,
+            request_count INTEGER DEFAULT 0,
+            last_seen DATETIME,
+            PRIMARY KEY (email, method)
+        )
+    ''')
     
     cursor.execute("SELECT value FROM config WHERE `key` = 'admin_password_hash'")
     if cursor.fetchone() is None:
@@ -162,6 +308,126 @@ def init_db_sync():
     
     conn.commit()
     conn.close()
+    
+    log_db_path = log_db_path or LOG_DB_PATH
+    init_log_db_sync(log_db_path)
+    migrate_request_logs(db_path, log_db_path)
+    if not has_devices:
+        backfill_devices(db_path, log_db_path)
+
+
+def init_log_db_sync(log_db_path: str = None):
+    log_db_path = log_db_path or LOG_DB_PATH
+    log_dir = os.path.dirname(log_db_path)
+    if log_dir:
+        os.makedirs(log_dir, exist_ok=True)
+    
+    conn = sqlite3.connect(log_db_path)
+    cursor = conn.cursor()
+    cursor.execute('PRAGMA journal_mode = WAL')
+    
+    # 日志写入按天分区的表，由写入时按需创建；分区前的 request_logs 表保留为最早的分区，只补齐新增列
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = ?", (LEGACY_TABLE,))
+    if cursor.fetchone() is None:
+        conn.close()
+        return
+    
+    for column in ('email TEXT', 'json_validated BOOLEAN DEFAULT 0'):
+        try:
+            cursor.execute(f'ALTER TABLE request_logs ADD COLUMN {column}')
+        except sqlite3.OperationalError:
+            pass
+    
+    conn.commit()
+    conn.close()
+
+
+def migrate_request_logs(db_path: str, log_db_path: str, chunk_size: int = LOG_MIGRATION_CHUNK) -> int:
+    # 旧版本的日志存放在主库中，分批移到日志库；每批先插入再删除，中断后重启会从剩余的行继续
+    if os.path.abspath(db_path) == os.path.abspath(log_db_path):
+        return 0
+    
+    conn = sqlite3.connect(log_db_path)
+    try:
+        conn.execute('ATTACH DATABASE ? AS old', (db_path,))
+        if conn.execute("SELECT 1 FROM old.sqlite_master WHERE type = 'table' AND name = 'request_logs'").fetchone() is None:
+            return 0
+        
+        # 迁移过来的日志放在分区前的旧表中，作为最早的分区
+        conn.execute(create_table_sql(LEGACY_TABLE))
+        # 很旧的库可能缺少后来新增的列，只复制两边都有的列
+        new_columns = [row[1] for row in conn.execute('PRAGMA main.table_info(request_logs)')]
+        old_columns = {row[1] for row in conn.execute('PRAGMA old.table_info(request_logs)')}
+        columns = ', '.join(column for column in new_columns if column in old_columns)
+        
+        moved = 0
+        while True:
+            last_id = conn.execute(
+                'SELECT MAX(id) FROM (SELECT id FROM old.request_logs ORDER BY id LIMIT ?)', (chunk_size,)
+            ).fetchone()[0]
+            if last_id is None:
+                break
+            cursor = conn.execute(
+                f'INSERT OR IGNORE INTO main.request_logs ({columns}) SELECT {columns} FROM old.request_logs WHERE id <= ?',
+                (last_id,)
+            )
+            moved += cursor.rowcount
+            conn.execute('DELETE FROM old.request_logs WHERE id <= ?', (last_id,))
+            conn.commit()
+            logger.info(f"Moved request logs up to id {last_id} to {log_db_path}")
+        
+        conn.execute('DROP TABLE old.request_logs')
+        conn.commit()
+    finally:
+        conn.close()
+    
+    # 回收主库中日志占用的空间，只在迁移后执行一次
+    main_conn = sqlite3.connect(db_path)
+    main_conn.execute('VACUUM')
+    main_conn.close()
+    logger.info(f"Moved {moved} request logs from {db_path} to {log_db_path}")
+    return moved
+
+
+def backfill_devices(db_path: str, log_db_path: str) -> int:
+    # 设备表上线前的日志只汇总一次，之后由代理请求增量更新
+    devices = {}
+    methods = {}
+    log_conn = sqlite3.connect(log_db_path)
+    try:
+        for table in partition_names_sync(log_conn):
+            for email, method, count, first_seen, last_seen in log_conn.execute(
+                f"SELECT email, method, COUNT(*), MIN(created_at), MAX(created_at) FROM {table} "
+                "WHERE email IS NOT NULL AND email != '' AND created_at IS NOT NULL GROUP BY email, method"
+            ):
+                method = method or ''
+                device = devices.setdefault(email, [first_seen, last_seen, 0, method])
+                device[0] = min(device[0], first_seen)
+                if last_seen >= device[1]:
+                    device[1], device[3] = last_seen, method
+                device[2] += count
+                entry = methods.setdefault((email, method), [0, last_seen])
+                entry[0] += count
+                entry[1] = max(entry[1], last_seen)
+    finally:
+        log_conn.close()
+    
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.executemany(
+            'INSERT OR REPLACE INTO devices (email, first_seen, last_seen, request_count, last_method) VALUES (?, ?, ?, ?, ?)',
+            [(email, *device) for email, device in devices.items()]
+        )
+        conn.executemany(
+            'INSERT OR REPLACE INTO device_methods (email, method, request_count, last_seen) VALUES (?, ?, ?, ?)',
+            [(email, method, *entry) for (email, method), entry in methods.items()]
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    if devices:
+        logger.info(f"Backfilled {len(devices)} devices from request logs")
+    return len(devices)
 
 
 async def init_db():
@@ -174,3 +440,11 @@ async def get_db():
             yield session
         finally:
             await session.close()
+
+
+async def get_read_db():
+    async with read_session_maker() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
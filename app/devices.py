@@ -0,0 +1,185 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, List, Optional, Set
+
+from app.config import get_settings
+from app.database import async_session_maker, read_session_maker
+from app.models import china_now
+from app.repositories import DevicesRepository
+
+logger = logging.getLogger(__name__)
+
+MODEL_FIELDS = ["model", "device_model", "deviceModel"]
+SWDID_FIELDS = ["swdid"]
+
+
+def first_field(params: dict, fields: List[str]) -> Optional[str]:
+    for field in fields:
+        value = params.get(field)
+        if value:
+            return str(value)
+    return None
+
+
+class PendingDevice:
+    __slots__ = ("first_seen", "last_seen", "count", "last_method", "model", "swdid", "methods")
+
+    def __init__(self, now: datetime):
+        self.first_seen = now
+        self.last_seen = now
+        self.count = 0
+        self.last_method: Optional[str] = None
+        self.model: Optional[str] = None
+        self.swdid: Optional[str] = None
+        # 方法名 -> [请求数, 最后出现时间]
+        self.methods: Dict[str, list] = {}
+
+    def record(self, now: datetime, method: str, model: Optional[str], swdid: Optional[str]):
+        self.last_seen = now
+        self.count += 1
+        self.last_method = method
+        self.model = model or self.model
+        self.swdid = swdid or self.swdid
+        entry = self.methods.get(method)
+        if entry is None:
+            self.methods[method] = [1, now]
+        else:
+            entry[0] += 1
+            entry[1] = now
+
+    def merge(self, newer: "PendingDevice"):
+        # 写入失败时把旧批次并回，newer 是失败后新累计的数据
+        self.first_seen = min(self.first_seen, newer.first_seen)
+        self.last_seen = max(self.last_seen, newer.last_seen)
+        self.count += newer.count
+        self.last_method = newer.last_method or self.last_method
+        self.model = newer.model or self.model
+        self.swdid = newer.swdid or self.swdid
+        for method, (count, last_seen) in newer.methods.items():
+            entry = self.methods.setdefault(method, [0, last_seen])
+            entry[0] += count
+            entry[1] = max(entry[1], last_seen)
+
+
+class DeviceRegistry:
+    def __init__(self, interval: float = None):
+        self.interval = interval if interval is not None else get_settings().LINSPIRER_DEVICE_FLUSH_INTERVAL
+        # 自上次写入以来活跃的设备，代理请求只修改内存，由后台任务批量写入 devices 表
+        self.dirty: Dict[str, PendingDevice] = {}
+        # 设备表中已有的邮箱和尚未写入的新邮箱；邮箱只增不减，两者之和即邮箱列表的版本，写入前后保持不变
+        self.known: Set[str] = set()
+        self.new_emails: Set[str] = set()
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.flushes = 0
+        self.failures = 0
+        self.last_flush_rows = 0
+        self.last_flush_ms = 0.0
+        self.last_error: Optional[str] = None
+
+    def record(self, email: str, method: str, params: dict):
+        now = china_now().replace(tzinfo=None)
+        device = self.dirty.get(email)
+        if device is None:
+            device = self.dirty[email] = PendingDevice(now)
+            if email not in self.known:
+                self.known.add(email)
+                self.new_emails.add(email)
+        device.record(now, method or "", first_field(params, MODEL_FIELDS), first_field(params, SWDID_FIELDS))
+
+    def pending(self, email: str) -> Optional[PendingDevice]:
+        return self.dirty.get(email)
+
+    def pending_emails(self) -> List[str]:
+        return list(self.dirty)
+
+    def pending_methods(self) -> Set[str]:
+        return {method for device in self.dirty.values() for method in device.methods if method}
+
+    async def load(self):
+        async with read_session_maker() as db:
+            emails = await DevicesRepository.list_device_emails(db)
+        self.known.update(emails)
+        self.new_emails.difference_update(emails)
+
+    async def flush(self) -> int:
+        async with self._lock:
+            if not self.dirty:
+                return 0
+            batch, self.dirty = self.dirty, {}
+            devices = []
+            methods = []
+            for email, device in batch.items():
+                devices.append({
+                    "email": email,
+                    "first_seen": device.first_seen,
+                    "last_seen": device.last_seen,
+                    "request_count": device.count,
+                    "last_method": device.last_method,
+                    "model": device.model,
+                    "swdid": device.swdid,
+                })
+                for method, (count, last_seen) in device.methods.items():
+                    methods.append({"email": email, "method": method, "request_count": count, "last_seen": last_seen})
+            started = time.perf_counter()
+            try:
+                async with async_session_maker() as db:
+                    await DevicesRepository.upsert(db, devices, methods)
+            except Exception as e:
+                self.failures += 1
+                self.last_error = str(e)
+                logger.warning(f"Failed to flush {len(batch)} devices: {e}")
+                for email, device in batch.items():
+                    newer = self.dirty.get(email)
+                    if newer is not None:
+                        device.merge(newer)
+                    self.dirty[email] = device
+                return 0
+            self.new_emails.difference_update(batch)
+            self.flushes += 1
+            self.last_flush_rows = len(devices)
+            self.last_flush_ms = round((time.perf_counter() - started) * 1000, 2)
+            self.last_error = None
+            return len(devices)
+
+    async def run(self):
+        try:
+            await self.load()
+        except Exception as e:
+            logger.warning(f"Failed to load known devices: {e}")
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def snapshot(self) -> dict:
+        return {
+            "pending": len(self.dirty),
+            "flush_interval": self.interval,
+            "flushes": self.flushes,
+            "failures": self.failures,
+            "last_flush_rows": self.last_flush_rows,
+            "last_flush_ms": self.last_flush_ms,
+            "last_error": self.last_error,
+        }
+
+
+@lru_cache()
+def get_device_registry() -> DeviceRegistry:
+    return DeviceRegistry()
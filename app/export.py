@@ -0,0 +1,75 @@
+import csv
+import io
+import json
+import zlib
+from typing import AsyncIterator, List
+
+SUMMARY_FIELDS = [
+    "id", "created_at", "method", "email",
+    "request_interception_action", "response_interception_action",
+]
+BODY_FIELDS = ["request_body", "response_body", "intercepted_request", "intercepted_response"]
+
+CONTENT_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def export_fields(include_bodies: bool) -> List[str]:
+    return SUMMARY_FIELDS + BODY_FIELDS if include_bodies else SUMMARY_FIELDS
+
+
+def format_time(value) -> str:
+    return value.isoformat() if value is not None else None
+
+
+def load_body(value):
+    if not value:
+        return None
+    try:
+        return json.loads(value)
+    except json.JSONDecodeError:
+        return value
+
+
+async def iter_ndjson(chunks: AsyncIterator[List[dict]], include_bodies: bool) -> AsyncIterator[bytes]:
+    async for rows in chunks:
+        lines = []
+        for row in rows:
+            row["created_at"] = format_time(row["created_at"])
+            if include_bodies:
+                for field in BODY_FIELDS:
+                    row[field] = load_body(row[field])
+            lines.append(json.dumps(row, ensure_ascii=False))
+        yield ("\n".join(lines) + "\n").encode()
+
+
+async def iter_csv(chunks: AsyncIterator[List[dict]], include_bodies: bool) -> AsyncIterator[bytes]:
+    fields = export_fields(include_bodies)
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction="ignore")
+    writer.writeheader()
+    async for rows in chunks:
+        for row in rows:
+            row["created_at"] = format_time(row["created_at"])
+            writer.writerow(row)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+async def gzip_stream(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def serialize(fmt: str, chunks: AsyncIterator[List[dict]], include_bodies: bool, compress: bool) -> AsyncIterator[bytes]:
+    stream = iter_csv(chunks, include_bodies) if fmt == "csv" else iter_ndjson(chunks, include_bodies)
+    return gzip_stream(stream) if compress else stream
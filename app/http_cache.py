@@ -0,0 +1,40 @@
+import hashlib
+from typing import Optional
+
+from fastapi import Request, Response
+
+# 压缩中间件会给 ETag 加上编码后缀，比较时去掉
+ENCODING_SUFFIXES = ("-gzip", "-br")
+
+
+def make_etag(*parts) -> str:
+    digest = hashlib.sha256("\x00".join(str(p) for p in parts).encode()).hexdigest()[:20]
+    return f'"{digest}"'
+
+
+def normalize_etag(tag: str) -> str:
+    tag = tag.strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    for suffix in ENCODING_SUFFIXES:
+        if tag.endswith(suffix + '"'):
+            return tag[:-len(suffix) - 1] + '"'
+    return tag
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return normalize_etag(etag) in {normalize_etag(tag) for tag in header.split(",")}
+
+
+def not_modified(request: Request, response: Response, etag: str) -> Optional[Response]:
+    # 浏览器缓存带 Authorization 的响应后，每次使用前都会带 If-None-Match 重新验证
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    response.headers.update(headers)
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return None
@@ -0,0 +1,182 @@
+import copy
+import json
+from functools import lru_cache
+from typing import Any, Callable, List, Optional, Tuple
+
+PATCH_OPS = ("add", "remove", "replace", "move", "copy", "test")
+
+Token = Tuple[str, Optional[int]]
+Operation = Callable[[Any], Any]
+
+
+class PatchError(ValueError):
+    pass
+
+
+def parse_pointer(pointer: Any) -> Tuple[Token, ...]:
+    # RFC 6901：规则编译时拆分并反转义，数组下标预先转为整数
+    if not isinstance(pointer, str):
+        raise PatchError("JSON pointer must be a string")
+    if pointer == "":
+        return ()
+    if not pointer.startswith("/"):
+        raise PatchError(f"invalid JSON pointer '{pointer}'")
+    tokens = []
+    for token in pointer[1:].split("/"):
+        token = token.replace("~1", "/").replace("~0", "~")
+        index = int(token) if token.isdigit() and (token == "0" or not token.startswith("0")) else None
+        tokens.append((token, index))
+    return tuple(tokens)
+
+
+def format_pointer(tokens: Tuple[Token, ...]) -> str:
+    return "".join("/" + token.replace("~", "~0").replace("/", "~1") for token, _ in tokens)
+
+
+def resolve(doc: Any, tokens: Tuple[Token, ...]) -> Any:
+    for token, index in tokens:
+        if isinstance(doc, dict):
+            if token not in doc:
+                raise PatchError(f"path '{format_pointer(tokens)}' does not exist")
+            doc = doc[token]
+        elif isinstance(doc, list):
+            if index is None or index >= len(doc):
+                raise PatchError(f"path '{format_pointer(tokens)}' does not exist")
+            doc = doc[index]
+        else:
+            raise PatchError(f"path '{format_pointer(tokens)}' does not exist")
+    return doc
+
+
+def list_index(container: list, token: Token, tokens: Tuple[Token, ...], allow_end: bool) -> int:
+    name, index = token
+    if allow_end and name == "-":
+        return len(container)
+    limit = len(container) if allow_end else len(container) - 1
+    if index is None or index > limit:
+        raise PatchError(f"invalid array index in '{format_pointer(tokens)}'")
+    return index
+
+
+def fresh(value: Any) -> Any:
+    # 规则中的常量在多个请求间共享，写入文档前复制容器
+    return copy.deepcopy(value) if isinstance(value, (dict, list)) else value
+
+
+def add_value(doc: Any, tokens: Tuple[Token, ...], value: Any) -> Any:
+    if not tokens:
+        return value
+    parent = resolve(doc, tokens[:-1])
+    if isinstance(parent, dict):
+        parent[tokens[-1][0]] = value
+    elif isinstance(parent, list):
+        parent.insert(list_index(parent, tokens[-1], tokens, True), value)
+    else:
+        raise PatchError(f"cannot add at '{format_pointer(tokens)}'")
+    return doc
+
+
+def remove_value(doc: Any, tokens: Tuple[Token, ...]) -> Any:
+    if not tokens:
+        raise PatchError("cannot remove the document root")
+    parent = resolve(doc, tokens[:-1])
+    if isinstance(parent, dict):
+        if tokens[-1][0] not in parent:
+            raise PatchError(f"path '{format_pointer(tokens)}' does not exist")
+        return parent.pop(tokens[-1][0])
+    if isinstance(parent, list):
+        return parent.pop(list_index(parent, tokens[-1], tokens, False))
+    raise PatchError(f"path '{format_pointer(tokens)}' does not exist")
+
+
+def compile_operation(index: int, operation: Any) -> Operation:
+    if not isinstance(operation, dict):
+        raise PatchError(f"operation {index} must be an object")
+    op = operation.get("op")
+    if op not in PATCH_OPS:
+        raise PatchError(f"operation {index}: unknown op '{op}'. Must be one of: {', '.join(PATCH_OPS)}")
+    if "path" not in operation:
+        raise PatchError(f"operation {index}: 'path' is required")
+    try:
+        path = parse_pointer(operation["path"])
+        source = parse_pointer(operation["from"]) if op in ("move", "copy") else None
+    except KeyError:
+        raise PatchError(f"operation {index}: 'from' is required for '{op}'")
+    except PatchError as e:
+        raise PatchError(f"operation {index}: {e}")
+    if op in ("add", "replace", "test") and "value" not in operation:
+        raise PatchError(f"operation {index}: 'value' is required for '{op}'")
+    value = operation.get("value")
+
+    if op == "add":
+        return lambda doc: add_value(doc, path, fresh(value))
+    if op == "remove":
+        def remove(doc: Any) -> Any:
+            remove_value(doc, path)
+            return doc
+        return remove
+    if op == "replace":
+        def replace(doc: Any) -> Any:
+            if not path:
+                return fresh(value)
+            remove_value(doc, path)
+            return add_value(doc, path, fresh(value))
+        return replace
+    if op == "move":
+        if path[:len(source)] == source and path != source:
+            raise PatchError(f"operation {index}: cannot move a value into its own child")
+        def move(doc: Any) -> Any:
+            if path == source:
+                return doc
+            return add_value(doc, path, remove_value(doc, source))
+        return move
+    if op == "copy":
+        return lambda doc: add_value(doc, path, copy.deepcopy(resolve(doc, source)))
+
+    def test(doc: Any) -> Any:
+        if resolve(doc, path) != value:
+            raise PatchError(f"test failed at '{format_pointer(path)}'")
+        return doc
+    return test
+
+
+class CompiledPatch:
+    def __init__(self, operations: List[Operation]):
+        self.operations = operations
+
+    def apply(self, doc: Any) -> Any:
+        # 原地修改文档，只有替换根节点时返回新对象
+        for operation in self.operations:
+            doc = operation(doc)
+        return doc
+
+
+class PatchRule:
+    def __init__(self, request: Optional[CompiledPatch], response: Optional[CompiledPatch]):
+        self.request = request
+        self.response = response
+
+
+def compile_patch(operations: Any) -> CompiledPatch:
+    if not isinstance(operations, list):
+        raise PatchError("patch must be a list of operations")
+    return CompiledPatch([compile_operation(index, operation) for index, operation in enumerate(operations)])
+
+
+@lru_cache(maxsize=256)
+def compile_patch_rule(config: Optional[str]) -> PatchRule:
+    # 配置为操作列表（作用于响应），或 {"request": [...], "response": [...]}；同一配置文本只编译一次
+    try:
+        parsed = json.loads(config) if config else None
+    except json.JSONDecodeError as e:
+        raise PatchError(f"patch is not valid JSON: {e}")
+    if isinstance(parsed, list):
+        return PatchRule(None, compile_patch(parsed))
+    if isinstance(parsed, dict) and ("request" in parsed or "response" in parsed):
+        unknown = set(parsed) - {"request", "response"}
+        if unknown:
+            raise PatchError(f"unknown patch keys: {', '.join(sorted(unknown))}")
+        request = compile_patch(parsed["request"]) if parsed.get("request") is not None else None
+        response = compile_patch(parsed["response"]) if parsed.get("response") is not None else None
+        return PatchRule(request, response)
+    raise PatchError("patch must be a list of operations or an object with 'request'/'response' lists")
\ No newline at end of file
@@ -0,0 +1,207 @@
+import asyncio
+import json
+import logging
+from collections import deque
+from functools import lru_cache
+from typing import AsyncIterator, Dict, List, Optional, Set
+
+from app.config import get_settings
+from app.log_render import BODY_COLUMNS, body_fragment
+from app.models import china_now
+
+logger = logging.getLogger(__name__)
+
+KEEPALIVE_SECONDS = 15.0
+
+
+class LiveEvent:
+    __slots__ = ("seq", "log_id", "method", "email", "request_action", "response_action", "created_at", "bodies", "size", "_summary")
+
+    def __init__(self, seq: int, log_id: Optional[int], method: str, email: Optional[str],
+                 request_action: Optional[str], response_action: Optional[str], bodies: Dict[str, Optional[str]]):
+        self.seq = seq
+        self.log_id = log_id
+        self.method = method
+        self.email = email
+        self.request_action = request_action
+        self.response_action = response_action
+        # 与数据库中保存的时间格式一致
+        self.created_at = china_now().replace(tzinfo=None)
+        self.bodies = bodies
+        self.size = sum(len(value) for value in bodies.values() if value)
+        self._summary: Optional[str] = None
+
+    def drop_bodies(self):
+        self.bodies = {}
+        self.size = 0
+
+    def summary(self) -> str:
+        # 同一事件发给多个客户端时只序列化一次
+        if self._summary is None:
+            self._summary = json.dumps({
+                "id": self.log_id,
+                "method": self.method,
+                "request_interception_action": self.request_action,
+                "response_interception_action": self.response_action,
+                "email": self.email,
+                "created_at": self.created_at.isoformat(),
+            }, ensure_ascii=False)
+        return self._summary
+
+    def render(self, include_bodies: bool) -> str:
+        data = self.summary()
+        if include_bodies:
+            # 正文未经写入时的校验，在订阅者自己的任务中解析，不占用代理请求的时间
+            parts = [data[:-1]]
+            for column in BODY_COLUMNS:
+                parts.append(f', "{column}": ')
+                parts.append(body_fragment(column, self.bodies.get(column), False))
+            parts.append("}")
+            data = "".join(parts)
+        return f"id: {self.seq}\ndata: {data}\n\n"
+
+
+class LiveFilter:
+    def __init__(self, method: Optional[str] = None, email: Optional[str] = None, action: Optional[str] = None):
+        self.method = method
+        self.email = email
+        self.action = action
+
+    def matches(self, event: LiveEvent) -> bool:
+        if self.method and event.method != self.method:
+            return False
+        if self.email and event.email != self.email:
+            return False
+        if self.action:
+            # 与日志导出一致：none 表示请求和响应都未被拦截
+            if self.action == "none":
+                return event.request_action is None and event.response_action is None
+            return self.action in (event.request_action, event.response_action)
+        return True
+
+
+class LiveSubscriber:
+    def __init__(self, live_filter: LiveFilter, include_bodies: bool, max_pending: int):
+        self.filter = live_filter
+        self.include_bodies = include_bodies
+        self.max_pending = max_pending
+        self.pending: deque = deque()
+        self.dropped = False
+        self.wakeup = asyncio.Event()
+
+    def offer(self, event: LiveEvent) -> bool:
+        if len(self.pending) >= self.max_pending:
+            self.dropped = True
+            self.wakeup.set()
+            return False
+        self.pending.append(event)
+        self.wakeup.set()
+        return True
+
+
+class LiveTail:
+    def __init__(self, buffer_size: int, client_queue_size: int, max_clients: int, buffer_bytes: int):
+        self.buffer: deque = deque(maxlen=buffer_size)
+        # 带正文的事件按时间顺序单独记录，超出字节上限时从最早的开始丢弃正文
+        self.body_events: deque = deque()
+        self.buffer_bytes = buffer_bytes
+        self.body_bytes = 0
+        self.client_queue_size = client_queue_size
+        self.max_clients = max_clients
+        self.subscribers: Set[LiveSubscriber] = set()
+        self.seq = 0
+        self.published = 0
+        self.dropped_clients = 0
+
+    def publish(self, log_id: Optional[int], method: str, email: Optional[str],
+                request_action: Optional[str], response_action: Optional[str], bodies: Dict[str, Optional[str]]):
+        self.seq += 1
+        self.published += 1
+        # 没有订阅正文的客户端时只缓冲摘要，重连补发的事件也只有摘要
+        if not self.wants_bodies():
+            bodies = {}
+        event = LiveEvent(self.seq, log_id, method, email, request_action, response_action, bodies)
+        self.append(event)
+        # 只做内存追加，不等待任何客户端；跟不上的客户端直接断开
+        for subscriber in list(self.subscribers):
+            if subscriber.filter.matches(event) and not subscriber.offer(event):
+                self.unsubscribe(subscriber)
+                self.dropped_clients += 1
+                logger.info("Dropped slow live tail client")
+
+    def wants_bodies(self) -> bool:
+        return any(subscriber.include_bodies for subscriber in self.subscribers)
+
+    def append(self, event: LiveEvent):
+        if len(self.buffer) == self.buffer.maxlen:
+            evicted = self.buffer[0]
+            if evicted.size:
+                # 仍带正文的事件一定是 body_events 中最早的一个
+                self.body_events.popleft()
+                self.body_bytes -= evicted.size
+                evicted.drop_bodies()
+        self.buffer.append(event)
+        if event.size:
+            self.body_events.append(event)
+            self.body_bytes += event.size
+        while self.body_bytes > self.buffer_bytes and self.body_events:
+            oldest = self.body_events.popleft()
+            self.body_bytes -= oldest.size
+            oldest.drop_bodies()
+
+    def subscribe(self, live_filter: LiveFilter, include_bodies: bool, last_event_id: Optional[int] = None) -> LiveSubscriber:
+        if len(self.subscribers) >= self.max_clients:
+            raise OverflowError("Too many live tail clients")
+        subscriber = LiveSubscriber(live_filter, include_bodies, self.client_queue_size)
+        if last_event_id is not None:
+            # 断线重连时从环形缓冲区补发错过的事件
+            backlog = [e for e in self.buffer if e.seq > last_event_id and live_filter.matches(e)]
+            for event in backlog[-self.client_queue_size:]:
+                subscriber.offer(event)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: LiveSubscriber):
+        self.subscribers.discard(subscriber)
+
+    async def stream(self, subscriber: LiveSubscriber) -> AsyncIterator[str]:
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                if not subscriber.pending and not subscriber.dropped:
+                    subscriber.wakeup.clear()
+                    try:
+                        await asyncio.wait_for(subscriber.wakeup.wait(), KEEPALIVE_SECONDS)
+                    except asyncio.TimeoutError:
+                        yield ": keepalive\n\n"
+                        continue
+
+                if subscriber.pending:
+                    events: List[LiveEvent] = []
+                    while subscriber.pending:
+                        events.append(subscriber.pending.popleft())
+                    yield "".join(e.render(subscriber.include_bodies) for e in events)
+                    continue
+                if subscriber.dropped:
+                    yield "event: dropped\ndata: {}\n\n"
+                    return
+        finally:
+            self.unsubscribe(subscriber)
+
+    def snapshot(self) -> dict:
+        return {
+            "clients": len(self.subscribers),
+            "buffered": len(self.buffer),
+            "buffered_body_bytes": self.body_bytes,
+            "published": self.published,
+            "dropped_clients": self.dropped_clients,
+        }
+
+
+@lru_cache()
+def get_live_tail() -> LiveTail:
+    settings = get_settings()
+    return LiveTail(
+        settings.LINSPIRER_LIVE_TAIL_BUFFER, settings.LINSPIRER_LIVE_TAIL_CLIENT_QUEUE, settings.LINSPIRER_LIVE_TAIL_MAX_CLIENTS,
+        settings.LINSPIRER_LIVE_TAIL_BUFFER_BYTES
+    )
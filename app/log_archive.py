@@ -0,0 +1,355 @@
+import asyncio
+import gzip
+import json
+import logging
+import os
+import sqlite3
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from app.database import LOG_ARCHIVE_DIR, LOG_DB_PATH
+from app.log_partitions import LIST_TABLES, Partition, build_partitions, expired_partitions
+from app.models import china_now
+from app.runtime_config import get_runtime_config
+
+logger = logging.getLogger(__name__)
+
+# 每块单独压缩，查询时按索引只解压命中的块
+BLOCK_ROWS = 1000
+ARCHIVE_CHECK_INTERVAL = 600
+INDEX_SUFFIX = ".idx.json"
+CODEC_SUFFIXES = {"zstd": ".ndjson.zst", "gzip": ".ndjson.gz"}
+# zstandard 为可选依赖，未安装时使用 gzip
+DEFAULT_CODEC = "zstd" if zstandard is not None else "gzip"
+COLUMNS = [
+    "id", "method", "request_body", "response_body", "intercepted_request", "intercepted_response",
+    "request_interception_action", "response_interception_action", "email", "json_validated", "created_at",
+]
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def compress(codec: str, data: bytes) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=9).compress(data)
+    return gzip.compress(data, compresslevel=6)
+
+
+def decompress(codec: str, data: bytes) -> bytes:
+    if codec == "zstd":
+        if zstandard is None:
+            raise ArchiveError("zstd segments require the 'zstandard' package")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def parse_time(value) -> Optional[datetime]:
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+
+def block_entry(offset: int, length: int, rows: List[dict]) -> dict:
+    methods: Dict[str, int] = {}
+    for row in rows:
+        methods[row["method"] or ""] = methods.get(row["method"] or "", 0) + 1
+    times = [row["created_at"] for row in rows if row["created_at"]]
+    return {
+        "offset": offset,
+        "length": length,
+        "rows": len(rows),
+        "first_id": rows[0]["id"],
+        "last_id": rows[-1]["id"],
+        "since": min(times) if times else None,
+        "until": max(times) if times else None,
+        "methods": methods,
+        "emails": sorted({row["email"] for row in rows if row["email"]}),
+    }
+
+
+def read_rows(conn: sqlite3.Connection, table: str):
+    # 按主键分块读取，每块对应段文件中的一个压缩块
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            f"SELECT {', '.join(COLUMNS)} FROM {table} WHERE id > ? ORDER BY id LIMIT ?", (last_id, BLOCK_ROWS)
+        ).fetchall()
+        if not rows:
+            break
+        block = []
+        for row in rows:
+            record = dict(zip(COLUMNS, row))
+            # 时间统一为 ISO 格式，索引中可以直接按字符串比较
+            created_at = parse_time(record["created_at"])
+            record["created_at"] = created_at.isoformat() if created_at else None
+            record["json_validated"] = bool(record["json_validated"])
+            block.append(record)
+        yield block
+        last_id = rows[-1][0]
+
+
+def archive_partition(conn: sqlite3.Connection, partition: Partition, archive_dir: str, codec: str) -> dict:
+    suffix = CODEC_SUFFIXES[codec]
+    tmp_path = os.path.join(archive_dir, f".{partition.name}.{os.getpid()}{suffix}.tmp")
+    blocks = []
+    offset = 0
+    try:
+        with open(tmp_path, "wb") as f:
+            for rows in read_rows(conn, partition.name):
+                data = compress(codec, ("\n".join(json.dumps(row, ensure_ascii=False) for row in rows) + "\n").encode())
+                f.write(data)
+                blocks.append(block_entry(offset, len(data), rows))
+                offset += len(data)
+            f.flush()
+            os.fsync(f.fileno())
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+    segment = None
+    if blocks:
+        # 段文件按分区和首个 id 命名，同一分区重复归档（如多个 worker 同时执行）得到相同的文件
+        name = f"{partition.name}-{blocks[0]['first_id']}"
+        segment = name + suffix
+        index = {
+            "segment": segment,
+            "codec": codec,
+            "partition": partition.name,
+            "rows": sum(block["rows"] for block in blocks),
+            "first_id": blocks[0]["first_id"],
+            "last_id": blocks[-1]["last_id"],
+            "since": min((b["since"] for b in blocks if b["since"]), default=None),
+            "until": max((b["until"] for b in blocks if b["until"]), default=None),
+            "size": offset,
+            "blocks": blocks,
+        }
+        os.replace(tmp_path, os.path.join(archive_dir, segment))
+        # 索引最后写入，存在索引即表示段文件完整
+        index_tmp = os.path.join(archive_dir, f".{name}.{os.getpid()}{INDEX_SUFFIX}.tmp")
+        with open(index_tmp, "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(index_tmp, os.path.join(archive_dir, name + INDEX_SUFFIX))
+    else:
+        os.remove(tmp_path)
+
+    conn.execute(f'DROP TABLE IF EXISTS "{partition.name}"')
+    conn.commit()
+    if segment:
+        logger.info(f"Archived {partition.name} to {segment} ({index['rows']} rows, {offset} bytes)")
+        return {"partition": partition.name, "segment": segment, "rows": index["rows"], "size": offset}
+    return {"partition": partition.name, "segment": None, "rows": 0, "size": 0}
+
+
+def archive_logs(before: datetime, log_db_path: str = LOG_DB_PATH, archive_dir: str = LOG_ARCHIVE_DIR,
+                 codec: str = DEFAULT_CODEC) -> List[dict]:
+    # 只归档整个时间范围都早于 before 的分区，写完段文件后删除分区表
+    if codec == "zstd" and zstandard is None:
+        raise ArchiveError("zstd segments require the 'zstandard' package")
+    os.makedirs(archive_dir, exist_ok=True)
+    conn = sqlite3.connect(log_db_path, timeout=30)
+    try:
+        partitions = build_partitions([row[0] for row in conn.execute(LIST_TABLES)])
+        archived = []
+        for partition in expired_partitions(partitions, before):
+            try:
+                archived.append(archive_partition(conn, partition, archive_dir, codec))
+            except sqlite3.OperationalError as e:
+                # 其他进程已归档并删除了该分区
+                logger.warning(f"Skipping archive of {partition.name}: {e}")
+        return archived
+    finally:
+        conn.close()
+
+
+def block_matches(block: dict, since: Optional[str], until: Optional[str], method: Optional[str], email: Optional[str]) -> bool:
+    if since is not None and (block["until"] is None or block["until"] < since):
+        return False
+    if until is not None and (block["since"] is None or block["since"] >= until):
+        return False
+    if method and method not in block["methods"]:
+        return False
+    if email and email not in block["emails"]:
+        return False
+    return True
+
+
+class LogArchive:
+    def __init__(self, archive_dir: str = LOG_ARCHIVE_DIR, log_db_path: str = LOG_DB_PATH):
+        self.archive_dir = archive_dir
+        self.log_db_path = log_db_path
+        # 段文件不可变，索引按文件修改时间缓存
+        self._indexes: Dict[str, Tuple[float, dict]] = {}
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.last_run: Optional[datetime] = None
+        self.last_error: Optional[str] = None
+
+    def segments(self) -> List[dict]:
+        if not os.path.isdir(self.archive_dir):
+            return []
+        indexes = []
+        for filename in os.listdir(self.archive_dir):
+            if filename.startswith(".") or not filename.endswith(INDEX_SUFFIX):
+                continue
+            path = os.path.join(self.archive_dir, filename)
+            mtime = os.path.getmtime(path)
+            cached = self._indexes.get(path)
+            if cached is None or cached[0] != mtime:
+                with open(path, encoding="utf-8") as f:
+                    cached = (mtime, json.load(f))
+                self._indexes[path] = cached
+            indexes.append(cached[1])
+        return sorted(indexes, key=lambda index: index["first_id"])
+
+    def read_block(self, index: dict, block: dict) -> List[dict]:
+        with open(os.path.join(self.archive_dir, index["segment"]), "rb") as f:
+            f.seek(block["offset"])
+            data = decompress(index["codec"], f.read(block["length"]))
+        rows = [json.loads(line) for line in data.decode().splitlines() if line]
+        for row in rows:
+            row["created_at"] = parse_time(row["created_at"])
+        return rows
+
+    def query(
+        self,
+        since: Optional[datetime],
+        until: Optional[datetime],
+        method: Optional[str],
+        email: Optional[str],
+        search: Optional[str],
+        limit: int,
+        offset: int
+    ) -> Tuple[List[dict], int]:
+        since_key = since.isoformat() if since else None
+        until_key = until.isoformat() if until else None
+        needle = search.lower() if search else None
+
+        def keep(row: dict) -> bool:
+            created_at = row["created_at"].isoformat() if row["created_at"] else None
+            if since_key is not None and (created_at is None or created_at < since_key):
+                return False
+            if until_key is not None and (created_at is None or created_at >= until_key):
+                return False
+            if method and row["method"] != method:
+                return False
+            if email and row["email"] != email:
+                return False
+            if needle and not any(needle in (row[column] or "").lower() for column in ("request_body", "response_body")):
+                return False
+            return True
+
+        # 按时间从新到旧遍历命中的块，只有无法从索引得出行数的块才解压计数
+        candidates = []
+        for index in reversed(self.segments()):
+            for block in reversed(index["blocks"]):
+                if block_matches(block, since_key, until_key, method, email):
+                    candidates.append((index, block))
+
+        counts = []
+        decoded: Dict[int, List[dict]] = {}
+        for position, (index, block) in enumerate(candidates):
+            inside = block["since"] is not None and (since_key is None or block["since"] >= since_key) \
+                and (until_key is None or block["until"] < until_key)
+            if inside and not email and not needle:
+                counts.append(block["methods"].get(method, 0) if method else block["rows"])
+                continue
+            rows = [row for row in self.read_block(index, block) if keep(row)]
+            decoded[position] = rows
+            counts.append(len(rows))
+
+        rows = []
+        skip = offset
+        remaining = limit
+        for position, (index, block) in enumerate(candidates):
+            if remaining <= 0:
+                break
+            if skip >= counts[position]:
+                skip -= counts[position]
+                continue
+            block_rows = decoded.get(position)
+            if block_rows is None:
+                block_rows = [row for row in self.read_block(index, block) if keep(row)]
+            page = list(reversed(block_rows))[skip:skip + remaining]
+            rows.extend(page)
+            skip = 0
+            remaining -= len(page)
+        return rows, sum(counts)
+
+    async def search(
+        self,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        method: Optional[str] = None,
+        email: Optional[str] = None,
+        search: Optional[str] = None,
+        limit: int = 50,
+        offset: int = 0
+    ) -> Tuple[List[dict], int]:
+        # 直接读取段文件，不导回 SQLite；解压在线程中进行，不阻塞事件循环
+        return await asyncio.to_thread(self.query, since, until, method, email, search, limit, offset)
+
+    async def archive(self, before: datetime) -> List[dict]:
+        async with self._lock:
+            try:
+                archived = await asyncio.to_thread(archive_logs, before, self.log_db_path, self.archive_dir)
+            except Exception as e:
+                self.last_error = str(e)
+                raise
+            self.runs += 1
+            self.last_run = china_now().replace(tzinfo=None)
+            self.last_error = None
+            return archived
+
+    async def run(self):
+        while True:
+            days = get_runtime_config().get("log_archive_days")
+            if days:
+                try:
+                    await self.archive(china_now().replace(tzinfo=None) - timedelta(days=days))
+                except Exception as e:
+                    logger.warning(f"Failed to archive request logs: {e}")
+            await asyncio.sleep(ARCHIVE_CHECK_INTERVAL)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def snapshot(self) -> dict:
+        segments = self.segments()
+        return {
+            "directory": self.archive_dir,
+            "codec": DEFAULT_CODEC,
+            "runs": self.runs,
+            "last_run": self.last_run.isoformat() if self.last_run else None,
+            "last_error": self.last_error,
+            "segments": [
+                {key: index[key] for key in ("segment", "partition", "rows", "first_id", "last_id", "since", "until", "size")}
+                | {"blocks": len(index["blocks"])}
+                for index in reversed(segments)
+            ],
+        }
+
+
+@lru_cache()
+def get_log_archive() -> LogArchive:
+    return LogArchive()
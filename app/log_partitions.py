@@ -0,0 +1,206 @@
+import os
+import sqlite3
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+from typing import List, Optional
+
+from sqlalchemy import MetaData, Table, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import RequestLog
+
+PARTITION_DAYS = max(1, int(os.getenv("LINSPIRER_LOG_PARTITION_DAYS", "1")))
+# 分区前的日志表，升级后保留为最早的一个分区，不再写入
+LEGACY_TABLE = "request_logs"
+PARTITION_PREFIX = "request_logs_"
+# 分区表的自增 id 从 起始日序号 * ID_SPAN 开始：id 全局唯一、随时间递增，并且可以直接算出所在分区
+ID_SPAN = 10 ** 9
+EPOCH = date(1970, 1, 1)
+# 会话按映射把 RequestLog 路由到日志库，分区表没有映射，执行时显式指定
+LOG_BIND = {"mapper": RequestLog}
+
+TABLE_DDL = '''
+    CREATE TABLE IF NOT EXISTS "{name}" (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        method TEXT,
+        request_body TEXT,
+        response_body TEXT,
+        intercepted_request TEXT,
+        intercepted_response TEXT,
+        request_interception_action TEXT,
+        response_interception_action TEXT,
+        email TEXT,
+        json_validated BOOLEAN DEFAULT 0,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+SEED_SEQUENCE = "INSERT INTO sqlite_sequence (name, seq) SELECT :name, :seq WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = :name)"
+LIST_TABLES = "SELECT name FROM sqlite_master WHERE type = 'table' AND (name = 'request_logs' OR name LIKE 'request\\_logs\\_%' ESCAPE '\\')"
+
+
+def create_table_sql(name: str) -> str:
+    return TABLE_DDL.format(name=name)
+
+
+def day_index(moment: datetime) -> int:
+    return (moment.date() - EPOCH).days
+
+
+def partition_key(moment: datetime, days: int = PARTITION_DAYS) -> int:
+    index = day_index(moment)
+    return index - index % days
+
+
+def key_start(key: int) -> datetime:
+    return datetime.combine(EPOCH + timedelta(days=key), time.min)
+
+
+def partition_name(key: int) -> str:
+    return PARTITION_PREFIX + (EPOCH + timedelta(days=key)).strftime("%Y%m%d")
+
+
+def parse_partition_name(name: str) -> Optional[int]:
+    suffix = name[len(PARTITION_PREFIX):]
+    if not name.startswith(PARTITION_PREFIX) or len(suffix) != 8 or not suffix.isdigit():
+        return None
+    try:
+        return (datetime.strptime(suffix, "%Y%m%d").date() - EPOCH).days
+    except ValueError:
+        return None
+
+
+def key_of_id(id: int) -> int:
+    return id // ID_SPAN
+
+
+@lru_cache(maxsize=None)
+def log_table(name: str) -> Table:
+    return RequestLog.__table__.to_metadata(MetaData(), name=name)
+
+
+class Partition:
+    __slots__ = ("name", "key", "start", "end", "table")
+
+    def __init__(self, name: str, key: int, start: datetime, end: datetime):
+        self.name = name
+        self.key = key
+        self.start = start
+        # 分区的结束时间是下一个分区的开始时间，最新分区没有上界
+        self.end = end
+        self.table = log_table(name)
+
+    def overlaps(self, since: Optional[datetime], until: Optional[datetime]) -> bool:
+        return (until is None or self.start < until) and (since is None or self.end > since)
+
+    def snapshot(self) -> dict:
+        return {
+            "name": self.name,
+            "start": None if self.start == datetime.min else self.start.isoformat(),
+            "end": None if self.end == datetime.max else self.end.isoformat(),
+        }
+
+
+def build_partitions(names: List[str]) -> List[Partition]:
+    # 按时间从旧到新排列
+    keys = sorted(key for key in map(parse_partition_name, names) if key is not None)
+    bounds = [key_start(key) for key in keys] + [datetime.max]
+    partitions = []
+    if LEGACY_TABLE in names:
+        partitions.append(Partition(LEGACY_TABLE, 0, datetime.min, bounds[0]))
+    for index, key in enumerate(keys):
+        partitions.append(Partition(partition_name(key), key, bounds[index], bounds[index + 1]))
+    return partitions
+
+
+async def list_partitions(db: AsyncSession) -> List[Partition]:
+    result = await db.execute(text(LIST_TABLES), bind_arguments=LOG_BIND)
+    return build_partitions([row[0] for row in result])
+
+
+def select_partitions(
+    partitions: List[Partition], since: Optional[datetime] = None, until: Optional[datetime] = None
+) -> List[Partition]:
+    return [partition for partition in partitions if partition.overlaps(since, until)]
+
+
+def find_partition(partitions: List[Partition], id: int) -> Optional[Partition]:
+    key = key_of_id(id)
+    for partition in partitions:
+        if partition.key == key:
+            return partition
+    return None
+
+
+def write_key(partitions: List[Partition], moment: datetime, days: int = PARTITION_DAYS) -> int:
+    # 写入覆盖该时间的已有分区；修改分区天数后不会在已有分区中间插入新分区
+    for partition in reversed(partitions):
+        if partition.name == LEGACY_TABLE or partition.start > moment:
+            continue
+        if moment < partition.start + timedelta(days=days):
+            return partition.key
+        break
+    return partition_key(moment, days)
+
+
+async def create_partition(db: AsyncSession, key: int) -> str:
+    name = partition_name(key)
+    await db.execute(text(create_table_sql(name)), bind_arguments=LOG_BIND)
+    await db.execute(text(SEED_SEQUENCE), {"name": name, "seq": key * ID_SPAN}, bind_arguments=LOG_BIND)
+    return name
+
+
+async def drop_partitions(db: AsyncSession, partitions: List[Partition]) -> List[str]:
+    for partition in partitions:
+        # DROP TABLE 直接释放整张表的页，不逐行删除
+        await db.execute(text(f'DROP TABLE IF EXISTS "{partition.name}"'), bind_arguments=LOG_BIND)
+    return [partition.name for partition in partitions]
+
+
+def expired_partitions(partitions: List[Partition], before: datetime) -> List[Partition]:
+    # 只删除整个时间范围都早于 before 的分区，最新分区始终保留
+    return [partition for partition in partitions if partition.end <= before]
+
+
+class PartitionWriter:
+    # 缓存当前写入的分区，只在时间越过分区范围时才重新查询和建表
+    def __init__(self, days: int = PARTITION_DAYS):
+        self.days = days
+        self.table: Optional[Table] = None
+        self.start = datetime.max
+        self.end = datetime.min
+
+    async def table_for(self, db: AsyncSession, moment: datetime) -> "tuple[Table, bool]":
+        if self.start <= moment < self.end:
+            return self.table, False
+        partitions = await list_partitions(db)
+        key = write_key(partitions, moment, self.days)
+        existing = [partition for partition in partitions if partition.key == key and partition.name != LEGACY_TABLE]
+        created = not existing
+        name = await create_partition(db, key)
+        start = key_start(key)
+        following = [partition.start for partition in partitions if partition.start > start]
+        self.table = log_table(name)
+        self.start = start
+        self.end = min([start + timedelta(days=self.days)] + following)
+        return self.table, created
+
+    def reset(self):
+        self.table = None
+        self.start = datetime.max
+        self.end = datetime.min
+
+
+@lru_cache()
+def get_partition_writer() -> PartitionWriter:
+    return PartitionWriter()
+
+
+def partition_names_sync(conn: sqlite3.Connection) -> List[str]:
+    return [partition.name for partition in build_partitions([row[0] for row in conn.execute(LIST_TABLES)])]
+
+
+def ensure_partition_sync(conn: sqlite3.Connection, key: int) -> str:
+    name = partition_name(key)
+    conn.execute(create_table_sql(name))
+    conn.execute(SEED_SEQUENCE, {"name": name, "seq": key * ID_SPAN})
+    return name
@@ -0,0 +1,201 @@
+import json
+import random
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from app.log_render import ensure_json_text
+from app.method_patterns import MethodMatcher, method_pattern_errors
+from app.runtime_config import get_runtime_config
+
+POLICY_KEY = "log_policies"
+POLICY_FIELDS = {"sample_rate", "always_log_intercepted", "max_body_bytes", "include_fields", "exclude_fields", "summary_only"}
+BODY_FIELDS = ["request_body", "response_body", "intercepted_request", "intercepted_response"]
+
+
+class LogPolicyError(ValueError):
+    pass
+
+
+def parse_paths(name: str, value: Any) -> List[List[str]]:
+    if value is None:
+        return []
+    if not isinstance(value, list) or not all(isinstance(path, str) and path for path in value):
+        raise LogPolicyError(f"{name} must be a list of dotted field paths")
+    return [path.split(".") for path in value]
+
+
+def parse_flag(pattern: str, config: dict, name: str, default: bool) -> bool:
+    value = config.get(name, default)
+    if not isinstance(value, bool):
+        raise LogPolicyError(f"policy for '{pattern}': {name} must be true or false")
+    return value
+
+
+def pick(document: Any, paths: List[List[str]]) -> Any:
+    # 只保留列出的字段路径，其余字段丢弃
+    if not isinstance(document, dict):
+        return document
+    picked: Dict[str, Any] = {}
+    for path in paths:
+        source, target = document, picked
+        for index, key in enumerate(path):
+            if not isinstance(source, dict) or key not in source:
+                break
+            if index == len(path) - 1:
+                target[key] = source[key]
+            else:
+                source = source[key]
+                target = target.setdefault(key, {})
+    return picked
+
+
+def drop(document: Any, paths: List[List[str]]) -> Any:
+    for path in paths:
+        node = document
+        for key in path[:-1]:
+            node = node.get(key) if isinstance(node, dict) else None
+        if isinstance(node, dict):
+            node.pop(path[-1], None)
+    return document
+
+
+class LogPolicyStats:
+    def __init__(self):
+        self.kept = 0
+        self.sampled_out = 0
+        self.truncated = 0
+
+    def snapshot(self) -> dict:
+        return {"kept": self.kept, "sampled_out": self.sampled_out, "truncated": self.truncated}
+
+
+class LogPolicy:
+    def __init__(self, pattern: str, config: dict):
+        if not isinstance(config, dict):
+            raise LogPolicyError(f"policy for '{pattern}' must be an object")
+        unknown = set(config) - POLICY_FIELDS
+        if unknown:
+            raise LogPolicyError(f"policy for '{pattern}' has unknown field(s): {', '.join(sorted(unknown))}")
+        try:
+            self.sample_rate = float(config.get("sample_rate", 1.0))
+            self.max_body_bytes = int(config.get("max_body_bytes", 0))
+        except (TypeError, ValueError):
+            raise LogPolicyError(f"policy for '{pattern}': sample_rate must be a number and max_body_bytes an integer")
+        if not 0 <= self.sample_rate <= 1:
+            raise LogPolicyError(f"policy for '{pattern}': sample_rate must be between 0 and 1")
+        if self.max_body_bytes < 0:
+            raise LogPolicyError(f"policy for '{pattern}': max_body_bytes must not be negative")
+        self.pattern = pattern
+        self.always_log_intercepted = parse_flag(pattern, config, "always_log_intercepted", True)
+        self.summary_only = parse_flag(pattern, config, "summary_only", False)
+        self.include = parse_paths("include_fields", config.get("include_fields"))
+        self.exclude = parse_paths("exclude_fields", config.get("exclude_fields"))
+        self.stats = LogPolicyStats()
+
+    def sampled(self) -> bool:
+        # 在请求开始时决定，未抽中的请求可以不序列化请求体
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def keeps(self, sampled: bool, intercepted: bool) -> bool:
+        if sampled or (intercepted and self.always_log_intercepted):
+            self.stats.kept += 1
+            return True
+        self.stats.sampled_out += 1
+        return False
+
+    def body(self, value: Optional[str]) -> Optional[str]:
+        # 返回的文本都是合法 JSON，写入时无需再次校验
+        if not value or self.summary_only:
+            return None
+        if self.include or self.exclude:
+            try:
+                document = json.loads(value)
+            except json.JSONDecodeError:
+                value = json.dumps(value, ensure_ascii=False)
+            else:
+                if self.include:
+                    document = pick(document, self.include)
+                value = json.dumps(drop(document, self.exclude), ensure_ascii=False)
+        else:
+            value = ensure_json_text(value)
+        if self.max_body_bytes:
+            encoded = value.encode()
+            if len(encoded) > self.max_body_bytes:
+                self.stats.truncated += 1
+                value = json.dumps({
+                    "_truncated": True,
+                    "size": len(encoded),
+                    "head": encoded[:self.max_body_bytes].decode(errors="ignore"),
+                }, ensure_ascii=False)
+        return value
+
+    def bodies(self, bodies: Dict[str, Optional[str]]) -> Dict[str, Optional[str]]:
+        return {field: self.body(bodies.get(field)) for field in BODY_FIELDS}
+
+    def describe(self) -> dict:
+        return {
+            "pattern": self.pattern,
+            "sample_rate": self.sample_rate,
+            "always_log_intercepted": self.always_log_intercepted,
+            "max_body_bytes": self.max_body_bytes,
+            "include_fields": [".".join(path) for path in self.include],
+            "exclude_fields": [".".join(path) for path in self.exclude],
+            "summary_only": self.summary_only,
+            **self.stats.snapshot(),
+        }
+
+
+class LogPolicies:
+    def __init__(self, policies: List[LogPolicy]):
+        self.policies = policies
+        self.matcher: MethodMatcher[LogPolicy] = MethodMatcher()
+        for policy in policies:
+            self.matcher.add(policy.pattern, policy)
+
+    def match(self, method: str) -> Optional[LogPolicy]:
+        matched = self.matcher.resolve(method or "")
+        return matched[0] if matched else None
+
+
+def compile_policies(raw: str) -> LogPolicies:
+    # 配置为 {"方法名或模式": {"sample_rate": 0.01, ...}}，方法名模式与规则相同，精确 > 最长前缀 > 其他模式
+    try:
+        config = json.loads(raw) if raw and raw.strip() else {}
+    except json.JSONDecodeError as e:
+        raise LogPolicyError(f"log policies are not valid JSON: {e}")
+    if not isinstance(config, dict):
+        raise LogPolicyError("log policies must be an object keyed by method name")
+    policies = []
+    for pattern, policy_config in config.items():
+        errors = method_pattern_errors(pattern)
+        if errors:
+            raise LogPolicyError(f"policy '{pattern}': {errors[0]}")
+        policies.append(LogPolicy(pattern, policy_config))
+    return LogPolicies(policies)
+
+
+def parse_log_policies(value: str) -> str:
+    compile_policies(value)
+    return json.dumps(json.loads(value) if value.strip() else {}, ensure_ascii=False)
+
+
+class LogPolicyCache:
+    def __init__(self):
+        self.policies = compile_policies(get_runtime_config().get(POLICY_KEY))
+
+    def on_config_change(self, changed: Dict[str, str], raw: Dict[str, str]):
+        if POLICY_KEY in changed:
+            self.policies = compile_policies(get_runtime_config().get(POLICY_KEY))
+
+    def match(self, method: str) -> Optional[LogPolicy]:
+        return self.policies.match(method)
+
+    def snapshot(self) -> List[dict]:
+        return [policy.describe() for policy in self.policies.policies]
+
+
+@lru_cache()
+def get_log_policies() -> LogPolicyCache:
+    cache = LogPolicyCache()
+    get_runtime_config().on_change(cache.on_config_change)
+    return cache
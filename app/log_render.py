@@ -0,0 +1,67 @@
+import json
+from typing import Iterable, List, Mapping, Optional
+
+SUMMARY_COLUMNS = [
+    "id", "method", "request_interception_action", "response_interception_action", "email", "created_at",
+]
+BODY_COLUMNS = ["request_body", "response_body", "intercepted_request", "intercepted_response"]
+# 与 RequestLogResponse 保持一致：请求/响应体为空时返回 {}，拦截内容为空时返回 null
+EMPTY_BODY = {
+    "request_body": "{}",
+    "response_body": "{}",
+    "intercepted_request": "null",
+    "intercepted_response": "null",
+}
+
+
+def ensure_json_text(value: Optional[str]) -> Optional[str]:
+    # 写入时校验一次，无法解析的内容按 JSON 字符串保存，读取时即可直接拼接
+    if not value:
+        return value
+    try:
+        json.loads(value)
+        return value
+    except (json.JSONDecodeError, TypeError):
+        return json.dumps(value, ensure_ascii=False)
+
+
+def body_fragment(column: str, value: Optional[str], validated: bool) -> str:
+    if not value:
+        return EMPTY_BODY[column]
+    if validated:
+        return value
+    # 校验标记出现之前写入的旧日志仍需解析一次
+    try:
+        return json.dumps(json.loads(value), ensure_ascii=False)
+    except json.JSONDecodeError:
+        return json.dumps(value, ensure_ascii=False)
+
+
+def render_log(row: Mapping, bodies: Iterable[str]) -> str:
+    summary = {column: row[column] for column in SUMMARY_COLUMNS}
+    created_at = summary["created_at"]
+    summary["created_at"] = created_at.isoformat() if created_at is not None else None
+    head = json.dumps(summary, ensure_ascii=False)
+
+    validated = bool(row.get("json_validated"))
+    parts = [head[:-1]]
+    for column in bodies:
+        parts.append(f', "{column}": ')
+        parts.append(body_fragment(column, row[column], validated))
+    parts.append("}")
+    return "".join(parts)
+
+
+def render_page(rows: List[Mapping], total: int, bodies: Iterable[str]) -> str:
+    bodies = list(bodies)
+    return '{"data": [' + ", ".join(render_log(row, bodies) for row in rows) + f'], "total": {int(total)}}}'
+
+
+def parse_bodies(value: Optional[str]) -> List[str]:
+    if value is None:
+        return list(BODY_COLUMNS)
+    requested = [v.strip() for v in value.split(",") if v.strip()]
+    unknown = [v for v in requested if v not in BODY_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown body field(s): {', '.join(unknown)}. Must be among: {', '.join(BODY_COLUMNS)}")
+    return [column for column in BODY_COLUMNS if column in requested]
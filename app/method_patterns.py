@@ -0,0 +1,211 @@
+import fnmatch
+import re
+from typing import Dict, Generic, List, Optional, Pattern, Tuple, TypeVar
+
+T = TypeVar("T")
+
+EXACT = "exact"
+PREFIX = "prefix"
+GLOB = "glob"
+PATTERN = "pattern"
+REGEX_PREFIX = "re:"
+GLOB_CHARS = "*?["
+STAR = "*"
+ANY = "?"
+# 方法名由客户端提供，解析结果缓存需要有上限
+MAX_RESOLVED = 4096
+
+
+class MethodPatternError(ValueError):
+    pass
+
+
+def classify(method_name: str) -> Tuple[str, object]:
+    # com.linspirer.tactics.* 这类只在末尾带 * 的写法按前缀处理，其余通配符按 glob，re: 开头的按正则
+    if method_name.startswith(REGEX_PREFIX):
+        try:
+            return PATTERN, re.compile(method_name[len(REGEX_PREFIX):])
+        except re.error as e:
+            raise MethodPatternError(f"invalid method regex: {e}")
+    if not any(char in method_name for char in GLOB_CHARS):
+        return EXACT, method_name
+    if method_name.endswith("*") and not any(char in method_name[:-1] for char in GLOB_CHARS):
+        return PREFIX, method_name[:-1]
+    return GLOB, glob_tokens(method_name)
+
+
+def glob_tokens(pattern: str) -> list:
+    # 与 fnmatch 相同的语法：* 和 ? 为通配符，[...] 为字符集合（编译为单字符正则），没有闭合的 [ 按普通字符处理
+    tokens = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        i += 1
+        if char == STAR:
+            if not tokens or tokens[-1] != STAR:
+                tokens.append(STAR)
+        elif char == ANY:
+            tokens.append(ANY)
+        elif char == "[":
+            end = i
+            if end < len(pattern) and pattern[end] == "!":
+                end += 1
+            if end < len(pattern) and pattern[end] == "]":
+                end += 1
+            while end < len(pattern) and pattern[end] != "]":
+                end += 1
+            if end >= len(pattern):
+                tokens.append(char)
+            else:
+                tokens.append(re.compile(fnmatch.translate(pattern[i - 1:end + 1])))
+                i = end + 1
+        else:
+            tokens.append(char)
+    return tokens
+
+
+def method_pattern_errors(method_name: str) -> List[str]:
+    try:
+        classify(method_name)
+    except MethodPatternError as e:
+        return [str(e)]
+    return []
+
+
+class PrefixTrie(Generic[T]):
+    END = ""
+
+    def __init__(self):
+        self.root: dict = {}
+        self.size = 0
+
+    def insert(self, prefix: str, value: T):
+        node = self.root
+        for char in prefix:
+            node = node.setdefault(char, {})
+        if self.END not in node:
+            self.size += 1
+        node[self.END] = value
+
+    def matches(self, text: str) -> List[T]:
+        # 沿方法名逐字符向下，返回所有命中的前缀，最长的在前
+        found = []
+        node = self.root
+        if self.END in node:
+            found.append(node[self.END])
+        for char in text:
+            node = node.get(char)
+            if node is None:
+                break
+            if self.END in node:
+                found.append(node[self.END])
+        found.reverse()
+        return found
+
+
+class GlobNode:
+    __slots__ = ("chars", "any", "star", "classes", "values", "loop")
+
+    def __init__(self, loop: bool = False):
+        self.chars: dict = {}
+        self.any: Optional[GlobNode] = None
+        self.star: Optional[GlobNode] = None
+        self.classes: list = []
+        self.values: list = []
+        # * 对应的节点可以消耗任意字符并停留在原地
+        self.loop = loop
+
+
+def closure(states: dict, node: Optional[GlobNode]):
+    # * 可以匹配空串，进入节点的同时也进入它的 * 子节点
+    while node is not None and id(node) not in states:
+        states[id(node)] = node
+        node = node.star
+
+
+class GlobTrie(Generic[T]):
+    # glob 按字符编入带通配边的字典树，匹配时同时沿所有可能的路径前进，字面前缀不同的 glob 不会被访问
+    def __init__(self):
+        self.root = GlobNode()
+        self.size = 0
+
+    def insert(self, tokens: list, entry: Tuple[int, T]):
+        node = self.root
+        for token in tokens:
+            if token == STAR:
+                node.star = node.star or GlobNode(loop=True)
+                node = node.star
+            elif token == ANY:
+                node.any = node.any or GlobNode()
+                node = node.any
+            elif isinstance(token, str):
+                node = node.chars.setdefault(token, GlobNode())
+            else:
+                child = next((child for pattern, child in node.classes if pattern.pattern == token.pattern), None)
+                if child is None:
+                    child = GlobNode()
+                    node.classes.append((token, child))
+                node = child
+        node.values.append(entry)
+        self.size += 1
+
+    def matches(self, text: str) -> List[Tuple[int, T]]:
+        states: dict = {}
+        closure(states, self.root)
+        for char in text:
+            following: dict = {}
+            for node in states.values():
+                if node.loop:
+                    closure(following, node)
+                closure(following, node.chars.get(char))
+                closure(following, node.any)
+                for pattern, child in node.classes:
+                    if pattern.match(char):
+                        closure(following, child)
+            if not following:
+                return []
+            states = following
+        return [entry for node in states.values() for entry in node.values]
+
+
+class MethodMatcher(Generic[T]):
+    def __init__(self):
+        self.exact: Dict[str, T] = {}
+        self.prefixes: PrefixTrie[T] = PrefixTrie()
+        self.globs: GlobTrie[T] = GlobTrie()
+        # 正则无法合并进字典树，逐条匹配，耗时随正则模式数量线性增长
+        self.patterns: List[Tuple[int, Pattern, T]] = []
+        self.added = 0
+        self.resolved: Dict[str, List[T]] = {}
+
+    def add(self, method_name: str, value: T):
+        # 调用方按优先顺序加入，同类模式之间先加入者优先；glob 和正则之间按加入顺序排列
+        kind, key = classify(method_name)
+        self.added += 1
+        if kind == EXACT:
+            self.exact[key] = value
+        elif kind == PREFIX:
+            self.prefixes.insert(key, value)
+        elif kind == GLOB:
+            self.globs.insert(key, (self.added, value))
+        else:
+            self.patterns.append((self.added, key, value))
+
+    def resolve(self, method: str) -> List[T]:
+        # 按 精确 > 最长前缀 > 其他模式 的顺序返回所有命中项，同一方法名只解析一次
+        resolved = self.resolved.get(method)
+        if resolved is not None:
+            return resolved
+        resolved = []
+        exact = self.exact.get(method)
+        if exact is not None:
+            resolved.append(exact)
+        resolved.extend(self.prefixes.matches(method))
+        patterns = self.globs.matches(method)
+        patterns.extend((order, value) for order, pattern, value in self.patterns if pattern.match(method))
+        patterns.sort(key=lambda entry: entry[0])
+        resolved.extend(value for _, value in patterns)
+        if len(self.resolved) >= MAX_RESOLVED:
+            self.resolved.clear()
+        self.resolved[method] = resolved
+        return resolved
@@ -5,18 +5,28 @@ from starlette.types import ASGIApp
 from typing import Optional
 import json
 import logging
+import math
 import httpx
-import random
-import time
 
+from app.admission import AdmissionRejected, get_admission
 from app.auth import decode_access_token
 from app.crypto import Cryptor
 from app.config import get_settings
-from app.database import async_session_maker
-from app.repositories import LogsRepository, RulesRepository
+from app.database import async_session_maker, read_session_maker
+from app.devices import get_device_registry
+from app.live_tail import get_live_tail
+from app.log_policy import BODY_FIELDS, LogPolicy, get_log_policies
+from app.repositories import LogsRepository
+from app.resilience import CircuitOpenError, get_upstream
+from app.rule_cache import get_rule_cache
+from app.runtime_config import get_runtime_config
+from app.tactics import TACTICS_ACTION, get_tactics_cache
 
 logger = logging.getLogger(__name__)
 
+# 请求正文和改写后的请求都由代理用 json.dumps 生成，写入时无需再次校验；上游响应和自定义响应仍需校验
+SELF_SERIALIZED_FIELDS = ("request_body", "intercepted_request")
+
 
 async def save_log(
     method: str,
@@ -26,28 +36,64 @@ async def save_log(
     intercepted_response: str = None,
     req_action: str = None,
     resp_action: str = None,
-    email: str = None
+    email: str = None,
+    policy: Optional[LogPolicy] = None,
+    sampled: bool = True
 ):
-    try:
-        async with async_session_maker() as session:
-            await LogsRepository.create(
-                db=session,
-                method=method,
-                request_body=request_body,
-                response_body=response_body,
-                intercepted_request=intercepted_request,
-                intercepted_response=intercepted_response,
-                request_interception_action=req_action,
-                response_interception_action=resp_action,
-                email=email
-            )
-    except Exception as e:
-        logger.warning(f"Failed to save log: {e}")
+    log_id = None
+    bodies = {
+        "request_body": request_body,
+        "response_body": response_body,
+        "intercepted_request": intercepted_request,
+        "intercepted_response": intercepted_response,
+    }
+    # 没有匹配的日志策略时完整保存；未抽中且未被拦截的请求不写入，正文按策略截断或筛选字段
+    if get_runtime_config().get("request_logging_enabled") and (
+        policy is None or policy.keeps(sampled, bool(req_action or resp_action))
+    ):
+        try:
+            stored = policy.bodies(bodies) if policy is not None else bodies
+            async with async_session_maker() as session:
+                log_id = await LogsRepository.create(
+                    db=session,
+                    method=method,
+                    request_interception_action=req_action,
+                    response_interception_action=resp_action,
+                    email=email,
+                    retention_days=get_runtime_config().get("log_retention_days"),
+                    validated=BODY_FIELDS if policy is not None else SELF_SERIALIZED_FIELDS,
+                    **stored
+                )
+        except Exception as e:
+            logger.warning(f"Failed to save log: {e}")
+    
+    # 关闭请求日志时实时日志仍然可用，此时事件没有日志 id
+    get_live_tail().publish(log_id, method, email, req_action, resp_action, bodies)
+
+
+EMAIL_FIELDS = ["email", "userEmail", "user_email", "username", "userId", "user_id", "user"]
+
+
+def params_dict(params) -> dict:
+    if isinstance(params, str):
+        try:
+            params = json.loads(params)
+        except json.JSONDecodeError:
+            return {}
+    return params if isinstance(params, dict) else {}
+
+
+def extract_email(params: dict):
+    for field in EMAIL_FIELDS:
+        email = params.get(field)
+        if email:
+            return email
+    return None
 
 
-async def check_interception_rule(db_session, method: str, email: Optional[str] = None):
-    rule = await RulesRepository.find_by_method(db_session, method, email)
-    return rule
+async def check_interception_rule(db_session, method: str, email: Optional[str] = None, params: Optional[dict] = None):
+    # 规则从内存缓存中查找，会话只在缓存失效后重新加载时使用
+    return await get_rule_cache().find_compiled(db_session, method, email, params)
 
 
 
@@ -56,6 +102,8 @@ class ProxyMiddleware(BaseHTTPMiddleware):
         super().__init__(app)
         self.cryptor = cryptor
         self.settings = get_settings()
+        self.upstream = get_upstream()
+        self.admission = get_admission()
     
     async def dispatch(self, request: Request, call_next):
         if request.url.path != "/public-interface.php":
@@ -76,154 +124,166 @@ class ProxyMiddleware(BaseHTTPMiddleware):
         self.decrypt_params(request_json)
         method = request_json.get("method", "")
         
-        params = request_json.get("params", {})
-        email = None
-        email_fields = ["email", "userEmail", "user_email", "username", "userId", "user_id", "user"]
-        if isinstance(params, dict):
-            for field in email_fields:
-                email = params.get(field)
-                if email:
-                    break
-        elif isinstance(params, str):
-            try:
-                params_obj = json.loads(params)
-                if isinstance(params_obj, dict):
-                    for field in email_fields:
-                        email = params_obj.get(field)
-                        if email:
-                            break
-            except:
-                pass
+        params = params_dict(request_json.get("params", {}))
+        email = extract_email(params)
+        if email:
+            get_device_registry().record(str(email), method, params)
+        # 日志策略的抽样在请求开始时决定：不会保存、也没有实时日志客户端时不序列化请求体
+        log_policy = get_log_policies().match(method)
+        sampled = log_policy.sampled() if log_policy is not None else True
         
-        async with async_session_maker() as db_session:
-            rule = await check_interception_rule(db_session, method, email)
-            
-            intercepted_req = None
-            req_action = None
+        # 规则和策略模板缓存失效后从只读连接池重新加载，日志写入使用单独的写连接；
+        # 查询完成后立即归还只读连接，等待准入和上游响应时不占用连接池
+        tactics = None
+        matched = None
+        async with read_session_maker() as db_session:
+            # 已应用的策略模板优先于拦截规则，直接返回预先加密好的响应
+            if method == self.settings.LINSPIRER_TACTICS_METHOD:
+                tactics = await get_tactics_cache().find(db_session, email, self.cryptor)
+            if tactics is None:
+                matched = await check_interception_rule(db_session, method, email, params)
+        
+        request_body_for_log = json.dumps(request_json) if sampled or get_live_tail().wants_bodies() else None
+        
+        if tactics is not None:
+            logger.info(f"Serving tactics template {tactics.template_id} for email={email}")
+            request_body_for_log = request_body_for_log or json.dumps(request_json)
+            await save_log(
+                method=method,
+                request_body=request_body_for_log,
+                response_body=tactics.body,
+                intercepted_request=None,
+                intercepted_response=tactics.body,
+                req_action=None,
+                resp_action=TACTICS_ACTION,
+                email=email,
+                policy=log_policy,
+                sampled=sampled
+            )
+            return Response(
+                content=tactics.encrypted,
+                status_code=200,
+                headers={"Content-Type": "application/json"},
+            )
+        
+        intercepted_req = None
+        req_action = None
+        
+        if matched:
+            rule = matched.rule
+            logger.info(f"Found interception rule for method '{method}': action={rule.action}")
+            # 转换失败时需要从原始文本恢复请求，被拦截的请求也可能按策略始终保存
+            request_body_for_log = request_body_for_log or json.dumps(request_json)
             
-            if rule:
-                logger.info(f"Found interception rule for method '{method}': action={rule.action}")
+            # 规则的转换流水线在规则缓存加载时已编译
+            custom_response_str, resp_name = matched.pipeline.respond(request_json)
+            if custom_response_str is not None:
+                encrypted_response = self.cryptor.encrypt(custom_response_str)
+                logger.info(f"{resp_name} rule answered method={method} without upstream, saving log")
                 
-                if rule.action == "replace":
-                    try:
-                        custom_response = json.loads(rule.custom_response) if rule.custom_response else {}
-                        custom_response_str = json.dumps(custom_response)
-                        encrypted_response = self.cryptor.encrypt(custom_response_str)
-                        
-                        logger.info(f"Replace rule applied for method={method}, saving log with replace action")
-                        
-                        await save_log(
-                            method=method,
-                            request_body=json.dumps(request_json),
-                            response_body=custom_response_str,
-                            intercepted_request=json.dumps(request_json),
-                            intercepted_response=custom_response_str,
-                            req_action=None,
-                            resp_action="replace",
-                            email=email
-                        )
-                        
-                        return Response(
-                            content=encrypted_response,
-                            status_code=200,
-                            headers={"Content-Type": "application/json"},
-                        )
-                    except Exception as e:
-                        logger.error(f"Failed to apply replace rule: {e}")
-                
-                elif rule.action == "modify":
-                    try:
-                        custom_request = json.loads(rule.custom_response) if rule.custom_response else {}
-                        modified_request = custom_request
-                        request_body_for_log = json.dumps(request_json)
-                        intercepted_req = json.dumps(modified_request)
-                        req_action = "modify"
-                        encrypted_request_body = self.encrypt_request_json(modified_request)
-                        logger.info(f"Modify rule applied for method={method}, saving log with modify action")
-                    except Exception as e:
-                        logger.error(f"Failed to apply modify rule: {e}")
-                        request_body_for_log = json.dumps(request_json)
-                        encrypted_request_body = self.encrypt_request_json(request_json)
+                await save_log(
+                    method=method,
+                    request_body=request_body_for_log,
+                    response_body=custom_response_str,
+                    intercepted_request=request_body_for_log,
+                    intercepted_response=custom_response_str,
+                    req_action=None,
+                    resp_action=resp_name,
+                    email=email,
+                    policy=log_policy,
+                    sampled=sampled
+                )
                 
-                elif rule.action == "randomize_app_duration":
-                    try:
-                        modified_request = self.randomize_app_duration(request_json, rule.custom_response)
-                        request_body_for_log = json.dumps(request_json)
-                        intercepted_req = json.dumps(modified_request)
-                        req_action = "randomize_app_duration"
-                        encrypted_request_body = self.encrypt_request_json(modified_request)
-                        logger.info(f"Randomize app duration rule applied for method={method}")
-                    except Exception as e:
-                        logger.error(f"Failed to apply randomize app duration rule: {e}")
-                        request_body_for_log = json.dumps(request_json)
-                        encrypted_request_body = self.encrypt_request_json(request_json)
+                return Response(
+                    content=encrypted_response,
+                    status_code=200,
+                    headers={"Content-Type": "application/json"},
+                )
+            
+            modified_request, applied = matched.pipeline.apply_request(request_json, request_body_for_log)
+            if applied:
+                intercepted_req = json.dumps(modified_request)
+                req_action = "+".join(applied)
+                logger.info(f"Request transforms {req_action} applied for method={method}")
+            encrypted_request_body = self.encrypt_request_json(modified_request)
+        
+        else:
+            # 没有规则时，使用原始请求
+            encrypted_request_body = self.encrypt_request_json(request_json)
+        
+        try:
+            # 只限制发往上游的请求，策略模板和规则直接应答的请求不受影响
+            async with self.admission.admit(method, email and str(email)):
+                target_response = await self.upstream.post(
+                    method,
+                    request.url.path,
+                    content=encrypted_request_body,
+                    headers={"Content-Type": "application/json"},
+                )
+            
+            response_body = target_response.text
+            
+            try:
+                decrypted_response = self.cryptor.decrypt(response_body)
+            except Exception as e:
+                logger.warning(f"Failed to decrypt response: {e}. Using original response.")
+                decrypted_response = response_body
             
-            else:
-                # 没有规则时，使用原始请求
-                request_body_for_log = json.dumps(request_json)
-                encrypted_request_body = self.encrypt_request_json(request_json)
+            intercepted_resp = None
+            resp_action = None
             
-            target_url = self.settings.LINSPIRER_TARGET_URL + request.url.path
+            if matched:
+                decrypted_response, applied = matched.pipeline.apply_response(decrypted_response)
+                if applied:
+                    intercepted_resp = decrypted_response
+                    resp_action = "+".join(applied)
             
-            async with httpx.AsyncClient(verify=False, timeout=30.0) as client:
-                try:
-                    target_response = await client.post(
-                        target_url,
-                        content=encrypted_request_body,
-                        headers={"Content-Type": "application/json"},
-                    )
-                    
-                    response_body = target_response.text
-                    
-                    try:
-                        decrypted_response = self.cryptor.decrypt(response_body)
-                    except Exception as e:
-                        logger.warning(f"Failed to decrypt response: {e}. Using original response.")
-                        decrypted_response = response_body
-                    
-                    intercepted_resp = None
-                    resp_action = None
-                    
-                    # 只有replace动作才修改响应
-                    if rule and rule.action == "replace":
-                        try:
-                            custom_response = json.loads(rule.custom_response) if rule.custom_response else {}
-                            decrypted_response = json.dumps(custom_response)
-                            intercepted_resp = decrypted_response
-                            resp_action = rule.action
-                        except Exception as e:
-                            logger.error(f"Failed to apply replace rule to response: {e}")
-                    
-                    try:
-                        encrypted_response = self.cryptor.encrypt(decrypted_response)
-                    except Exception as e:
-                        logger.warning(f"Failed to encrypt response: {e}")
-                        encrypted_response = response_body
-                    
-                    logger.info(f"Saving log: method={method}, req_action={req_action}, resp_action={resp_action}")
-                    
-                    await save_log(
-                        method=method,
-                        request_body=request_body_for_log,
-                        response_body=decrypted_response,
-                        intercepted_request=intercepted_req,
-                        intercepted_response=intercepted_resp,
-                        req_action=req_action,
-                        resp_action=resp_action,
-                        email=email
-                    )
-                    
-                    return Response(
-                        content=encrypted_response,
-                        status_code=target_response.status_code,
-                        headers={"Content-Type": "application/json"},
-                    )
-                except httpx.RequestError as e:
-                    logger.error(f"Proxy error: {e}")
-                    return JSONResponse(
-                        status_code=502,
-                        content={"error": f"Failed to connect to target: {str(e)}"},
-                    )
+            try:
+                encrypted_response = self.cryptor.encrypt(decrypted_response)
+            except Exception as e:
+                logger.warning(f"Failed to encrypt response: {e}")
+                encrypted_response = response_body
+            
+            logger.info(f"Saving log: method={method}, req_action={req_action}, resp_action={resp_action}")
+            
+            await save_log(
+                method=method,
+                request_body=request_body_for_log,
+                response_body=decrypted_response,
+                intercepted_request=intercepted_req,
+                intercepted_response=intercepted_resp,
+                req_action=req_action,
+                resp_action=resp_action,
+                email=email,
+                policy=log_policy,
+                sampled=sampled
+            )
+            
+            return Response(
+                content=encrypted_response,
+                status_code=target_response.status_code,
+                headers={"Content-Type": "application/json"},
+            )
+        except AdmissionRejected as e:
+            logger.warning(f"Shedding method={method} email={email}: {e.scope} {e.reason}")
+            return JSONResponse(
+                status_code=503,
+                content={"error": str(e)},
+                headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))},
+            )
+        except CircuitOpenError as e:
+            logger.warning(f"Upstream circuit open for method={method}, failing fast")
+            return JSONResponse(
+                status_code=503,
+                content={"error": str(e)},
+                headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))},
+            )
+        except httpx.RequestError as e:
+            logger.error(f"Proxy error: {e}")
+            return JSONResponse(
+                status_code=502,
+                content={"error": f"Failed to connect to target: {str(e)}"},
+            )
     
     def decrypt_params(self, request: dict):
         if "params" in request and isinstance(request["params"], str):
@@ -251,105 +311,6 @@ class ProxyMiddleware(BaseHTTPMiddleware):
             request["_rule_info"] = rule_info
         
         return json.dumps(request)
-    
-    def randomize_app_duration(self, request_json: dict, config_str: str = None) -> dict:
-        modified_request = request_json.copy()
-        params = modified_request.get("params", {})
-        if not isinstance(params, dict):
-            return request_json
-        
-        logs = params.get("logs", [])
-        if not logs or not isinstance(logs, list):
-            return request_json
-        
-        try:
-            config = json.loads(config_str) if config_str else {}
-        except json.JSONDecodeError:
-            config = {}
-        
-        target_packages = config.get("packages", ["com.kingsoft"])
-        max_duration_ms = int(config.get("max_duration_minutes", 30)) * 60 * 1000
-        keep_count = config.get("keep_count", 2)
-        
-        filtered_logs = []
-        package_durations = {}
-        action_details = []
-        
-        for log in logs:
-            if not isinstance(log, dict):
-                continue
-            
-            package_name = log.get("mPackageName", "")
-            if package_name not in target_packages:
-                filtered_logs.append(log)
-                continue
-            
-            begin_time = log.get("mBeginTimeStamp", 0)
-            end_time = log.get("mEndTimeStamp", 0)
-            duration = end_time - begin_time
-            
-            if package_name not in package_durations:
-                package_durations[package_name] = []
-            
-            package_durations[package_name].append({
-                "log": log,
-                "duration": duration,
-                "begin_time": begin_time
-            })
-        
-        for package, package_logs in package_durations.items():
-            if not package_logs:
-                continue
-            
-            long_logs = [p for p in package_logs if p["duration"] > max_duration_ms]
-            short_logs = [p for p in package_logs if p["duration"] <= max_duration_ms]
-            
-            for log_info in long_logs:
-                original_duration = log_info["duration"]
-                new_duration = random.randint(1, max_duration_ms // 1000) * 1000
-                new_end_time = log_info["begin_time"] + new_duration
-                
-                log_info["log"]["mEndTimeStamp"] = new_end_time
-                log_info["log"]["mDuration"] = new_duration
-                
-                action_details.append({
-                    "package": package,
-                    "original_duration_ms": original_duration,
-                    "new_duration_ms": new_duration,
-                    "original_end_time": log_info["begin_time"] + original_duration,
-                    "new_end_time": new_end_time
-                })
-            
-            modified_logs = [p["log"] for p in package_logs]
-            
-            original_count = len(modified_logs)
-            if len(modified_logs) > keep_count:
-                indices_to_keep = sorted(random.sample(range(len(modified_logs)), keep_count))
-                modified_logs = [modified_logs[i] for i in indices_to_keep]
-                action_details.append({
-                    "action": "reduce_count",
-                    "package": package,
-                    "original_count": original_count,
-                    "new_count": keep_count
-                })
-            
-            filtered_logs.extend(modified_logs)
-        
-        params["logs"] = filtered_logs
-        modified_request["params"] = params
-        
-        # 添加规则信息到请求中，用于日志记录
-        modified_request["_rule_info"] = {
-            "method": request_json.get("method", ""),
-            "status": "Enabled",
-            "action": "randomize_app_duration",
-            "type": "全局",
-            "config": config,
-            "action_details": action_details
-        }
-        
-        logger.info(f"Applied randomize_app_duration rule: {json.dumps(action_details)}")
-        return modified_request
 
 
 class AuthMiddleware(BaseHTTPMiddleware):
@@ -1,6 +1,7 @@
 from sqlalchemy import Column, String, Integer, Boolean, DateTime, Text, CheckConstraint, Index
 from sqlalchemy.orm import declarative_base
 from datetime import datetime
+from typing import List, Optional
 import pytz
 
 Base = declarative_base()
@@ -27,15 +28,53 @@ class InterceptionRule(Base):
     remark = Column(String, nullable=True, default=None)
     is_enabled = Column(Boolean, default=True)
     is_global = Column(Boolean, default=False)
+    conditions = Column(Text, nullable=True, default=None)
+    priority = Column(Integer, default=0, server_default="0")
     created_at = Column(DateTime, default=china_now)
     updated_at = Column(DateTime, default=china_now, onupdate=china_now)
     
     __table_args__ = (
-        CheckConstraint("action IN ('passthrough', 'modify', 'replace', 'randomize_app_duration')", name="check_action"),
         Index('idx_interception_rules_method_email', 'method_name', 'email'),
     )
 
 
+def split_emails(value: Optional[str]) -> List[str]:
+    if not value:
+        return []
+    emails = []
+    for email in value.split(","):
+        email = email.strip()
+        if email and email not in emails:
+            emails.append(email)
+    return emails
+
+
+class RuleTarget(Base):
+    # 用户规则的邮箱逐个存储，email 列仍保留管理接口使用的逗号分隔形式
+    __tablename__ = "rule_targets"
+    rule_id = Column(Integer, primary_key=True)
+    email = Column(String, primary_key=True)
+    method_name = Column(String, nullable=False)
+    
+    __table_args__ = (
+        Index('idx_rule_targets_email_method', 'email', 'method_name'),
+    )
+
+
+class TacticsTemplate(Base):
+    # email 为空时对所有用户生效，否则为逗号分隔的邮箱列表；只有 is_applied 的模板会下发
+    __tablename__ = "tactics_templates"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    name = Column(String, nullable=False)
+    template_json = Column(Text, nullable=False)
+    email = Column(String, nullable=True)
+    is_default = Column(Boolean, default=False)
+    is_applied = Column(Boolean, default=False)
+    description = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=china_now)
+    updated_at = Column(DateTime, default=china_now, onupdate=china_now)
+
+
 class Command(Base):
     __tablename__ = "commands"
     id = Column(Integer, primary_key=True, autoincrement=True)
@@ -47,9 +86,35 @@ class Command(Base):
     
     __table_args__ = (
         CheckConstraint("status IN ('unverified', 'verified', 'rejected')", name="check_status"),
+        Index('idx_commands_status_received_at', 'status', 'received_at'),
+        Index('idx_commands_received_at', 'received_at'),
     )
 
 
+class Device(Base):
+    # 由代理请求批量更新，邮箱列表和设备概况不再扫描日志表
+    __tablename__ = "devices"
+    email = Column(String, primary_key=True)
+    first_seen = Column(DateTime, nullable=True)
+    last_seen = Column(DateTime, nullable=True)
+    request_count = Column(Integer, default=0)
+    last_method = Column(String, nullable=True)
+    model = Column(String, nullable=True)
+    swdid = Column(String, nullable=True)
+    
+    __table_args__ = (
+        Index('idx_devices_last_seen', 'last_seen'),
+    )
+
+
+class DeviceMethod(Base):
+    __tablename__ = "device_methods"
+    email = Column(String, primary_key=True)
+    method = Column(String, primary_key=True)
+    request_count = Column(Integer, default=0)
+    last_seen = Column(DateTime, nullable=True)
+
+
 class RequestLog(Base):
     __tablename__ = "request_logs"
     id = Column(Integer, primary_key=True, autoincrement=True)
@@ -61,6 +126,7 @@ class RequestLog(Base):
     request_interception_action = Column(String, nullable=True)
     response_interception_action = Column(String, nullable=True)
     email = Column(String, nullable=True)
+    json_validated = Column(Boolean, default=False)
     created_at = Column(DateTime, default=china_now)
 
 
@@ -1,11 +1,37 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, text
+from sqlalchemy import select, text, func, update, delete, insert, and_, or_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import selectinload
-from typing import List, Optional, Tuple
-from datetime import datetime
+from typing import AsyncIterator, Collection, Dict, List, Optional, Tuple
+from datetime import datetime, timedelta
+import base64
 import json
 
-from app.models import Config, InterceptionRule, Command, RequestLog, china_now
+from app.models import (
+    Config, InterceptionRule, RuleTarget, TacticsTemplate, Command, Device, DeviceMethod, RequestLog, china_now,
+    split_emails,
+)
+from app.log_partitions import (
+    LOG_BIND, drop_partitions, expired_partitions, find_partition, get_partition_writer, list_partitions,
+    select_partitions,
+)
+from app.log_render import SUMMARY_COLUMNS, ensure_json_text
+from app.rule_conditions import dump_conditions
+
+BULK_CHUNK_SIZE = 500
+RULES_VERSION_KEY = "rules_version"
+TACTICS_VERSION_KEY = "tactics_version"
+RULE_FIELDS = ["method_name", "email", "action", "custom_response", "remark", "is_enabled", "is_global", "priority"]
+
+
+async def bump_counter(db: AsyncSession, key: str, description: str) -> None:
+    await db.execute(
+        text(
+            "INSERT INTO config (key, value, description) VALUES (:key, '1', :description) "
+            "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1"
+        ),
+        {"key": key, "description": description}
+    )
 
 
 class ConfigRepository:
@@ -28,6 +54,17 @@ class ConfigRepository:
             config = Config(key=key, value=value, description=description)
             db.add(config)
         await db.commit()
+    
+    @staticmethod
+    async def delete(db: AsyncSession, key: str) -> bool:
+        result = await db.execute(select(Config).where(Config.key == key))
+        config = result.scalar_one_or_none()
+        if not config:
+            return False
+        
+        await db.delete(config)
+        await db.commit()
+        return True
 
 
 class RulesRepository:
@@ -36,40 +73,102 @@ class RulesRepository:
         result = await db.execute(select(InterceptionRule).order_by(InterceptionRule.created_at.desc()))
         return list(result.scalars().all())
     
+    @staticmethod
+    async def data_version(db: AsyncSession) -> str:
+        # 新增改变最大 id，删除改变行数，修改改变最大 updated_at
+        result = await db.execute(select(
+            func.count(InterceptionRule.id),
+            func.max(InterceptionRule.id),
+            func.max(InterceptionRule.updated_at)
+        ))
+        count, max_id, updated_at = result.one()
+        return f"{count}:{max_id}:{updated_at}"
+    
+    @staticmethod
+    async def list_enabled(db: AsyncSession) -> List[InterceptionRule]:
+        result = await db.execute(
+            select(InterceptionRule)
+            .where(InterceptionRule.is_enabled == True)
+            .order_by(InterceptionRule.created_at.desc(), InterceptionRule.id.desc())
+        )
+        rules = list(result.scalars().all())
+        # 规则缓存跨会话使用，与会话解除关联
+        db.expunge_all()
+        return rules
+    
+    @staticmethod
+    async def list_targets(db: AsyncSession) -> List[Tuple[int, str]]:
+        result = await db.execute(select(RuleTarget.rule_id, RuleTarget.email))
+        return [(row.rule_id, row.email) for row in result.all()]
+    
+    @staticmethod
+    async def delete_targets(db: AsyncSession, ids: List[int]) -> None:
+        for start in range(0, len(ids), BULK_CHUNK_SIZE):
+            await db.execute(delete(RuleTarget).where(RuleTarget.rule_id.in_(ids[start:start + BULK_CHUNK_SIZE])))
+    
+    @staticmethod
+    async def replace_targets(db: AsyncSession, rules: List[InterceptionRule]) -> None:
+        # 规则需已 flush 取得 id；全局规则不需要按邮箱查找
+        await RulesRepository.delete_targets(db, [rule.id for rule in rules])
+        targets = [
+            {"rule_id": rule.id, "email": email, "method_name": rule.method_name}
+            for rule in rules if not rule.is_global
+            for email in split_emails(rule.email)
+        ]
+        if targets:
+            await db.execute(insert(RuleTarget), targets)
+    
+    @staticmethod
+    async def bump_version(db: AsyncSession) -> None:
+        # 与规则修改在同一事务中递增，提交后各 worker 的规则缓存随运行时配置一起失效
+        await bump_counter(db, RULES_VERSION_KEY, "Incremented on every rule change")
+    
     @staticmethod
     async def find_by_id(db: AsyncSession, id: int) -> Optional[InterceptionRule]:
         result = await db.execute(select(InterceptionRule).where(InterceptionRule.id == id))
         return result.scalar_one_or_none()
     
+    @staticmethod
+    async def find_by_ids(db: AsyncSession, ids: List[int]) -> Dict[int, InterceptionRule]:
+        rules = {}
+        for start in range(0, len(ids), BULK_CHUNK_SIZE):
+            result = await db.execute(select(InterceptionRule).where(InterceptionRule.id.in_(ids[start:start + BULK_CHUNK_SIZE])))
+            rules.update({rule.id: rule for rule in result.scalars().all()})
+        return rules
+    
     @staticmethod
     async def find_by_method(db: AsyncSession, method: str, email: Optional[str] = None) -> Optional[InterceptionRule]:
+        # 用户规则通过 rule_targets 的 (email, method_name) 索引查找，不再逐条拆分邮箱列表
+        # 这里不评估参数条件，只考虑无条件的规则；带条件的规则由规则缓存匹配
+        user_rule = None
+        if email:
+            result = await db.execute(
+                select(InterceptionRule)
+                .join(RuleTarget, RuleTarget.rule_id == InterceptionRule.id)
+                .where(RuleTarget.email == email)
+                .where(RuleTarget.method_name == method)
+                .where(InterceptionRule.is_enabled == True)
+                .where(InterceptionRule.conditions.is_(None))
+                .order_by(InterceptionRule.priority.desc(), InterceptionRule.created_at.desc())
+                .limit(1)
+            )
+            user_rule = result.scalar_one_or_none()
+        
         result = await db.execute(
             select(InterceptionRule)
             .where(InterceptionRule.method_name == method)
             .where(InterceptionRule.is_enabled == True)
-            .order_by(InterceptionRule.created_at.desc())
+            .where(InterceptionRule.is_global == True)
+            .where(or_(InterceptionRule.email.is_(None), InterceptionRule.email == ''))
+            .where(InterceptionRule.conditions.is_(None))
+            .order_by(InterceptionRule.priority.desc(), InterceptionRule.created_at.desc())
+            .limit(1)
         )
-        rules = list(result.scalars().all())
-        
-        user_rule = None
-        for rule in rules:
-            if rule.is_global:
-                continue
-            
-            if rule.email:
-                rule_emails = [e.strip() for e in rule.email.split(',')]
-                if email and email in rule_emails:
-                    user_rule = rule
-                    break
-        
-        if user_rule:
+        global_rule = result.scalar_one_or_none()
+        # 同优先级时用户规则优先
+        if user_rule and (global_rule is None or (user_rule.priority or 0) >= (global_rule.priority or 0)):
             return user_rule
-        
-        for rule in rules:
-            if rule.is_global and not rule.email:
-                return rule
-        
-        return None
+        return global_rule
     
     @staticmethod
     async def find_global_by_method(db: AsyncSession, method: str) -> Optional[InterceptionRule]:
@@ -82,11 +181,15 @@ class RulesRepository:
         return result.scalar_one_or_none()
     
     @staticmethod
-    async def find_by_method_and_email(db: AsyncSession, method: str, email: Optional[str], is_global: bool) -> Optional[InterceptionRule]:
+    async def find_by_method_and_email(
+        db: AsyncSession, method: str, email: Optional[str], is_global: bool, conditions: Optional[str] = None
+    ) -> Optional[InterceptionRule]:
+        # 条件不同的规则视为不同规则
         result = await db.execute(
             select(InterceptionRule)
             .where(InterceptionRule.method_name == method)
             .where(InterceptionRule.email == email if not is_global else None)
+            .where(InterceptionRule.conditions.is_(None) if conditions is None else InterceptionRule.conditions == conditions)
         )
         return result.scalar_one_or_none()
     
@@ -98,10 +201,14 @@ class RulesRepository:
         custom_response: Optional[str] = None,
         email: Optional[str] = None,
         is_global: bool = False,
-        remark: Optional[str] = None
+        remark: Optional[str] = None,
+        conditions: Optional[dict] = None,
+        priority: int = 0
     ) -> int:
         target_email = None if is_global else email
-        existing = await RulesRepository.find_by_method_and_email(db, method_name, target_email, is_global)
+        existing = await RulesRepository.find_by_method_and_email(
+            db, method_name, target_email, is_global, dump_conditions(conditions)
+        )
         
         if existing:
             await RulesRepository.update(db, existing.id,
@@ -111,7 +218,9 @@ class RulesRepository:
                 is_enabled=True,
                 email=target_email,
                 is_global=is_global,
-                remark=remark
+                remark=remark,
+                conditions=conditions or {},
+                priority=priority
             )
             return existing.id
         
@@ -122,9 +231,14 @@ class RulesRepository:
             email=target_email,
             is_global=is_global,
             is_enabled=True,
-            remark=remark
+            remark=remark,
+            conditions=dump_conditions(conditions),
+            priority=priority
         )
         db.add(rule)
+        await db.flush()
+        await RulesRepository.replace_targets(db, [rule])
+        await RulesRepository.bump_version(db)
         await db.commit()
         await db.refresh(rule)
         return rule.id
@@ -139,7 +253,9 @@ class RulesRepository:
         is_enabled: Optional[bool] = None,
         email: Optional[str] = None,
         is_global: Optional[bool] = None,
-        remark: Optional[str] = None
+        remark: Optional[str] = None,
+        conditions: Optional[dict] = None,
+        priority: Optional[int] = None
     ) -> bool:
         result = await db.execute(select(InterceptionRule).where(InterceptionRule.id == id))
         rule = result.scalar_one_or_none()
@@ -161,8 +277,16 @@ class RulesRepository:
             rule.is_global = is_global
         if remark is not None:
             rule.remark = remark
+        if conditions is not None:
+            # 传入空对象表示清除条件
+            rule.conditions = dump_conditions(conditions)
+        if priority is not None:
+            rule.priority = priority
         rule.updated_at = china_now()
         
+        if method_name is not None or email is not None or is_global is not None:
+            await RulesRepository.replace_targets(db, [rule])
+        await RulesRepository.bump_version(db)
         await db.commit()
         return True
     
@@ -174,6 +298,226 @@ class RulesRepository:
             return False
         
         await db.delete(rule)
+        await RulesRepository.delete_targets(db, [id])
+        await RulesRepository.bump_version(db)
+        await db.commit()
+        return True
+    
+    @staticmethod
+    async def bulk_upsert(db: AsyncSession, rules: List[dict], replace: bool = False) -> Tuple[List[int], int, int]:
+        # 与 create 相同按 (method_name, email, conditions) 合并，但只查询一次、提交一次
+        if replace:
+            await db.execute(delete(InterceptionRule))
+            await db.execute(delete(RuleTarget))
+            existing = {}
+        else:
+            result = await db.execute(select(InterceptionRule))
+            existing = {}
+            for rule in result.scalars().all():
+                existing.setdefault((rule.method_name, None if rule.is_global else rule.email, rule.conditions), rule)
+        
+        now = china_now()
+        touched = []
+        created = 0
+        for item in rules:
+            is_global = bool(item.get("is_global"))
+            email = None if is_global else item.get("email")
+            conditions = dump_conditions(item.get("conditions"))
+            key = (item["method_name"], email, conditions)
+            rule = existing.get(key)
+            if rule is None:
+                rule = InterceptionRule(method_name=item["method_name"], created_at=now)
+                db.add(rule)
+                existing[key] = rule
+                created += 1
+            rule.email = email
+            rule.is_global = is_global
+            rule.action = item["action"]
+            rule.custom_response = item.get("custom_response")
+            rule.remark = item.get("remark")
+            rule.is_enabled = item.get("is_enabled", True)
+            rule.conditions = conditions
+            rule.priority = item.get("priority") or 0
+            rule.updated_at = now
+            touched.append(rule)
+        
+        await db.flush()
+        await RulesRepository.replace_targets(db, touched)
+        await RulesRepository.bump_version(db)
+        ids = [rule.id for rule in touched]
+        await db.commit()
+        return ids, created, len(touched) - created
+    
+    @staticmethod
+    async def bulk_update(db: AsyncSession, updates: List[dict]) -> List[int]:
+        ids = [item["id"] for item in updates]
+        rules = await RulesRepository.find_by_ids(db, ids)
+        
+        now = china_now()
+        for item in updates:
+            rule = rules.get(item["id"])
+            if rule is None:
+                continue
+            for field in RULE_FIELDS:
+                if item.get(field) is not None:
+                    setattr(rule, field, item[field])
+            if item.get("conditions") is not None:
+                rule.conditions = dump_conditions(item["conditions"])
+            if item.get("is_global"):
+                rule.email = None
+            rule.updated_at = now
+        
+        await RulesRepository.replace_targets(db, list(rules.values()))
+        await RulesRepository.bump_version(db)
+        await db.commit()
+        return [id for id in ids if id in rules]
+    
+    @staticmethod
+    async def bulk_set_enabled(db: AsyncSession, ids: List[int], is_enabled: bool) -> int:
+        updated = 0
+        for start in range(0, len(ids), BULK_CHUNK_SIZE):
+            result = await db.execute(
+                update(InterceptionRule)
+                .where(InterceptionRule.id.in_(ids[start:start + BULK_CHUNK_SIZE]))
+                .values(is_enabled=is_enabled, updated_at=china_now())
+            )
+            updated += result.rowcount
+        await RulesRepository.bump_version(db)
+        await db.commit()
+        return updated
+    
+    @staticmethod
+    async def bulk_delete(db: AsyncSession, ids: List[int]) -> int:
+        deleted = 0
+        for start in range(0, len(ids), BULK_CHUNK_SIZE):
+            result = await db.execute(delete(InterceptionRule).where(InterceptionRule.id.in_(ids[start:start + BULK_CHUNK_SIZE])))
+            deleted += result.rowcount
+        await RulesRepository.delete_targets(db, ids)
+        await RulesRepository.bump_version(db)
+        await db.commit()
+        return deleted
+
+
+class TacticsRepository:
+    @staticmethod
+    async def list_all(db: AsyncSession) -> List[TacticsTemplate]:
+        result = await db.execute(select(TacticsTemplate).order_by(TacticsTemplate.updated_at.desc()))
+        return list(result.scalars().all())
+    
+    @staticmethod
+    async def list_applied(db: AsyncSession) -> List[TacticsTemplate]:
+        # 按更新时间正序返回，邮箱重叠时后应用的模板覆盖先应用的
+        result = await db.execute(
+            select(TacticsTemplate)
+            .where(TacticsTemplate.is_applied == True)
+            .order_by(TacticsTemplate.updated_at, TacticsTemplate.id)
+        )
+        return list(result.scalars().all())
+    
+    @staticmethod
+    async def find_by_id(db: AsyncSession, id: int) -> Optional[TacticsTemplate]:
+        result = await db.execute(select(TacticsTemplate).where(TacticsTemplate.id == id))
+        return result.scalar_one_or_none()
+    
+    @staticmethod
+    async def bump_version(db: AsyncSession) -> None:
+        await bump_counter(db, TACTICS_VERSION_KEY, "Incremented on every tactics template change")
+    
+    @staticmethod
+    async def clear_default(db: AsyncSession, keep_id: Optional[int] = None) -> None:
+        await db.execute(
+            update(TacticsTemplate)
+            .where(TacticsTemplate.is_default == True, TacticsTemplate.id != keep_id)
+            .values(is_default=False)
+        )
+    
+    @staticmethod
+    async def create(
+        db: AsyncSession,
+        name: str,
+        template_json: str,
+        email: Optional[str] = None,
+        description: Optional[str] = None,
+        is_default: bool = False
+    ) -> int:
+        template = TacticsTemplate(
+            name=name,
+            template_json=template_json,
+            email=email or None,
+            description=description,
+            is_default=is_default,
+            is_applied=False
+        )
+        db.add(template)
+        await db.flush()
+        if is_default:
+            await TacticsRepository.clear_default(db, template.id)
+        await db.commit()
+        return template.id
+    
+    @staticmethod
+    async def update(
+        db: AsyncSession,
+        id: int,
+        name: Optional[str] = None,
+        template_json: Optional[str] = None,
+        email: Optional[str] = None,
+        description: Optional[str] = None,
+        is_default: Optional[bool] = None
+    ) -> bool:
+        template = await TacticsRepository.find_by_id(db, id)
+        if not template:
+            return False
+        
+        if name is not None:
+            template.name = name
+        if template_json is not None:
+            template.template_json = template_json
+        if email is not None:
+            # 传入空字符串表示改为全局模板
+            template.email = email or None
+        if description is not None:
+            template.description = description
+        if is_default is not None:
+            template.is_default = is_default
+            if is_default:
+                await TacticsRepository.clear_default(db, id)
+        template.updated_at = china_now()
+        
+        if template.is_applied:
+            await TacticsRepository.bump_version(db)
+        await db.commit()
+        return True
+    
+    @staticmethod
+    async def delete(db: AsyncSession, id: int) -> bool:
+        template = await TacticsRepository.find_by_id(db, id)
+        if not template:
+            return False
+        
+        if template.is_applied:
+            await TacticsRepository.bump_version(db)
+        await db.delete(template)
+        await db.commit()
+        return True
+    
+    @staticmethod
+    async def set_applied(db: AsyncSession, id: int, is_applied: bool) -> bool:
+        template = await TacticsRepository.find_by_id(db, id)
+        if not template:
+            return False
+        
+        if is_applied:
+            # 同一范围（相同邮箱或全局）同时只应用一个模板
+            scope = TacticsTemplate.email.is_(None) if template.email is None else TacticsTemplate.email == template.email
+            await db.execute(
+                update(TacticsTemplate)
+                .where(scope, TacticsTemplate.id != id, TacticsTemplate.is_applied == True)
+                .values(is_applied=False, updated_at=china_now())
+            )
+        template.is_applied = is_applied
+        template.updated_at = china_now()
+        await TacticsRepository.bump_version(db)
         await db.commit()
         return True
 
@@ -223,13 +567,194 @@ class CommandsRepository:
     
     @staticmethod
     async def clear_verified(db: AsyncSession) -> int:
-        result = await db.execute(select(Command).where(Command.status == "verified"))
-        cmds = result.scalars().all()
-        count = len(cmds)
-        for cmd in cmds:
-            await db.delete(cmd)
+        return await CommandsRepository.bulk_delete(db, status="verified")
+    
+    @staticmethod
+    def encode_cursor(cmd: Command) -> str:
+        return base64.urlsafe_b64encode(f"{cmd.received_at.isoformat()}|{cmd.id}".encode()).decode()
+    
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+        try:
+            received_at, id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+            return datetime.fromisoformat(received_at), int(id)
+        except (ValueError, UnicodeDecodeError):
+            raise ValueError("Invalid cursor")
+    
+    @staticmethod
+    async def list_page(
+        db: AsyncSession,
+        status: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        cursor: Optional[str] = None,
+        limit: int = 50
+    ) -> Tuple[List[Command], Optional[str]]:
+        # 按 (received_at, id) 做键集分页，配合 (status, received_at) 索引，翻页代价与页码无关
+        query = select(Command)
+        if status:
+            query = query.where(Command.status == status)
+        if since:
+            query = query.where(Command.received_at >= since)
+        if until:
+            query = query.where(Command.received_at < until)
+        if cursor:
+            received_at, id = CommandsRepository.decode_cursor(cursor)
+            query = query.where(or_(
+                Command.received_at < received_at,
+                and_(Command.received_at == received_at, Command.id < id)
+            ))
+        query = query.order_by(Command.received_at.desc(), Command.id.desc()).limit(limit + 1)
+        
+        result = await db.execute(query)
+        cmds = list(result.scalars().all())
+        next_cursor = None
+        if len(cmds) > limit:
+            cmds = cmds[:limit]
+            next_cursor = CommandsRepository.encode_cursor(cmds[-1])
+        return cmds, next_cursor
+    
+    @staticmethod
+    async def bulk_update_status(
+        db: AsyncSession,
+        ids: List[int],
+        status: str,
+        notes: Optional[str] = None,
+        from_status: Optional[str] = None
+    ) -> int:
+        values = {"status": status, "processed_at": china_now()}
+        if notes:
+            values["notes"] = notes
+        
+        updated = 0
+        # 分批避免超过 SQLite 的参数个数上限，整体仍在一个事务中提交
+        for start in range(0, len(ids), BULK_CHUNK_SIZE):
+            query = update(Command).where(Command.id.in_(ids[start:start + BULK_CHUNK_SIZE]))
+            if from_status:
+                query = query.where(Command.status == from_status)
+            result = await db.execute(query.values(**values))
+            updated += result.rowcount
+        await db.commit()
+        return updated
+    
+    @staticmethod
+    async def bulk_delete(
+        db: AsyncSession,
+        ids: Optional[List[int]] = None,
+        status: Optional[str] = None,
+        before: Optional[datetime] = None
+    ) -> int:
+        conditions = []
+        if status:
+            conditions.append(Command.status == status)
+        if before:
+            conditions.append(Command.received_at < before)
+        
+        deleted = 0
+        if ids is not None:
+            for start in range(0, len(ids), BULK_CHUNK_SIZE):
+                query = delete(Command).where(Command.id.in_(ids[start:start + BULK_CHUNK_SIZE]), *conditions)
+                result = await db.execute(query)
+                deleted += result.rowcount
+        else:
+            result = await db.execute(delete(Command).where(*conditions))
+            deleted = result.rowcount
         await db.commit()
-        return count
+        return deleted
+
+
+class DevicesRepository:
+    @staticmethod
+    async def upsert(db: AsyncSession, devices: List[dict], methods: List[dict]) -> None:
+        # 批量合并内存中累计的计数，首次出现时间只取更早的值
+        if devices:
+            stmt = sqlite_insert(Device)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[Device.email],
+                set_={
+                    "first_seen": func.min(func.coalesce(Device.first_seen, stmt.excluded.first_seen), stmt.excluded.first_seen),
+                    "last_seen": func.max(func.coalesce(Device.last_seen, stmt.excluded.last_seen), stmt.excluded.last_seen),
+                    "request_count": func.coalesce(Device.request_count, 0) + stmt.excluded.request_count,
+                    "last_method": stmt.excluded.last_method,
+                    "model": func.coalesce(stmt.excluded.model, Device.model),
+                    "swdid": func.coalesce(stmt.excluded.swdid, Device.swdid),
+                }
+            )
+            await db.execute(stmt, devices)
+        if methods:
+            stmt = sqlite_insert(DeviceMethod)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[DeviceMethod.email, DeviceMethod.method],
+                set_={
+                    "request_count": func.coalesce(DeviceMethod.request_count, 0) + stmt.excluded.request_count,
+                    "last_seen": func.max(func.coalesce(DeviceMethod.last_seen, stmt.excluded.last_seen), stmt.excluded.last_seen),
+                }
+            )
+            await db.execute(stmt, methods)
+        await db.commit()
+    
+    @staticmethod
+    async def list(
+        db: AsyncSession,
+        search: Optional[str] = None,
+        limit: int = 50,
+        offset: int = 0
+    ) -> Tuple[List[Device], int]:
+        query = select(Device)
+        count_query = select(func.count()).select_from(Device)
+        if search:
+            query = query.where(Device.email.contains(search))
+            count_query = count_query.where(Device.email.contains(search))
+        total = (await db.execute(count_query)).scalar() or 0
+        result = await db.execute(
+            query.order_by(Device.last_seen.desc(), Device.email).limit(limit).offset(offset)
+        )
+        return list(result.scalars().all()), total
+    
+    @staticmethod
+    async def find(db: AsyncSession, email: str) -> Optional[Device]:
+        result = await db.execute(select(Device).where(Device.email == email))
+        return result.scalar_one_or_none()
+    
+    @staticmethod
+    async def list_methods(db: AsyncSession, email: str) -> List[DeviceMethod]:
+        result = await db.execute(
+            select(DeviceMethod)
+            .where(DeviceMethod.email == email)
+            .order_by(DeviceMethod.request_count.desc(), DeviceMethod.method)
+        )
+        return list(result.scalars().all())
+    
+    @staticmethod
+    async def count(db: AsyncSession) -> int:
+        result = await db.execute(select(func.count()).select_from(Device))
+        return result.scalar() or 0
+    
+    @staticmethod
+    async def list_device_emails(db: AsyncSession) -> List[str]:
+        # 主键索引有序，不再扫描各日志分区做 DISTINCT
+        result = await db.execute(select(Device.email).order_by(Device.email))
+        return list(result.scalars().all())
+    
+    @staticmethod
+    async def list_method_names(db: AsyncSession) -> List[str]:
+        result = await db.execute(select(DeviceMethod.method).distinct().order_by(DeviceMethod.method))
+        return [method for method in result.scalars().all() if method]
+    
+    @staticmethod
+    async def list_emails(db: AsyncSession) -> List[str]:
+        emails = await DevicesRepository.list_device_emails(db)
+        
+        if not emails:
+            rule_result = await db.execute(
+                select(InterceptionRule.email)
+                .distinct()
+                .where(InterceptionRule.email.isnot(None))
+                .where(InterceptionRule.email != '')
+            )
+            emails = sorted(set(e for e in rule_result.scalars().all() if e))
+        
+        return emails
 
 
 class LogsRepository:
@@ -239,75 +764,203 @@ class LogsRepository:
         method: Optional[str] = None,
         search: Optional[str] = None,
         limit: Optional[int] = None,
-        offset: Optional[int] = None
+        offset: Optional[int] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None
     ) -> Tuple[List[RequestLog], int]:
-        query = select(RequestLog)
-        count_query = select(RequestLog)
-        
+        names = [column.name for column in RequestLog.__table__.columns]
+        rows, total = await LogsRepository._page(db, names, method, search, since, until, limit, offset)
+        return [RequestLog(**row) for row in rows], total
+    
+    @staticmethod
+    def _filter(query, table, method: Optional[str], search: Optional[str]):
         if method:
-            query = query.where(RequestLog.method == method)
-            count_query = count_query.where(RequestLog.method == method)
+            query = query.where(table.c.method == method)
         
         if search:
             pattern = f"%{search}%"
             query = query.where(
-                (RequestLog.request_body.like(pattern)) | 
-                (RequestLog.response_body.like(pattern))
-            )
-            count_query = count_query.where(
-                (RequestLog.request_body.like(pattern)) | 
-                (RequestLog.response_body.like(pattern))
+                (table.c.request_body.like(pattern)) | 
+                (table.c.response_body.like(pattern))
             )
+        return query
+    
+    @staticmethod
+    def _window(query, table, since: Optional[datetime], until: Optional[datetime]):
+        if since is not None:
+            query = query.where(table.c.created_at >= since)
+        if until is not None:
+            query = query.where(table.c.created_at < until)
+        return query
+    
+    @staticmethod
+    def _columns(table, bodies: List[str]) -> list:
+        names = SUMMARY_COLUMNS + list(bodies) + ["json_validated"]
+        return [table.c[name] for name in names]
+    
+    @staticmethod
+    async def _page(
+        db: AsyncSession,
+        names: List[str],
+        method: Optional[str],
+        search: Optional[str],
+        since: Optional[datetime],
+        until: Optional[datetime],
+        limit: Optional[int],
+        offset: Optional[int]
+    ) -> Tuple[List[dict], int]:
+        # 从最新的分区开始逐个计数，只查询覆盖 [offset, offset + limit) 的分区，按分区顺序拼接即为全局倒序
+        partitions = list(reversed(select_partitions(await list_partitions(db), since, until)))
+        counts = []
+        for partition in partitions:
+            count_query = select(func.count()).select_from(partition.table)
+            count_query = LogsRepository._window(LogsRepository._filter(count_query, partition.table, method, search), partition.table, since, until)
+            result = await db.execute(count_query, bind_arguments=LOG_BIND)
+            counts.append(result.scalar() or 0)
         
-        query = query.order_by(RequestLog.created_at.desc())
-        
-        if limit is not None:
-            query = query.limit(limit)
-        if offset is not None:
-            query = query.offset(offset)
-        
-        result = await db.execute(query)
-        logs = list(result.scalars().all())
-        
-        count_result = await db.execute(count_query)
-        total = await db.execute(select(text("COUNT(*)")).select_from(count_query.subquery()))
-        total_count = total.scalar() or 0
-        
-        return logs, total_count
+        rows = []
+        skip = offset or 0
+        remaining = limit
+        for partition, count in zip(partitions, counts):
+            if remaining is not None and remaining <= 0:
+                break
+            if skip >= count:
+                skip -= count
+                continue
+            table = partition.table
+            query = LogsRepository._filter(select(*[table.c[name] for name in names]), table, method, search)
+            query = LogsRepository._window(query, table, since, until).order_by(table.c.id.desc()).offset(skip)
+            if remaining is not None:
+                query = query.limit(remaining)
+            result = await db.execute(query, bind_arguments=LOG_BIND)
+            partition_rows = [dict(row) for row in result.mappings().all()]
+            rows.extend(partition_rows)
+            skip = 0
+            if remaining is not None:
+                remaining -= len(partition_rows)
+        return rows, sum(counts)
     
     @staticmethod
-    async def list_methods(db: AsyncSession) -> List[str]:
-        result = await db.execute(
-            select(RequestLog.method)
-            .distinct()
-            .where(RequestLog.method.isnot(None))
-            .order_by(RequestLog.method)
-        )
-        return [m for m in result.scalars().all() if m]
+    async def list_rows(
+        db: AsyncSession,
+        method: Optional[str] = None,
+        search: Optional[str] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        bodies: Optional[List[str]] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None
+    ) -> Tuple[List[dict], int]:
+        # 只查询需要的列，不构造 ORM 对象，正文按存储的 JSON 文本原样返回
+        names = SUMMARY_COLUMNS + list(bodies or []) + ["json_validated"]
+        return await LogsRepository._page(db, names, method, search, since, until, limit, offset)
     
     @staticmethod
-    async def list_emails(db: AsyncSession) -> List[str]:
+    async def find_row_by_id(db: AsyncSession, id: int, bodies: List[str]) -> Optional[dict]:
+        # id 中带有分区的起始日期，直接定位到一个分区
+        partition = find_partition(await list_partitions(db), id)
+        if partition is None:
+            return None
+        table = partition.table
         result = await db.execute(
-            select(RequestLog.email)
-            .distinct()
-            .where(RequestLog.email.isnot(None))
-            .where(RequestLog.email != '')
-            .order_by(RequestLog.email)
+            select(*LogsRepository._columns(table, bodies)).where(table.c.id == id), bind_arguments=LOG_BIND
         )
-        emails = [e for e in result.scalars().all() if e]
+        row = result.mappings().one_or_none()
+        return dict(row) if row else None
+    
+    @staticmethod
+    async def stream(
+        db: AsyncSession,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        method: Optional[str] = None,
+        email: Optional[str] = None,
+        action: Optional[str] = None,
+        include_bodies: bool = True,
+        chunk_size: int = 1000
+    ) -> AsyncIterator[List[dict]]:
+        names = ["id", "created_at", "method", "email", "request_interception_action", "response_interception_action"]
+        if include_bodies:
+            names += ["request_body", "response_body", "intercepted_request", "intercepted_response"]
         
-        if not emails:
-            rule_result = await db.execute(
-                select(InterceptionRule.email)
-                .distinct()
-                .where(InterceptionRule.email.isnot(None))
-                .where(InterceptionRule.email != '')
+        # 只读取时间窗口覆盖的分区，按时间从旧到新依次导出
+        for partition in select_partitions(await list_partitions(db), since, until):
+            table = partition.table
+            query = LogsRepository._window(select(*[table.c[name] for name in names]), table, since, until)
+            if method:
+                query = query.where(table.c.method == method)
+            if email:
+                query = query.where(table.c.email == email)
+            if action == "none":
+                query = query.where(table.c.request_interception_action.is_(None))
+                query = query.where(table.c.response_interception_action.is_(None))
+            elif action:
+                query = query.where(
+                    (table.c.request_interception_action == action) |
+                    (table.c.response_interception_action == action)
+                )
+            
+            # 按主键分块读取：每块是一个独立的短查询，不会长时间持有 SQLite 读锁阻塞日志写入
+            last_id = 0
+            while True:
+                result = await db.execute(
+                    query.where(table.c.id > last_id).order_by(table.c.id).limit(chunk_size),
+                    bind_arguments=LOG_BIND
+                )
+                rows = [dict(row) for row in result.mappings().all()]
+                if not rows:
+                    break
+                yield rows
+                last_id = rows[-1]["id"]
+                if len(rows) < chunk_size:
+                    break
+    
+    @staticmethod
+    async def data_version(db: AsyncSession) -> str:
+        # 日志只追加不修改，最大 id 加上分区列表即可作为数据版本，删除分区后版本也会变化
+        partitions = await list_partitions(db)
+        max_id = 0
+        for partition in reversed(partitions):
+            result = await db.execute(select(func.max(partition.table.c.id)), bind_arguments=LOG_BIND)
+            max_id = result.scalar() or 0
+            if max_id:
+                break
+        return f"{partitions[0].name if partitions else ''}:{len(partitions)}:{max_id}"
+    
+    @staticmethod
+    async def _distinct(db: AsyncSession, column: str) -> List[str]:
+        values = set()
+        for partition in await list_partitions(db):
+            table_column = partition.table.c[column]
+            result = await db.execute(
+                select(table_column).distinct().where(table_column.isnot(None)).where(table_column != ''),
+                bind_arguments=LOG_BIND
             )
-            rule_emails = [e for e in rule_result.scalars().all() if e]
-            emails = list(set(emails + rule_emails))
-            emails.sort()
-        
-        return emails
+            values.update(value for value in result.scalars().all() if value)
+        return sorted(values)
+    
+    @staticmethod
+    async def list_methods(db: AsyncSession) -> List[str]:
+        return await LogsRepository._distinct(db, "method")
+    
+    @staticmethod
+    async def list_partitions(db: AsyncSession) -> List[dict]:
+        partitions = []
+        for partition in reversed(await list_partitions(db)):
+            # 自增 id 连续分配，用首尾 id 估算行数，不做全表计数
+            result = await db.execute(
+                select(func.min(partition.table.c.id), func.max(partition.table.c.id)), bind_arguments=LOG_BIND
+            )
+            first_id, last_id = result.one()
+            partitions.append({**partition.snapshot(), "rows": last_id - first_id + 1 if last_id is not None else 0})
+        return partitions
+    
+    @staticmethod
+    async def drop_partitions(db: AsyncSession, before: datetime) -> List[str]:
+        dropped = await drop_partitions(db, expired_partitions(await list_partitions(db), before))
+        await db.commit()
+        get_partition_writer().reset()
+        return dropped
     
     @staticmethod
     async def create(
@@ -319,19 +972,42 @@ class LogsRepository:
         intercepted_response: Optional[str] = None,
         request_interception_action: Optional[str] = None,
         response_interception_action: Optional[str] = None,
-        email: Optional[str] = None
+        email: Optional[str] = None,
+        retention_days: int = 0,
+        validated: Collection[str] = ()
     ) -> int:
-        log = RequestLog(
-            method=method,
-            request_body=request_body,
-            response_body=response_body,
-            intercepted_request=intercepted_request,
-            intercepted_response=intercepted_response,
-            request_interception_action=request_interception_action,
-            response_interception_action=response_interception_action,
-            email=email
-        )
-        db.add(log)
-        await db.commit()
-        await db.refresh(log)
-        return log.id
\ No newline at end of file
+        # validated 中的正文已知是合法 JSON（由代理自己序列化或经日志策略处理），不再重复解析
+        def check(column: str, value: Optional[str]) -> Optional[str]:
+            return value if column in validated else ensure_json_text(value)
+        
+        # SQLite 中按不带时区的北京时间存储，分区边界也按北京时间的自然日划分
+        created_at = china_now().replace(tzinfo=None)
+        writer = get_partition_writer()
+        try:
+            table, created = await writer.table_for(db, created_at)
+            result = await db.execute(
+                insert(table).values(
+                    method=method,
+                    request_body=check("request_body", request_body),
+                    response_body=check("response_body", response_body),
+                    intercepted_request=check("intercepted_request", intercepted_request),
+                    intercepted_response=check("intercepted_response", intercepted_response),
+                    request_interception_action=request_interception_action,
+                    response_interception_action=response_interception_action,
+                    email=email,
+                    json_validated=True,
+                    created_at=created_at
+                ),
+                bind_arguments=LOG_BIND
+            )
+            if created and retention_days:
+                # 过期清理只在切换到新分区时执行一次，删除整张分区表，耗时与日志量无关
+                before = created_at - timedelta(days=retention_days)
+                await drop_partitions(db, expired_partitions(await list_partitions(db), before))
+            await db.commit()
+        except Exception:
+            # 建表与写入在同一事务中，回滚后缓存的分区表可能并不存在，下次写入时重新查询
+            writer.reset()
+            await db.rollback()
+            raise
+        return result.inserted_primary_key[0]
@@ -0,0 +1,350 @@
+import asyncio
+import logging
+import random
+import time
+from collections import OrderedDict, deque
+from functools import lru_cache
+from typing import Callable, Optional, Set, TypeVar
+
+import httpx
+
+from app.config import Settings, get_settings
+from app.runtime_config import RuntimeConfig, get_runtime_config
+from app.upstream import UpstreamPool
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+LATENCY_WINDOW = 200
+HEDGE_MIN_SAMPLES = 20
+# 方法名来自客户端请求，按方法保存的熔断器和延迟统计只保留最近使用的方法
+METHOD_STATE_MAX = 1000
+
+T = TypeVar("T")
+
+
+def lru_get(cache: "OrderedDict[str, T]", key: str, factory: Callable[[], T]) -> T:
+    value = cache.get(key)
+    if value is None:
+        value = cache[key] = factory()
+        if len(cache) > METHOD_STATE_MAX:
+            cache.popitem(last=False)
+    else:
+        cache.move_to_end(key)
+    return value
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, method: str, retry_after: float):
+        super().__init__(f"Circuit open for method '{method}'")
+        self.method = method
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int, open_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.total_failures = 0
+        self.total_successes = 0
+        self.short_circuited = 0
+
+    def retry_after(self, now: float) -> float:
+        return max(0.0, self.opened_at + self.open_seconds - now)
+
+    def allow(self, now: float) -> bool:
+        if self.state == OPEN and now - self.opened_at >= self.open_seconds:
+            self.state = HALF_OPEN
+            self.probe_in_flight = False
+        if self.state == CLOSED:
+            return True
+        # 半开状态只放行一个探测请求
+        if self.state == HALF_OPEN and not self.probe_in_flight:
+            self.probe_in_flight = True
+            return True
+        self.short_circuited += 1
+        return False
+
+    def record_success(self):
+        self.total_successes += 1
+        self.consecutive_failures = 0
+        self.state = CLOSED
+        self.probe_in_flight = False
+
+    def record_failure(self, now: float):
+        self.total_failures += 1
+        self.consecutive_failures += 1
+        if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != OPEN:
+                logger.warning(f"Circuit opened after {self.consecutive_failures} consecutive failures")
+            self.state = OPEN
+            self.opened_at = now
+        self.probe_in_flight = False
+
+    def release(self):
+        # 探测请求被取消时未产生结果，允许下一个请求继续探测
+        self.probe_in_flight = False
+
+    def reset(self):
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.probe_in_flight = False
+
+    def snapshot(self, now: float) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "retry_after": round(self.retry_after(now), 3) if self.state == OPEN else 0,
+            "total_successes": self.total_successes,
+            "total_failures": self.total_failures,
+            "short_circuited": self.short_circuited,
+        }
+
+
+class RetryBudget:
+    # 每个请求存入 ratio 个令牌，每次重试或对冲消耗一个，另有按时间补充的最低额度
+    def __init__(self, ratio: float, min_per_second: float, max_tokens: float = 100.0):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+        self.updated_at = time.monotonic()
+        self.exhausted = 0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.max_tokens, self.tokens + (now - self.updated_at) * self.min_per_second)
+        self.updated_at = now
+
+    def deposit(self):
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def try_withdraw(self) -> bool:
+        self._refill(time.monotonic())
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        self.exhausted += 1
+        return False
+
+    def snapshot(self) -> dict:
+        self._refill(time.monotonic())
+        return {"tokens": round(self.tokens, 2), "max_tokens": self.max_tokens, "exhausted": self.exhausted}
+
+
+class LatencyTracker:
+    def __init__(self, size: int = LATENCY_WINDOW):
+        self.samples = deque(maxlen=size)
+
+    def add(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class ResilientUpstream:
+    def __init__(self, settings: Settings, runtime: RuntimeConfig):
+        self.settings = settings
+        self.runtime = runtime
+        self.idempotent_methods: Set[str] = {
+            m.strip() for m in settings.LINSPIRER_IDEMPOTENT_METHODS.split(",") if m.strip()
+        }
+        self.breakers: "OrderedDict[str, CircuitBreaker]" = OrderedDict()
+        self.latencies: "OrderedDict[str, LatencyTracker]" = OrderedDict()
+        self.budget = RetryBudget(settings.LINSPIRER_RETRY_BUDGET_RATIO, settings.LINSPIRER_RETRY_BUDGET_MIN_PER_SECOND)
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.pool = UpstreamPool(settings)
+        runtime.on_change(self.pool.on_config_change)
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # 复用连接池，避免每个请求重新建立 TLS 连接
+        if self._client is None:
+            self._client = httpx.AsyncClient(verify=False)
+        return self._client
+
+    def start(self):
+        self.pool.start(self.client)
+
+    async def aclose(self):
+        await self.pool.stop()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def breaker(self, method: str) -> CircuitBreaker:
+        return lru_get(self.breakers, method, lambda: CircuitBreaker(
+            self.settings.LINSPIRER_BREAKER_FAILURE_THRESHOLD, self.settings.LINSPIRER_BREAKER_OPEN_SECONDS
+        ))
+
+    def latency(self, method: str) -> LatencyTracker:
+        return lru_get(self.latencies, method, LatencyTracker)
+
+    def is_idempotent(self, method: str) -> bool:
+        return method in self.idempotent_methods
+
+    def hedge_delay(self, method: str) -> Optional[float]:
+        tracker = self.latency(method)
+        if not self.runtime.get("hedge_enabled") or len(tracker.samples) < HEDGE_MIN_SAMPLES:
+            return None
+        return max(tracker.percentile(95), self.settings.LINSPIRER_HEDGE_MIN_DELAY_MS / 1000)
+
+    def backoff(self, attempt: int) -> float:
+        # 指数退避 + 全抖动
+        cap = self.settings.LINSPIRER_RETRY_BACKOFF_MS / 1000 * (2 ** (attempt - 1))
+        return random.uniform(0, cap)
+
+    async def post(self, method: str, path: str, content: str, headers: dict) -> httpx.Response:
+        breaker = self.breaker(method)
+        if not breaker.allow(time.monotonic()):
+            raise CircuitOpenError(method, breaker.retry_after(time.monotonic()))
+        is_probe = breaker.state == HALF_OPEN
+
+        self.budget.deposit()
+        idempotent = self.is_idempotent(method)
+        attempt = 0
+        tried: Set[str] = set()
+        try:
+            while True:
+                try:
+                    response = await self._send(method, path, content, headers, idempotent, tried)
+                except httpx.RequestError as e:
+                    breaker.record_failure(time.monotonic())
+                    # 连接失败说明请求未送达，非幂等方法也可以安全重试
+                    retryable = idempotent or isinstance(e, httpx.ConnectError)
+                    if not self._should_retry(breaker, attempt, retryable):
+                        raise
+                else:
+                    if response.status_code < 500:
+                        breaker.record_success()
+                        return response
+                    breaker.record_failure(time.monotonic())
+                    if not self._should_retry(breaker, attempt, idempotent):
+                        return response
+
+                attempt += 1
+                self.retries += 1
+                logger.info(f"Retrying upstream call for method={method}, attempt={attempt}")
+                await asyncio.sleep(self.backoff(attempt))
+        finally:
+            if is_probe:
+                breaker.release()
+
+    def _should_retry(self, breaker: CircuitBreaker, attempt: int, retryable: bool) -> bool:
+        return (
+            retryable
+            and attempt < self.runtime.get("retry_max")
+            and breaker.state == CLOSED
+            and self.budget.try_withdraw()
+        )
+
+    async def _timed_post(self, method: str, path: str, content: str, headers: dict, tried: Set[str]) -> httpx.Response:
+        # 重试和对冲优先发往尚未尝试过的目标
+        target = self.pool.pick(tried)
+        tried.add(target.url)
+        target.begin()
+        started = time.monotonic()
+        try:
+            # 超时从运行时配置读取，修改后对下一个请求生效
+            timeout = httpx.Timeout(self.runtime.get("upstream_timeout"), connect=self.runtime.get("upstream_connect_timeout"))
+            response = await self.client.post(target.url + path, content=content, headers=headers, timeout=timeout)
+        except httpx.RequestError:
+            self.pool.record(target, ok=False)
+            raise
+        except BaseException:
+            target.cancel()
+            raise
+
+        elapsed = time.monotonic() - started
+        ok = response.status_code < 500
+        self.pool.record(target, ok=ok, latency_ms=elapsed * 1000)
+        if ok:
+            self.latency(method).add(elapsed)
+        return response
+
+    async def _send(self, method: str, path: str, content: str, headers: dict, idempotent: bool, tried: Set[str]) -> httpx.Response:
+        delay = self.hedge_delay(method) if idempotent else None
+        if delay is None:
+            return await self._timed_post(method, path, content, headers, tried)
+
+        primary = asyncio.ensure_future(self._timed_post(method, path, content, headers, tried))
+        pending = {primary}
+        last_error: Optional[BaseException] = None
+        last_response: Optional[httpx.Response] = None
+        try:
+            # 等待期间调用方被取消（客户端断开）时，finally 中一并取消未完成的请求，不再占用上游连接
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done or not self.budget.try_withdraw():
+                return await primary
+
+            # 超过 p95 仍未返回时发出对冲请求，取先成功的一个
+            self.hedges += 1
+            hedge = asyncio.ensure_future(self._timed_post(method, path, content, headers, tried))
+            pending.add(hedge)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        last_error = task.exception()
+                        continue
+                    response = task.result()
+                    if response.status_code < 500:
+                        if task is hedge:
+                            self.hedge_wins += 1
+                        return response
+                    last_response = response
+        finally:
+            for task in pending:
+                task.cancel()
+
+        if last_response is not None:
+            return last_response
+        raise last_error
+
+    def reset(self, method: Optional[str] = None):
+        for name, breaker in self.breakers.items():
+            if method is None or name == method:
+                breaker.reset()
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        methods = {}
+        for name in sorted(set(self.breakers) | set(self.latencies)):
+            # 只读取，不创建状态也不改变 LRU 顺序
+            tracker = self.latencies.get(name) or LatencyTracker()
+            breaker = self.breakers.get(name)
+            p50 = tracker.percentile(50)
+            p95 = tracker.percentile(95)
+            methods[name] = {
+                "breaker": breaker.snapshot(now) if breaker is not None else None,
+                "idempotent": self.is_idempotent(name),
+                "p50_ms": round(p50 * 1000, 2) if p50 is not None else None,
+                "p95_ms": round(p95 * 1000, 2) if p95 is not None else None,
+                "samples": len(tracker.samples),
+            }
+        return {
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "retry_budget": self.budget.snapshot(),
+            "pool": self.pool.snapshot(),
+            "methods": methods,
+        }
+
+
+@lru_cache()
+def get_upstream() -> ResilientUpstream:
+    return ResilientUpstream(get_settings(), get_runtime_config())
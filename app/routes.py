@@ -1,16 +1,36 @@
 import logging
-from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
+from fastapi import APIRouter, Depends, HTTPException, Query, status, Request, Response
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional, List
+from datetime import datetime
 import json
 
 logger = logging.getLogger(__name__)
 
 from app import schemas
+from app.admission import get_admission
+from app.export import CONTENT_TYPES, serialize
+from app.http_cache import make_etag, not_modified
+from app.live_tail import LiveFilter, get_live_tail
+from app.log_archive import ArchiveError, get_log_archive
+from app.log_policy import POLICY_KEY, get_log_policies
+from app.method_patterns import method_pattern_errors
+from app.log_render import BODY_COLUMNS, parse_bodies, render_log, render_page
 from app.auth import verify_password, get_password_hash, create_access_token, decode_access_token
-from app.database import get_db
-from app.repositories import ConfigRepository, RulesRepository, CommandsRepository, LogsRepository
+from app.database import get_db, get_read_db, pool_snapshot, read_session_maker
+from app.devices import get_device_registry
+from app.repositories import (
+    ConfigRepository, RulesRepository, TacticsRepository, CommandsRepository, DevicesRepository, LogsRepository,
+)
+from app.middleware import extract_email
+from app.resilience import get_upstream
+from app.rule_cache import get_rule_cache
+from app.rule_conditions import condition_errors
+from app.runtime_config import get_runtime_config
+from app.tactics import get_tactics_cache, template_errors
+from app.transforms import get_transform_registry
 
 router = APIRouter()
 security = HTTPBearer()
@@ -30,8 +50,8 @@ async def get_current_user(
 
 
 @router.post("/api/login", response_model=schemas.LoginResponse)
-async def login(request: schemas.LoginRequest, db: AsyncSession = Depends(get_db)):
-    password_hash = await ConfigRepository.get(db, "admin_password_hash")
+async def login(request: schemas.LoginRequest):
+    password_hash = await get_runtime_config().fetch("admin_password_hash")
     if not password_hash:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -69,51 +89,217 @@ async def change_password(
     
     new_hash = get_password_hash(request.new_password)
     await ConfigRepository.set(db, "admin_password_hash", new_hash, "Hashed admin password")
+    await get_runtime_config().reload()
     
     return {"status": "ok"}
 
 
+def rule_response(rule) -> schemas.RuleResponse:
+    return schemas.RuleResponse(
+        id=rule.id,
+        method_name=rule.method_name,
+        email=rule.email,
+        action=rule.action,
+        custom_response=rule.custom_response,
+        remark=rule.remark,
+        is_enabled=rule.is_enabled,
+        is_global=rule.is_global,
+        conditions=json.loads(rule.conditions) if rule.conditions else None,
+        priority=rule.priority or 0,
+        created_at=rule.created_at,
+        updated_at=rule.updated_at,
+    )
+
+
 @router.get("/api/rules", response_model=List[schemas.RuleResponse])
 async def list_rules(
+    request: Request,
+    response: Response,
     current_user: str = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
+):
+    etag = make_etag("rules", await RulesRepository.data_version(db))
+    cached = not_modified(request, response, etag)
+    if cached:
+        return cached
+    rules = await RulesRepository.list_all(db)
+    return [rule_response(rule) for rule in rules]
+
+
+def merged_transform(rule, existing) -> tuple:
+    # 部分更新未传入的字段沿用已保存的值，按合并后的动作和配置校验
+    if existing is None:
+        return rule.action, rule.custom_response
+    action = rule.action if rule.action is not None else existing.action
+    custom_response = rule.custom_response if rule.custom_response is not None else existing.custom_response
+    return action, custom_response
+
+
+def rule_errors(rules: list, existing: Optional[dict] = None) -> List[str]:
+    errors = []
+    for index, rule in enumerate(rules):
+        if rule.method_name is not None and not rule.method_name.strip():
+            errors.append(f"rules[{index}]: method_name must not be empty")
+        elif rule.method_name is not None:
+            errors.extend(f"rules[{index}]: {error}" for error in method_pattern_errors(rule.method_name))
+        action, custom_response = merged_transform(rule, existing.get(rule.id) if existing is not None else None)
+        if action is not None:
+            # 动作及其配置交给转换注册表按实际编译过程校验
+            errors.extend(f"rules[{index}]: {error}" for error in get_transform_registry().errors(action, custom_response))
+        errors.extend(f"rules[{index}]: {error}" for error in condition_errors(rule.conditions))
+    return errors
+
+
+async def upsert_rules(db: AsyncSession, rules: List[schemas.RuleImportItem], replace: bool = False) -> dict:
+    # 先校验全部规则，任何一条不合法都不写入
+    errors = rule_errors(rules)
+    if errors:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=errors)
+    ids, created, updated = await RulesRepository.bulk_upsert(db, [rule.model_dump() for rule in rules], replace)
+    get_rule_cache().invalidate()
+    return {"ids": ids, "created": created, "updated": updated}
+
+
+@router.get("/api/rules/export", response_model=schemas.RulesExport)
+async def export_rules(
+    current_user: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db),
 ):
     rules = await RulesRepository.list_all(db)
-    return [
-        schemas.RuleResponse(
-            id=rule.id,
+    export = schemas.RulesExport(rules=[
+        schemas.RuleImportItem(
             method_name=rule.method_name,
             email=rule.email,
             action=rule.action,
             custom_response=rule.custom_response,
             remark=rule.remark,
-            is_enabled=rule.is_enabled,
             is_global=rule.is_global,
-            created_at=rule.created_at,
-            updated_at=rule.updated_at,
+            is_enabled=rule.is_enabled,
+            conditions=json.loads(rule.conditions) if rule.conditions else None,
+            priority=rule.priority or 0,
         )
-        for rule in rules
-    ]
+        for rule in reversed(rules)
+    ])
+    return Response(
+        content=export.model_dump_json(),
+        media_type="application/json",
+        headers={"Content-Disposition": 'attachment; filename="interception_rules.json"'},
+    )
 
 
-@router.post("/api/rules", response_model=schemas.RuleResponse, status_code=status.HTTP_201_CREATED)
-async def create_rule(
-    request: schemas.CreateRuleRequest,
+@router.post("/api/rules/import")
+async def import_rules(
+    request: schemas.RulesExport,
+    replace: bool = False,
+    current_user: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    return await upsert_rules(db, request.rules, replace)
+
+
+@router.post("/api/rules/bulk")
+async def bulk_create_rules(
+    request: schemas.BulkCreateRulesRequest,
+    current_user: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    return await upsert_rules(db, request.rules)
+
+
+@router.put("/api/rules/bulk")
+async def bulk_update_rules(
+    request: schemas.BulkUpdateRulesRequest,
+    current_user: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    existing = await RulesRepository.find_by_ids(db, [rule.id for rule in request.rules])
+    errors = rule_errors(request.rules, existing)
+    if errors:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=errors)
+    ids = await RulesRepository.bulk_update(db, [rule.model_dump() for rule in request.rules])
+    get_rule_cache().invalidate()
+    return {"ids": ids, "updated": len(ids)}
+
+
+@router.post("/api/rules/bulk/enable")
+async def bulk_enable_rules(
+    request: schemas.BulkEnableRulesRequest,
     current_user: str = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
-    valid_actions = ["passthrough", "modify", "replace", "randomize_app_duration"]
-    if request.action not in valid_actions:
+    updated = await RulesRepository.bulk_set_enabled(db, request.ids, request.is_enabled)
+    get_rule_cache().invalidate()
+    return {"updated": updated}
+
+
+@router.post("/api/rules/bulk/delete")
+async def bulk_delete_rules(
+    request: schemas.BulkRuleIdsRequest,
+    current_user: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    deleted = await RulesRepository.bulk_delete(db, request.ids)
+    get_rule_cache().invalidate()
+    return {"deleted": deleted}
+
+
+@router.post("/api/rules/dry-run", response_model=schemas.RuleDryRunResponse)
+async def dry_run_rules(
+    request: schemas.RuleDryRunRequest,
+    current_user: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db),
+):
+    # 与代理相同的匹配流程，未指定邮箱时从参数中提取
+    email = request.email or extract_email(request.params)
+    candidates = await get_rule_cache().explain(db, request.method, email, request.params)
+    matched = next((rule for rule, is_match in candidates if is_match), None)
+    return schemas.RuleDryRunResponse(
+        method=request.method,
+        email=email,
+        rule=rule_response(matched) if matched else None,
+        candidates=[
+            schemas.RuleDryRunCandidate(id=rule.id, priority=rule.priority or 0, is_global=rule.is_global, matched=is_match)
+            for rule, is_match in candidates
+        ],
+    )
+
+
+def validate_conditions(conditions: Optional[dict]):
+    errors = condition_errors(conditions)
+    if errors:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Invalid action '{request.action}'. Must be one of: {', '.join(valid_actions)}",
+            detail=f"Invalid conditions: {errors[0]}",
         )
-    
-    if request.action in ["replace", "modify"] and not request.custom_response:
+
+
+def validate_transform(action: Optional[str], custom_response: Optional[str]):
+    errors = get_transform_registry().errors(action, custom_response) if action else []
+    if errors:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=errors[0],
+        )
+
+
+def validate_method_name(method_name: Optional[str]):
+    errors = method_pattern_errors(method_name) if method_name else []
+    if errors:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="custom_response is required when action is 'replace' or 'modify'",
+            detail=f"Invalid method_name: {errors[0]}",
         )
+
+
+@router.post("/api/rules", response_model=schemas.RuleResponse, status_code=status.HTTP_201_CREATED)
+async def create_rule(
+    request: schemas.CreateRuleRequest,
+    current_user: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    validate_transform(request.action, request.custom_response)
+    validate_method_name(request.method_name)
+    validate_conditions(request.conditions)
     
     try:
         rule_id = await RulesRepository.create(
@@ -123,9 +309,12 @@ async def create_rule(
             request.custom_response,
             email=request.email,
             is_global=request.is_global,
-            remark=request.remark
+            remark=request.remark,
+            conditions=request.conditions,
+            priority=request.priority
         )
         rule = await RulesRepository.find_by_id(db, rule_id)
+        get_rule_cache().invalidate()
     except Exception as e:
         logger.error(f"Failed to create rule: {e}")
         raise HTTPException(
@@ -133,18 +322,7 @@ async def create_rule(
             detail=f"Failed to create rule: {str(e)}",
         )
     
-    return schemas.RuleResponse(
-        id=rule.id,
-        method_name=rule.method_name,
-        email=rule.email,
-        action=rule.action,
-        custom_response=rule.custom_response,
-        remark=rule.remark,
-        is_enabled=rule.is_enabled,
-        is_global=rule.is_global,
-        created_at=rule.created_at,
-        updated_at=rule.updated_at,
-    )
+    return rule_response(rule)
 
 
 @router.put("/api/rules/{rule_id}", response_model=schemas.RuleResponse)
@@ -154,17 +332,15 @@ async def update_rule(
     current_user: str = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
-    if request.action and request.action not in ["passthrough", "modify", "replace", "randomize_app_duration"]:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid action",
-        )
-    
-    if request.action and request.action in ["replace", "modify"] and not request.custom_response:
+    existing = await RulesRepository.find_by_id(db, rule_id)
+    if existing is None:
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="custom_response is required when action is 'replace' or 'modify'",
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Rule not found",
         )
+    validate_transform(*merged_transform(request, existing))
+    validate_method_name(request.method_name)
+    validate_conditions(request.conditions)
     
     success = await RulesRepository.update(
         db,
@@ -175,7 +351,9 @@ async def update_rule(
         is_enabled=request.is_enabled,
         email=request.email,
         is_global=request.is_global,
-        remark=request.remark
+        remark=request.remark,
+        conditions=request.conditions,
+        priority=request.priority
     )
     
     if not success:
@@ -183,20 +361,10 @@ async def update_rule(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Rule not found",
         )
+    get_rule_cache().invalidate()
     
     rule = await RulesRepository.find_by_id(db, rule_id)
-    return schemas.RuleResponse(
-        id=rule.id,
-        method_name=rule.method_name,
-        email=rule.email,
-        action=rule.action,
-        custom_response=rule.custom_response,
-        remark=rule.remark,
-        is_enabled=rule.is_enabled,
-        is_global=rule.is_global,
-        created_at=rule.created_at,
-        updated_at=rule.updated_at,
-    )
+    return rule_response(rule)
 
 
 @router.delete("/api/rules/{rule_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -211,25 +379,223 @@ async def delete_rule(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Rule not found",
         )
+    get_rule_cache().invalidate()
+
+
+def tactics_response(template) -> schemas.TacticsTemplateResponse:
+    return schemas.TacticsTemplateResponse(
+        id=template.id,
+        name=template.name,
+        template_json=template.template_json,
+        email=template.email,
+        description=template.description,
+        is_default=bool(template.is_default),
+        is_applied=bool(template.is_applied),
+        created_at=template.created_at,
+        updated_at=template.updated_at,
+    )
+
+
+def validate_template(template_json: Optional[str]):
+    errors = template_errors(template_json) if template_json is not None else []
+    if errors:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=errors[0],
+        )
+
+
+@router.get("/api/tactics", response_model=List[schemas.TacticsTemplateResponse])
+async def list_tactics_templates(
+    current_user: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db),
+):
+    templates = await TacticsRepository.list_all(db)
+    return [tactics_response(template) for template in templates]
+
+
+@router.get("/api/tactics/{template_id}", response_model=schemas.TacticsTemplateResponse)
+async def get_tactics_template(
+    template_id: int,
+    current_user: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db),
+):
+    template = await TacticsRepository.find_by_id(db, template_id)
+    if not template:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Tactics template not found",
+        )
+    return tactics_response(template)
 
 
-@router.get("/api/commands", response_model=List[schemas.CommandResponse])
+@router.post("/api/tactics", response_model=schemas.TacticsTemplateResponse, status_code=status.HTTP_201_CREATED)
+async def create_tactics_template(
+    request: schemas.CreateTacticsTemplateRequest,
+    current_user: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    validate_template(request.template_json)
+    template_id = await TacticsRepository.create(
+        db,
+        request.name,
+        request.template_json,
+        email=request.email,
+        description=request.description,
+        is_default=request.is_default
+    )
+    template = await TacticsRepository.find_by_id(db, template_id)
+    return tactics_response(template)
+
+
+@router.put("/api/tactics/{template_id}", response_model=schemas.TacticsTemplateResponse)
+async def update_tactics_template(
+    template_id: int,
+    request: schemas.UpdateTacticsTemplateRequest,
+    current_user: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    validate_template(request.template_json)
+    success = await TacticsRepository.update(
+        db,
+        template_id,
+        name=request.name,
+        template_json=request.template_json,
+        email=request.email,
+        description=request.description,
+        is_default=request.is_default
+    )
+    if not success:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Tactics template not found",
+        )
+    get_tactics_cache().invalidate()
+    
+    template = await TacticsRepository.find_by_id(db, template_id)
+    return tactics_response(template)
+
+
+@router.delete("/api/tactics/{template_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_tactics_template(
+    template_id: int,
+    current_user: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    success = await TacticsRepository.delete(db, template_id)
+    if not success:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Tactics template not found",
+        )
+    get_tactics_cache().invalidate()
+
+
+@router.post("/api/tactics/{template_id}/apply", response_model=schemas.TacticsTemplateResponse)
+async def apply_tactics_template(
+    template_id: int,
+    applied: bool = True,
+    current_user: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    # applied=false 撤销应用，该范围的请求恢复转发到上游
+    success = await TacticsRepository.set_applied(db, template_id, applied)
+    if not success:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Tactics template not found",
+        )
+    get_tactics_cache().invalidate()
+    
+    template = await TacticsRepository.find_by_id(db, template_id)
+    return tactics_response(template)
+
+
+COMMAND_STATUSES = ["unverified", "verified", "rejected"]
+MAX_COMMANDS_PAGE_SIZE = 500
+
+
+def validate_command_status(value: str):
+    if value not in COMMAND_STATUSES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid status '{value}'. Must be one of: {', '.join(COMMAND_STATUSES)}",
+        )
+
+
+@router.get("/api/commands", response_model=schemas.PaginatedCommandsResponse)
 async def list_commands(
+    status_filter: Optional[str] = Query(None, alias="status"),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = 50,
+    current_user: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db),
+):
+    if status_filter:
+        validate_command_status(status_filter)
+    limit = max(1, min(limit, MAX_COMMANDS_PAGE_SIZE))
+    try:
+        commands, next_cursor = await CommandsRepository.list_page(db, status_filter, since, until, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    return schemas.PaginatedCommandsResponse(
+        data=[
+            schemas.CommandResponse(
+                id=cmd.id,
+                command=json.loads(cmd.command_json) if cmd.command_json else {},
+                status=cmd.status,
+                received_at=cmd.received_at,
+                processed_at=cmd.processed_at,
+                notes=cmd.notes,
+            )
+            for cmd in commands
+        ],
+        next_cursor=next_cursor,
+    )
+
+
+@router.post("/api/commands/bulk/status")
+async def bulk_update_commands(
+    request: schemas.BulkUpdateCommandsRequest,
+    current_user: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    validate_command_status(request.status)
+    updated = await CommandsRepository.bulk_update_status(db, request.ids, request.status, request.notes)
+    return {"updated": updated}
+
+
+@router.post("/api/commands/bulk/verify")
+async def bulk_verify_commands(
+    request: schemas.BulkVerifyCommandsRequest,
     current_user: str = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
-    commands = await CommandsRepository.list_all(db)
-    return [
-        schemas.CommandResponse(
-            id=cmd.id,
-            command=json.loads(cmd.command_json) if cmd.command_json else {},
-            status=cmd.status,
-            received_at=cmd.received_at,
-            processed_at=cmd.processed_at,
-            notes=cmd.notes,
+    # 只验证仍处于待验证状态的命令，已拒绝的命令不会被覆盖
+    updated = await CommandsRepository.bulk_update_status(
+        db, request.ids, "verified", request.notes, from_status="unverified"
+    )
+    return {"updated": updated}
+
+
+@router.post("/api/commands/bulk/delete")
+async def bulk_delete_commands(
+    request: schemas.BulkDeleteCommandsRequest,
+    current_user: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    if request.ids is None and not request.status and not request.before:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="At least one of ids, status or before is required",
         )
-        for cmd in commands
-    ]
+    if request.status:
+        validate_command_status(request.status)
+    deleted = await CommandsRepository.bulk_delete(db, request.ids, request.status, request.before)
+    return {"deleted": deleted}
 
 
 @router.post("/api/commands/{command_id}", response_model=schemas.CommandResponse)
@@ -309,65 +675,413 @@ async def list_logs(
     search: Optional[str] = None,
     page: int = 1,
     limit: int = 50,
+    bodies: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
     current_user: str = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
     # 显式从query_params获取method，解决带点方法名的匹配问题
     method = request.query_params.get("method")
+    try:
+        columns = parse_bodies(bodies)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     offset = (page - 1) * limit
-    logs, total = await LogsRepository.list(db, method, search, limit, offset)
+    # 指定时间窗口时只查询覆盖该窗口的日志分区
+    rows, total = await LogsRepository.list_rows(db, method, search, limit, offset, columns, since, until)
     
-    return schemas.PaginatedLogsResponse(
-        data=[
-            schemas.RequestLogResponse(
-                id=log.id,
-                method=log.method,
-                request_body=json.loads(log.request_body) if log.request_body else {},
-                response_body=json.loads(log.response_body) if log.response_body else {},
-                intercepted_request=json.loads(log.intercepted_request) if log.intercepted_request else None,
-                intercepted_response=json.loads(log.intercepted_response) if log.intercepted_response else None,
-                request_interception_action=log.request_interception_action,
-                response_interception_action=log.response_interception_action,
-                email=getattr(log, 'email', None),
-                created_at=log.created_at,
-            )
-            for log in logs
-        ],
-        total=total,
+    # 正文在写入时已校验为合法 JSON，直接拼接存储的文本，不再逐条解析和序列化
+    return Response(content=render_page(rows, total, columns), media_type="application/json")
+
+
+@router.get("/api/logs/export")
+async def export_logs(
+    format: str = "ndjson",
+    gzip: bool = False,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    method: Optional[str] = None,
+    email: Optional[str] = None,
+    action: Optional[str] = None,
+    include_bodies: bool = True,
+    current_user: str = Depends(get_current_user),
+):
+    if format not in CONTENT_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid format '{format}'. Must be one of: {', '.join(CONTENT_TYPES)}",
+        )
+    
+    # 流式响应在依赖注入的会话关闭后才开始发送，因此在生成器内自行打开会话
+    async def chunks():
+        async with read_session_maker() as db:
+            async for rows in LogsRepository.stream(db, since, until, method, email, action, include_bodies):
+                yield rows
+    
+    filename = f"request_logs.{format}" + (".gz" if gzip else "")
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    return StreamingResponse(
+        serialize(format, chunks(), include_bodies, gzip),
+        media_type="application/gzip" if gzip else CONTENT_TYPES[format],
+        headers=headers,
+    )
+
+
+@router.get("/api/logs/live")
+async def live_logs(
+    request: Request,
+    email: Optional[str] = None,
+    action: Optional[str] = None,
+    bodies: bool = False,
+    current_user: str = Depends(get_current_user),
+):
+    # 显式从query_params获取method，解决带点方法名的匹配问题
+    method = request.query_params.get("method")
+    last_event_id = request.headers.get("last-event-id")
+    live_tail = get_live_tail()
+    try:
+        subscriber = live_tail.subscribe(
+            LiveFilter(method, email, action),
+            bodies,
+            int(last_event_id) if last_event_id and last_event_id.isdigit() else None,
+        )
+    except OverflowError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    
+    return StreamingResponse(
+        live_tail.stream(subscriber),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
 
 @router.get("/api/logs/methods", response_model=List[str])
 async def list_methods(
+    request: Request,
+    response: Response,
     current_user: str = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
+    # 版本未变化时跳过 DISTINCT 全表查询
+    etag = make_etag("methods", await LogsRepository.data_version(db))
+    cached = not_modified(request, response, etag)
+    if cached:
+        return cached
     return await LogsRepository.list_methods(db)
 
 
 @router.get("/api/logs/emails", response_model=List[str])
 async def list_emails(
+    request: Request,
+    response: Response,
     current_user: str = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
-    return await LogsRepository.list_emails(db)
+    # 邮箱来自设备表，没有设备时会回退到规则中的邮箱，因此同时依赖规则版本；
+    # 设备只增不删，设备数加上尚未写入的新邮箱数即可作为版本，写入设备表前后不变
+    registry = get_device_registry()
+    etag = make_etag(
+        "emails", await DevicesRepository.count(db) + len(registry.new_emails), await RulesRepository.data_version(db)
+    )
+    cached = not_modified(request, response, etag)
+    if cached:
+        return cached
+    return sorted(set(await DevicesRepository.list_emails(db)).union(registry.pending_emails()))
 
 
 @router.get("/api/logs/stats")
 async def get_logs_stats(
     current_user: str = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
-    logs, total = await LogsRepository.list(db, None, None, 1, 0)
-    methods = await LogsRepository.list_methods(db)
-    emails = await LogsRepository.list_emails(db)
+    # 方法和邮箱来自设备汇总表，日志总数按各分区的 id 范围估算，不扫描日志表
+    registry = get_device_registry()
+    total = sum(partition["rows"] for partition in await LogsRepository.list_partitions(db))
+    methods = sorted(set(await DevicesRepository.list_method_names(db)).union(registry.pending_methods()))
+    emails = sorted(set(await DevicesRepository.list_emails(db)).union(registry.pending_emails()))
     return {
         "total_logs": total,
         "methods_count": len(methods),
         "emails_count": len(emails),
         "methods": methods,
-        "emails": emails
+        "emails": emails,
+        "live_tail": get_live_tail().snapshot(),
+        "devices": registry.snapshot()
+    }
+
+
+def device_response(email: str, device, pending) -> dict:
+    # 合并尚未写入设备表的计数，刚出现的设备也能立即查到
+    summary = {
+        "email": email,
+        "first_seen": device.first_seen if device else None,
+        "last_seen": device.last_seen if device else None,
+        "request_count": (device.request_count or 0) if device else 0,
+        "last_method": device.last_method if device else None,
+        "model": device.model if device else None,
+        "swdid": device.swdid if device else None,
+    }
+    if pending is not None:
+        summary["first_seen"] = min(summary["first_seen"] or pending.first_seen, pending.first_seen)
+        summary["last_seen"] = pending.last_seen
+        summary["request_count"] += pending.count
+        summary["last_method"] = pending.last_method
+        summary["model"] = pending.model or summary["model"]
+        summary["swdid"] = pending.swdid or summary["swdid"]
+    return summary
+
+
+@router.get("/api/devices", response_model=schemas.PaginatedDevicesResponse)
+async def list_devices(
+    search: Optional[str] = None,
+    page: int = 1,
+    limit: int = 50,
+    current_user: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db),
+):
+    # 按最后活跃时间排序，最多滞后一个写入周期
+    registry = get_device_registry()
+    devices, total = await DevicesRepository.list(db, search, limit, (page - 1) * limit)
+    return {
+        "data": [device_response(device.email, device, registry.pending(device.email)) for device in devices],
+        "total": total,
     }
 
 
+@router.get("/api/devices/{email}", response_model=schemas.DeviceDetailResponse)
+async def get_device(
+    email: str,
+    current_user: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db),
+):
+    device = await DevicesRepository.find(db, email)
+    pending = get_device_registry().pending(email)
+    if device is None and pending is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Device not found")
+    methods = {
+        row.method: {"method": row.method, "request_count": row.request_count or 0, "last_seen": row.last_seen}
+        for row in await DevicesRepository.list_methods(db, email)
+    }
+    if pending is not None:
+        for method, (count, last_seen) in pending.methods.items():
+            entry = methods.setdefault(method, {"method": method, "request_count": 0, "last_seen": last_seen})
+            entry["request_count"] += count
+            entry["last_seen"] = max(entry["last_seen"] or last_seen, last_seen)
+    return {
+        **device_response(email, device, pending),
+        "methods": sorted(methods.values(), key=lambda entry: (-entry["request_count"], entry["method"])),
+    }
+
+
+@router.get("/api/logs/partitions")
+async def list_log_partitions(
+    current_user: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db),
+):
+    return await LogsRepository.list_partitions(db)
+
+
+@router.delete("/api/logs/partitions")
+async def drop_log_partitions(
+    before: datetime,
+    current_user: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    # 只删除整个时间范围都早于 before 的分区，当前写入的分区不会被删除
+    dropped = await LogsRepository.drop_partitions(db, before)
+    return {"dropped": dropped}
+
+
+@router.get("/api/logs/archive")
+async def search_log_archive(
+    request: Request,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    email: Optional[str] = None,
+    search: Optional[str] = None,
+    page: int = 1,
+    limit: int = 50,
+    bodies: Optional[str] = None,
+    current_user: str = Depends(get_current_user),
+):
+    # 显式从query_params获取method，解决带点方法名的匹配问题
+    method = request.query_params.get("method")
+    try:
+        columns = parse_bodies(bodies)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    try:
+        rows, total = await get_log_archive().search(since, until, method, email, search, limit, (page - 1) * limit)
+    except ArchiveError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    return Response(content=render_page(rows, total, columns), media_type="application/json")
+
+
+@router.get("/api/logs/archive/segments")
+async def get_log_archive_state(
+    current_user: str = Depends(get_current_user),
+):
+    return get_log_archive().snapshot()
+
+
+@router.post("/api/logs/archive")
+async def archive_logs(
+    before: datetime,
+    current_user: str = Depends(get_current_user),
+):
+    # 把整个时间范围都早于 before 的日志分区写入归档段文件，当前写入的分区不会被归档
+    try:
+        archived = await get_log_archive().archive(before)
+    except ArchiveError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    return {"archived": archived}
+
+
+@router.get("/api/logs/policies")
+async def list_log_policies(
+    current_user: str = Depends(get_current_user),
+):
+    return get_log_policies().snapshot()
+
+
+@router.put("/api/logs/policies")
+async def update_log_policies(
+    request: schemas.UpdateLogPoliciesRequest,
+    current_user: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    # 策略保存在配置表中，与 PUT /api/config/log_policies 等价，其他 worker 通过配置轮询生效
+    runtime = get_runtime_config()
+    try:
+        value = runtime.validate(POLICY_KEY, json.dumps(request.policies, ensure_ascii=False))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    await ConfigRepository.set(db, POLICY_KEY, value, runtime.describe(POLICY_KEY))
+    await runtime.reload()
+    return get_log_policies().snapshot()
+
+
+@router.get("/api/logs/{log_id}", response_model=schemas.RequestLogResponse)
+async def get_log(
+    log_id: int,
+    current_user: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db),
+):
+    row = await LogsRepository.find_row_by_id(db, log_id, BODY_COLUMNS)
+    if not row:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Log not found"
+        )
+    return Response(content=render_log(row, BODY_COLUMNS), media_type="application/json")
+
+
+@router.get("/api/upstream")
+async def get_upstream_state(
+    current_user: str = Depends(get_current_user),
+):
+    return get_upstream().snapshot()
+
+
+@router.post("/api/upstream/reset")
+async def reset_upstream_breakers(
+    method: Optional[str] = None,
+    current_user: str = Depends(get_current_user),
+):
+    get_upstream().reset(method)
+    return {"status": "ok"}
+
+
+@router.get("/api/admission")
+async def get_admission_state(
+    current_user: str = Depends(get_current_user),
+):
+    return get_admission().snapshot()
 
+
+@router.get("/api/database")
+async def get_database_state(
+    current_user: str = Depends(get_current_user),
+):
+    return pool_snapshot()
+
+
+@router.get("/api/transforms")
+async def get_transforms(
+    current_user: str = Depends(get_current_user),
+):
+    return get_transform_registry().snapshot()
+
+
+@router.put("/api/upstream/targets")
+async def update_upstream_targets(
+    request: schemas.UpdateUpstreamTargetsRequest,
+    current_user: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    runtime = get_runtime_config()
+    try:
+        value = runtime.validate("target_url", ",".join(request.targets))
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e),
+        )
+    
+    await ConfigRepository.set(db, "target_url", value, "Comma separated upstream target URLs")
+    await runtime.reload()
+    return get_upstream().pool.snapshot()
+
+
+@router.get("/api/config", response_model=List[schemas.ConfigItemResponse])
+async def list_config(
+    current_user: str = Depends(get_current_user),
+):
+    return get_runtime_config().snapshot()
+
+
+@router.put("/api/config/{key}", response_model=schemas.ConfigItemResponse)
+async def update_config(
+    key: str,
+    request: schemas.UpdateConfigRequest,
+    current_user: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    runtime = get_runtime_config()
+    try:
+        value = runtime.validate(key, request.value)
+    except KeyError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Unknown config key '{key}'",
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid value for '{key}': {e}",
+        )
+    
+    # 保存规范化后的值，其他 worker 通过 data_version 轮询在一个周期内生效
+    stored = value if isinstance(value, str) else request.value.strip()
+    await ConfigRepository.set(db, key, stored, runtime.describe(key))
+    await runtime.reload()
+    return next(item for item in runtime.snapshot() if item["key"] == key)
+
+
+@router.delete("/api/config/{key}", response_model=schemas.ConfigItemResponse)
+async def reset_config(
+    key: str,
+    current_user: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    runtime = get_runtime_config()
+    if not runtime.is_tunable(key):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Unknown config key '{key}'",
+        )
+    
+    await ConfigRepository.delete(db, key)
+    await runtime.reload()
+    return next(item for item in runtime.snapshot() if item["key"] == key)
@@ -0,0 +1,211 @@
+import asyncio
+import logging
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.method_patterns import MethodMatcher, MethodPatternError
+from app.models import InterceptionRule
+from app.repositories import RULES_VERSION_KEY, RulesRepository
+from app.rule_conditions import ConditionError, compile_conditions, lookup, value_key
+from app.transforms import TransformError, get_transform_registry
+from app.runtime_config import get_runtime_config
+
+logger = logging.getLogger(__name__)
+
+
+class CompiledRule:
+    __slots__ = ("rule", "key", "conditions", "pipeline")
+
+    def __init__(self, rule: InterceptionRule, position: int):
+        self.rule = rule
+        # 优先级高者优先；同优先级时用户规则优先于全局规则，再按创建时间倒序
+        self.key = (-(rule.priority or 0), 1 if rule.is_global else 0, position)
+        self.conditions = compile_conditions(rule.conditions)
+        self.pipeline = get_transform_registry().compile(rule.action, rule.custom_response)
+
+    def matches(self, params: dict) -> bool:
+        return self.conditions is None or self.conditions(params)
+
+
+class RuleSet:
+    def __init__(self):
+        self.scan: List[CompiledRule] = []
+        self.index: Dict[Union[str, Tuple[str, ...]], Dict[Optional[str], List[CompiledRule]]] = {}
+
+    def add(self, compiled: CompiledRule):
+        conditions = compiled.conditions
+        if conditions is None or conditions.index is None:
+            self.scan.append(compiled)
+            return
+        path, keys = conditions.index
+        buckets = self.index.setdefault(path, {})
+        for key in keys:
+            buckets.setdefault(key, []).append(compiled)
+
+    def rules(self) -> List[CompiledRule]:
+        unique = {id(compiled): compiled for compiled in self.scan}
+        for buckets in self.index.values():
+            for bucket in buckets.values():
+                unique.update((id(compiled), compiled) for compiled in bucket)
+        return sorted(unique.values(), key=lambda compiled: compiled.key)
+
+    def match(self, params: dict) -> Optional[CompiledRule]:
+        # 各列表均按 key 排好序，找到第一个满足条件的即可停止；带相等条件的规则只检查参数值命中的桶
+        best = None
+        for compiled in self.scan:
+            if compiled.conditions is None or compiled.conditions(params):
+                best = compiled
+                break
+        for path, buckets in self.index.items():
+            bucket = buckets.get(value_key(lookup(params, path)))
+            if not bucket:
+                continue
+            for compiled in bucket:
+                if best is not None and compiled.key >= best.key:
+                    break
+                if compiled.conditions(params):
+                    best = compiled
+                    break
+        return best
+
+
+class MethodRules:
+    def __init__(self):
+        self.by_email: Dict[str, RuleSet] = {}
+        self.global_rules = RuleSet()
+
+    def add(self, compiled: CompiledRule, emails: List[str]):
+        rule = compiled.rule
+        if rule.is_global:
+            if not rule.email:
+                self.global_rules.add(compiled)
+        else:
+            for email in emails:
+                self.by_email.setdefault(email, RuleSet()).add(compiled)
+
+    def freeze(self):
+        for rule_set in [self.global_rules, *self.by_email.values()]:
+            rule_set.scan.sort(key=lambda compiled: compiled.key)
+            for buckets in rule_set.index.values():
+                for bucket in buckets.values():
+                    bucket.sort(key=lambda compiled: compiled.key)
+
+    def candidates(self, email: Optional[str]) -> List[CompiledRule]:
+        rules = self.global_rules.rules()
+        if email and email in self.by_email:
+            rules = sorted(rules + self.by_email[email].rules(), key=lambda compiled: compiled.key)
+        return rules
+
+    def find(self, email: Optional[str], params: dict) -> Optional[CompiledRule]:
+        best = self.global_rules.match(params)
+        if email:
+            rule_set = self.by_email.get(email)
+            if rule_set is not None:
+                user = rule_set.match(params)
+                if user is not None and (best is None or user.key < best.key):
+                    best = user
+        return best
+
+
+class RuleCache:
+    def __init__(self):
+        self.by_method: Dict[str, MethodRules] = {}
+        self.matcher: MethodMatcher[MethodRules] = MethodMatcher()
+        self.generation = 0
+        self.loaded_generation = -1
+        self.loads = 0
+        self._lock = asyncio.Lock()
+
+    def invalidate(self):
+        self.generation += 1
+
+    def on_config_change(self, changed: Dict[str, str], raw: Dict[str, str]):
+        # 其他 worker 修改规则后会递增 rules_version，通过运行时配置轮询感知
+        if RULES_VERSION_KEY in changed:
+            self.invalidate()
+
+    def build(self, rules: List[InterceptionRule], targets: List[Tuple[int, str]]):
+        emails: Dict[int, List[str]] = {}
+        for rule_id, email in targets:
+            emails.setdefault(rule_id, []).append(email)
+        by_method: Dict[str, MethodRules] = {}
+        for position, rule in enumerate(rules):
+            try:
+                compiled = CompiledRule(rule, position)
+            except (ConditionError, TransformError) as e:
+                # 条件和动作配置在保存时已校验，这里只可能是直接改库写入的坏数据
+                logger.warning(f"Skipping invalid rule {rule.id}: {e}")
+                continue
+            by_method.setdefault(rule.method_name, MethodRules()).add(compiled, emails.get(rule.id, []))
+        matcher: MethodMatcher[MethodRules] = MethodMatcher()
+        for method_name, method_rules in by_method.items():
+            method_rules.freeze()
+            try:
+                matcher.add(method_name, method_rules)
+            except MethodPatternError as e:
+                logger.warning(f"Skipping rules for invalid method pattern '{method_name}': {e}")
+        self.by_method = by_method
+        self.matcher = matcher
+
+    async def load(self, db: AsyncSession):
+        async with self._lock:
+            if self.loaded_generation == self.generation:
+                return
+            generation = self.generation
+            rules = await RulesRepository.list_enabled(db)
+            targets = await RulesRepository.list_targets(db)
+            self.build(rules, targets)
+            self.loaded_generation = generation
+            self.loads += 1
+            logger.info(f"Loaded {len(rules)} interception rules into cache")
+
+    async def find_compiled(
+        self, db: AsyncSession, method: str, email: Optional[str] = None, params: Optional[Dict[str, Any]] = None
+    ) -> Optional[CompiledRule]:
+        if self.loaded_generation != self.generation:
+            await self.load(db)
+        params = params if isinstance(params, dict) else {}
+        # 精确方法名的规则都不命中时，才依次尝试前缀和模式规则
+        for method_rules in self.matcher.resolve(method):
+            compiled = method_rules.find(email, params)
+            if compiled is not None:
+                return compiled
+        return None
+
+    async def find(
+        self, db: AsyncSession, method: str, email: Optional[str] = None, params: Optional[Dict[str, Any]] = None
+    ) -> Optional[InterceptionRule]:
+        compiled = await self.find_compiled(db, method, email, params)
+        return compiled.rule if compiled is not None else None
+
+    async def explain(
+        self, db: AsyncSession, method: str, email: Optional[str] = None, params: Optional[Dict[str, Any]] = None
+    ) -> List[Tuple[InterceptionRule, bool]]:
+        # 按匹配顺序列出候选规则及其条件是否满足，第一个满足的即为命中规则
+        if self.loaded_generation != self.generation:
+            await self.load(db)
+        params = params if isinstance(params, dict) else {}
+        return [
+            (compiled.rule, compiled.matches(params))
+            for method_rules in self.matcher.resolve(method)
+            for compiled in method_rules.candidates(email)
+        ]
+
+    def snapshot(self) -> dict:
+        return {
+            "methods": len(self.by_method),
+            "prefixes": self.matcher.prefixes.size,
+            "globs": self.matcher.globs.size,
+            "patterns": len(self.matcher.patterns),
+            "stale": self.loaded_generation != self.generation,
+            "loads": self.loads,
+        }
+
+
+@lru_cache()
+def get_rule_cache() -> RuleCache:
+    cache = RuleCache()
+    get_runtime_config().on_change(cache.on_config_change)
+    return cache
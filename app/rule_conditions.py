@@ -0,0 +1,167 @@
+import json
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+Test = Callable[[Any], bool]
+MISSING = object()
+OPERATORS = ("eq", "ne", "in", "not_in", "gt", "gte", "lt", "lte", "regex", "prefix", "exists")
+
+
+class ConditionError(ValueError):
+    pass
+
+
+def value_key(value: Any) -> Optional[str]:
+    # 参数中的数字可能以字符串形式出现，相等比较统一按字符串进行
+    if value.__class__ is str:
+        return value
+    if value is MISSING or value is None:
+        return None
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+def to_number(value: Any) -> Optional[float]:
+    if value is MISSING or value is None or isinstance(value, bool):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def field_path(field: str) -> Union[str, Tuple[str, ...]]:
+    # 大多数条件只访问顶层参数，单个键直接用 dict.get
+    path = tuple(field.split("."))
+    return path[0] if len(path) == 1 else path
+
+
+def lookup(params: dict, path: Union[str, Tuple[str, ...]]) -> Any:
+    if path.__class__ is str:
+        return params.get(path, MISSING)
+    value = params
+    for key in path:
+        if not isinstance(value, dict):
+            return MISSING
+        value = value.get(key, MISSING)
+        if value is MISSING:
+            return MISSING
+    return value
+
+
+def compile_test(field: str, op: str, expected: Any) -> Test:
+    if op in ("eq", "ne"):
+        key = value_key(expected)
+        if op == "eq":
+            return lambda value: value_key(value) == key
+        return lambda value: value_key(value) != key
+    if op in ("in", "not_in"):
+        if not isinstance(expected, list):
+            raise ConditionError(f"{field}: '{op}' expects a list")
+        keys = frozenset(value_key(item) for item in expected)
+        if op == "in":
+            return lambda value: value_key(value) in keys
+        return lambda value: value_key(value) not in keys
+    if op in ("gt", "gte", "lt", "lte"):
+        bound = to_number(expected)
+        if bound is None:
+            raise ConditionError(f"{field}: '{op}' expects a number")
+        compare = {"gt": float.__gt__, "gte": float.__ge__, "lt": float.__lt__, "lte": float.__le__}[op]
+
+        def in_range(value: Any) -> bool:
+            number = to_number(value)
+            return number is not None and compare(number, bound)
+        return in_range
+    if op == "regex":
+        try:
+            search = re.compile(expected).search
+        except (TypeError, re.error) as e:
+            raise ConditionError(f"{field}: invalid regex: {e}")
+
+        def matches(value: Any) -> bool:
+            value = value_key(value)
+            return value is not None and search(value) is not None
+        return matches
+    if op == "prefix":
+        if not isinstance(expected, str):
+            raise ConditionError(f"{field}: 'prefix' expects a string")
+
+        def startswith(value: Any) -> bool:
+            value = value_key(value)
+            return value is not None and value.startswith(expected)
+        return startswith
+    if op == "exists":
+        present = bool(expected)
+        return lambda value: (value is not MISSING) == present
+    raise ConditionError(f"{field}: unknown operator '{op}'. Must be one of: {', '.join(OPERATORS)}")
+
+
+class CompiledConditions:
+    def __init__(self, fields: List[Tuple[Union[str, Tuple[str, ...]], List[Test]]], index):
+        # 每个字段只取一次值，再依次检查该字段上的运算符
+        self.fields = fields
+        # 第一个相等/in 条件作为索引键，匹配时按参数值直接定位候选规则
+        self.index = index
+
+    def __call__(self, params: dict) -> bool:
+        for path, tests in self.fields:
+            value = params.get(path, MISSING) if path.__class__ is str else lookup(params, path)
+            for test in tests:
+                if not test(value):
+                    return False
+        return True
+
+
+def parse_conditions(value: Union[str, Dict[str, Any], None]) -> Optional[Dict[str, Any]]:
+    if value is None or value == "":
+        return None
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except json.JSONDecodeError as e:
+            raise ConditionError(f"conditions is not valid JSON: {e}")
+    if not isinstance(value, dict):
+        raise ConditionError("conditions must be a JSON object")
+    return value or None
+
+
+def compile_conditions(value: Union[str, Dict[str, Any], None]) -> Optional[CompiledConditions]:
+    # 条件格式：{"字段": 值 | [值...] | {"运算符": 值, ...}}，字段可用点号访问嵌套参数，各条件同时满足才匹配
+    conditions = parse_conditions(value)
+    if conditions is None:
+        return None
+    fields = []
+    index = None
+    for field, spec in conditions.items():
+        if not field:
+            raise ConditionError("condition field must not be empty")
+        path = field_path(field)
+        if isinstance(spec, dict):
+            if not spec:
+                raise ConditionError(f"{field}: no operators given")
+            operators = spec
+        elif isinstance(spec, list):
+            operators = {"in": spec}
+        else:
+            operators = {"eq": spec}
+        fields.append((path, [compile_test(field, op, expected) for op, expected in operators.items()]))
+        for op, expected in operators.items():
+            if index is None and op == "eq":
+                index = (path, frozenset([value_key(expected)]))
+            elif index is None and op == "in":
+                index = (path, frozenset(value_key(item) for item in expected))
+    return CompiledConditions(fields, index)
+
+
+def condition_errors(value: Union[str, Dict[str, Any], None]) -> List[str]:
+    try:
+        compile_conditions(value)
+    except ConditionError as e:
+        return [str(e)]
+    return []
+
+
+def dump_conditions(value: Union[str, Dict[str, Any], None]) -> Optional[str]:
+    conditions = parse_conditions(value)
+    return json.dumps(conditions, ensure_ascii=False) if conditions else None
@@ -0,0 +1,272 @@
+import asyncio
+import logging
+import sqlite3
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional
+
+from app.config import Settings, get_settings
+from app.database import DB_PATH
+
+logger = logging.getLogger(__name__)
+
+# 敏感配置只在内存中使用，不通过管理接口返回
+SECRET_KEYS = {"admin_password_hash"}
+
+LOG_LEVELS = {"DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"}
+
+
+def parse_bool(value: str) -> bool:
+    lowered = value.strip().lower()
+    if lowered in ("1", "true", "yes", "on"):
+        return True
+    if lowered in ("0", "false", "no", "off"):
+        return False
+    raise ValueError(f"'{value}' is not a boolean")
+
+
+def parse_log_level(value: str) -> str:
+    level = value.strip().upper()
+    if level not in LOG_LEVELS:
+        raise ValueError(f"Log level must be one of: {', '.join(sorted(LOG_LEVELS))}")
+    return level
+
+
+def parse_target_urls(value: str) -> str:
+    urls = [url.strip().rstrip("/") for url in value.split(",") if url.strip()]
+    if not urls:
+        raise ValueError("At least one target URL is required")
+    for url in urls:
+        if not url.startswith(("http://", "https://")):
+            raise ValueError(f"Invalid target URL '{url}'")
+    return ",".join(urls)
+
+
+def parse_positive_float(value: str) -> float:
+    number = float(value)
+    if number <= 0:
+        raise ValueError("Value must be positive")
+    return number
+
+
+def parse_non_negative_float(value: str) -> float:
+    number = float(value)
+    if number < 0:
+        raise ValueError("Value must not be negative")
+    return number
+
+
+def parse_admission_method_limits(value: str) -> str:
+    from app.admission import parse_method_limits
+    
+    return parse_method_limits(value)
+
+
+def parse_log_policies(value: str) -> str:
+    from app.log_policy import parse_log_policies as parse
+    
+    return parse(value)
+
+
+def parse_non_negative_int(value: str) -> int:
+    number = int(value)
+    if number < 0:
+        raise ValueError("Value must not be negative")
+    return number
+
+
+class Tunable:
+    def __init__(self, key: str, parser: Callable[[str], Any], default: Callable[[Settings], Any], description: str):
+        self.key = key
+        self.parser = parser
+        self.default = default
+        self.description = description
+
+
+TUNABLES: Dict[str, Tunable] = {}
+
+
+def register_tunable(key: str, parser: Callable[[str], Any], default: Callable[[Settings], Any], description: str):
+    TUNABLES[key] = Tunable(key, parser, default, description)
+
+
+register_tunable("target_url", parse_target_urls, lambda s: s.LINSPIRER_TARGET_URL,
+                 "Comma separated upstream target URLs")
+register_tunable("upstream_timeout", parse_positive_float, lambda s: s.LINSPIRER_UPSTREAM_TIMEOUT,
+                 "Upstream request timeout in seconds")
+register_tunable("upstream_connect_timeout", parse_positive_float, lambda s: s.LINSPIRER_UPSTREAM_CONNECT_TIMEOUT,
+                 "Upstream connect timeout in seconds")
+register_tunable("retry_max", parse_non_negative_int, lambda s: s.LINSPIRER_RETRY_MAX,
+                 "Maximum upstream retries per request")
+register_tunable("hedge_enabled", parse_bool, lambda s: s.LINSPIRER_HEDGE_ENABLED,
+                 "Send hedged requests for idempotent methods")
+register_tunable("log_level", parse_log_level, lambda s: "INFO",
+                 "Python log level of the proxy process")
+register_tunable("request_logging_enabled", parse_bool, lambda s: True,
+                 "Store proxied requests in request_logs")
+register_tunable("log_retention_days", parse_non_negative_int, lambda s: s.LINSPIRER_LOG_RETENTION_DAYS,
+                 "Drop log partitions older than this many days, 0 keeps all")
+register_tunable("log_archive_days", parse_non_negative_int, lambda s: s.LINSPIRER_LOG_ARCHIVE_DAYS,
+                 "Move log partitions older than this many days to compressed archive segments, 0 disables")
+register_tunable("log_policies", parse_log_policies, lambda s: "{}",
+                 "Per-method request log policies as JSON: sampling, body truncation and field filtering")
+register_tunable("admission_max_inflight", parse_non_negative_int, lambda s: s.LINSPIRER_ADMISSION_MAX_INFLIGHT,
+                 "Maximum concurrent upstream calls, 0 disables the limit")
+register_tunable("admission_queue_size", parse_non_negative_int, lambda s: s.LINSPIRER_ADMISSION_QUEUE_SIZE,
+                 "Requests allowed to wait for an upstream slot before new ones are shed")
+register_tunable("admission_queue_timeout_ms", parse_non_negative_int, lambda s: s.LINSPIRER_ADMISSION_QUEUE_TIMEOUT_MS,
+                 "Longest time a request waits for an upstream slot")
+register_tunable("admission_device_rate", parse_non_negative_float, lambda s: s.LINSPIRER_ADMISSION_DEVICE_RATE,
+                 "Upstream requests per second allowed per email, 0 disables")
+register_tunable("admission_device_burst", parse_non_negative_int, lambda s: s.LINSPIRER_ADMISSION_DEVICE_BURST,
+                 "Token bucket size of the per-email rate limit")
+register_tunable("admission_method_limits", parse_admission_method_limits, lambda s: "{}",
+                 "Per-method concurrent upstream call limits as JSON")
+
+
+class RuntimeConfig:
+    def __init__(self, settings: Settings, db_path: str = DB_PATH):
+        self.settings = settings
+        self.db_path = db_path
+        self.raw: Dict[str, str] = {}
+        self.values: Dict[str, Any] = {}
+        self.loaded = False
+        self.data_version: Optional[int] = None
+        self.reloads = 0
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._listeners: List[Callable[[Dict[str, str], Dict[str, str]], None]] = []
+
+    def on_change(self, listener: Callable[[Dict[str, str], Dict[str, str]], None]):
+        self._listeners.append(listener)
+
+    def get(self, key: str) -> Any:
+        if key in self.values:
+            return self.values[key]
+        return TUNABLES[key].default(self.settings)
+
+    def get_raw(self, key: str) -> Optional[str]:
+        return self.raw.get(key)
+
+    async def fetch(self, key: str) -> Optional[str]:
+        if not self.loaded:
+            await self.reload()
+        return self.raw.get(key)
+
+    def _connection(self) -> sqlite3.Connection:
+        # PRAGMA data_version 只在同一连接上比较才有意义，因此保持一个常驻只读连接
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        return self._conn
+
+    def _read(self):
+        conn = self._connection()
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        rows = conn.execute("SELECT key, value FROM config").fetchall()
+        return version, dict(rows)
+
+    def _read_version(self) -> int:
+        return self._connection().execute("PRAGMA data_version").fetchone()[0]
+
+    def _apply(self, raw: Dict[str, str]):
+        values = {}
+        for key, value in raw.items():
+            tunable = TUNABLES.get(key)
+            if tunable is None:
+                continue
+            try:
+                values[key] = tunable.parser(value)
+            except ValueError as e:
+                logger.warning(f"Ignoring invalid config value for '{key}': {e}")
+
+        old = self.raw
+        self.raw = raw
+        self.values = values
+        self.loaded = True
+        self.reloads += 1
+
+        changed = {k: v for k, v in raw.items() if old.get(k) != v}
+        changed.update({k: None for k in old if k not in raw})
+        if changed and old:
+            logger.info(f"Runtime config changed: {', '.join(sorted(k for k in changed if k not in SECRET_KEYS))}")
+        for listener in self._listeners:
+            try:
+                listener(changed, raw)
+            except Exception as e:
+                logger.warning(f"Runtime config listener failed: {e}")
+
+    async def reload(self):
+        async with self._lock:
+            version, raw = await asyncio.to_thread(self._read)
+            self.data_version = version
+            self._apply(raw)
+
+    async def poll(self):
+        async with self._lock:
+            version = await asyncio.to_thread(self._read_version)
+            if version == self.data_version:
+                return
+        # 主库被其他连接写入（规则、命令等，日志在单独的库中），配置表很小，直接整表重读
+        await self.reload()
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.settings.LINSPIRER_CONFIG_POLL_INTERVAL)
+            try:
+                await self.poll()
+            except Exception as e:
+                logger.warning(f"Failed to poll runtime config: {e}")
+
+    async def start(self):
+        await self.reload()
+        if self._task is None and self.settings.LINSPIRER_CONFIG_POLL_INTERVAL > 0:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def is_tunable(self, key: str) -> bool:
+        return key in TUNABLES
+
+    def describe(self, key: str) -> Optional[str]:
+        tunable = TUNABLES.get(key)
+        return tunable.description if tunable else None
+
+    def validate(self, key: str, value: str) -> Any:
+        tunable = TUNABLES.get(key)
+        if tunable is None:
+            raise KeyError(key)
+        return tunable.parser(value)
+
+    def snapshot(self) -> List[dict]:
+        return [
+            {
+                "key": key,
+                "value": self.get(key),
+                "source": "config" if key in self.values else "default",
+                "description": tunable.description,
+            }
+            for key, tunable in TUNABLES.items()
+        ]
+
+
+def apply_log_level(changed: Dict[str, str], raw: Dict[str, str]):
+    if "log_level" in changed:
+        level = get_runtime_config().get("log_level")
+        logging.getLogger().setLevel(level)
+
+
+@lru_cache()
+def get_runtime_config() -> RuntimeConfig:
+    runtime = RuntimeConfig(get_settings())
+    runtime.on_change(apply_log_level)
+    return runtime
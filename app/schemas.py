@@ -23,6 +23,8 @@ class CreateRuleRequest(BaseModel):
     custom_response: Optional[str] = None
     remark: Optional[str] = None
     is_global: bool = False
+    conditions: Optional[Dict[str, Any]] = None
+    priority: int = 0
 
 
 class UpdateRuleRequest(BaseModel):
@@ -33,6 +35,60 @@ class UpdateRuleRequest(BaseModel):
     remark: Optional[str] = None
     is_enabled: Optional[bool] = None
     is_global: Optional[bool] = None
+    conditions: Optional[Dict[str, Any]] = None
+    priority: Optional[int] = None
+
+
+class RuleImportItem(CreateRuleRequest):
+    is_enabled: bool = True
+
+
+class BulkCreateRulesRequest(BaseModel):
+    rules: List[RuleImportItem]
+
+
+class RulesExport(BaseModel):
+    version: int = 1
+    rules: List[RuleImportItem]
+
+
+class BulkRuleUpdate(UpdateRuleRequest):
+    id: int
+
+
+class BulkUpdateRulesRequest(BaseModel):
+    rules: List[BulkRuleUpdate]
+
+
+class BulkRuleIdsRequest(BaseModel):
+    ids: List[int]
+
+
+class BulkEnableRulesRequest(BaseModel):
+    ids: List[int]
+    is_enabled: bool = True
+
+
+class RuleDryRunRequest(BaseModel):
+    method: str
+    email: Optional[str] = None
+    params: Dict[str, Any] = Field(default_factory=dict)
+
+
+class CreateTacticsTemplateRequest(BaseModel):
+    name: str
+    template_json: str
+    email: Optional[str] = None
+    description: Optional[str] = None
+    is_default: bool = False
+
+
+class UpdateTacticsTemplateRequest(BaseModel):
+    name: Optional[str] = None
+    template_json: Optional[str] = None
+    email: Optional[str] = None
+    description: Optional[str] = None
+    is_default: Optional[bool] = None
 
 
 class UpdateCommandRequest(BaseModel):
@@ -49,6 +105,34 @@ class RuleResponse(BaseModel):
     remark: Optional[str] = None
     is_enabled: bool
     is_global: bool
+    conditions: Optional[Dict[str, Any]] = None
+    priority: int = 0
+    created_at: datetime
+    updated_at: datetime
+
+
+class RuleDryRunCandidate(BaseModel):
+    id: int
+    priority: int
+    is_global: bool
+    matched: bool
+
+
+class RuleDryRunResponse(BaseModel):
+    method: str
+    email: Optional[str]
+    rule: Optional[RuleResponse]
+    candidates: List[RuleDryRunCandidate]
+
+
+class TacticsTemplateResponse(BaseModel):
+    id: int
+    name: str
+    template_json: str
+    email: Optional[str] = None
+    description: Optional[str] = None
+    is_default: bool
+    is_applied: bool
     created_at: datetime
     updated_at: datetime
 
@@ -80,6 +164,72 @@ class PaginatedLogsResponse(BaseModel):
     total: int
 
 
+class PaginatedCommandsResponse(BaseModel):
+    data: List[CommandResponse]
+    next_cursor: Optional[str] = None
+
+
+class DeviceResponse(BaseModel):
+    email: str
+    first_seen: Optional[datetime] = None
+    last_seen: Optional[datetime] = None
+    request_count: int = 0
+    last_method: Optional[str] = None
+    model: Optional[str] = None
+    swdid: Optional[str] = None
+
+
+class DeviceMethodResponse(BaseModel):
+    method: str
+    request_count: int
+    last_seen: Optional[datetime] = None
+
+
+class DeviceDetailResponse(DeviceResponse):
+    methods: List[DeviceMethodResponse]
+
+
+class PaginatedDevicesResponse(BaseModel):
+    data: List[DeviceResponse]
+    total: int
+
+
+class BulkUpdateCommandsRequest(BaseModel):
+    ids: List[int]
+    status: str
+    notes: Optional[str] = None
+
+
+class BulkVerifyCommandsRequest(BaseModel):
+    ids: List[int]
+    notes: Optional[str] = None
+
+
+class BulkDeleteCommandsRequest(BaseModel):
+    ids: Optional[List[int]] = None
+    status: Optional[str] = None
+    before: Optional[datetime] = None
+
+
+class UpdateUpstreamTargetsRequest(BaseModel):
+    targets: List[str]
+
+
+class UpdateConfigRequest(BaseModel):
+    value: str
+
+
+class UpdateLogPoliciesRequest(BaseModel):
+    policies: Dict[str, Dict[str, Any]]
+
+
+class ConfigItemResponse(BaseModel):
+    key: str
+    value: Any
+    source: str
+    description: Optional[str] = None
+
+
 class ApiError(BaseModel):
     error: str
 
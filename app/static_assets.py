@@ -0,0 +1,113 @@
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+from typing import Dict, Optional
+
+from fastapi import Request, Response
+
+from app.compression import brotli, choose_encoding
+from app.http_cache import etag_matches
+
+logger = logging.getLogger(__name__)
+
+# 只有 HTML 引用的资源带版本号，HTML 本身每次都需要重新验证
+STATIC_REFERENCE = re.compile(r'(href|src)="/static/([^"?#]+)"')
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+MIN_COMPRESS_SIZE = 256
+
+
+class StaticAsset:
+    def __init__(self, path: str, content: bytes, mtime: float, dependencies: Optional[Dict[str, Optional[str]]] = None):
+        self.path = path
+        self.mtime = mtime
+        # HTML 中写入的 引用路径 -> 版本号，未找到的资源记为 None
+        self.dependencies = dependencies or {}
+        self.media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        self.content = content
+        self.version = hashlib.sha256(content).hexdigest()[:16]
+        self.encoded: Dict[str, bytes] = {}
+        # 文件首次被请求（或修改后再次请求）时压缩一次，之后的请求直接返回压缩结果
+        if self.media_type.startswith(COMPRESSIBLE_TYPES) and len(content) >= MIN_COMPRESS_SIZE:
+            self.encoded["gzip"] = gzip.compress(content, compresslevel=9)
+            if brotli is not None:
+                self.encoded["br"] = brotli.compress(content, quality=11)
+
+    def etag(self, encoding: Optional[str]) -> str:
+        return f'"{self.version}-{encoding}"' if encoding else f'"{self.version}"'
+
+
+class StaticAssets:
+    def __init__(self, directory: str, max_age: int):
+        self.directory = os.path.abspath(directory)
+        self.max_age = max_age
+        self.assets: Dict[str, StaticAsset] = {}
+
+    def resolve(self, path: str) -> Optional[str]:
+        full_path = os.path.abspath(os.path.join(self.directory, path))
+        if not full_path.startswith(self.directory + os.sep) or not os.path.isfile(full_path):
+            return None
+        return full_path
+
+    def get(self, path: str) -> Optional[StaticAsset]:
+        full_path = self.resolve(path)
+        if full_path is None:
+            return None
+        mtime = os.stat(full_path).st_mtime
+        asset = self.assets.get(path)
+        if asset is None or asset.mtime != mtime or self.dependencies_changed(asset):
+            # 文件或其引用的资源被修改后重新计算哈希和压缩结果
+            with open(full_path, "rb") as f:
+                content = f.read()
+            dependencies: Dict[str, Optional[str]] = {}
+            if path.endswith(".html"):
+                content = self.add_versions(content, dependencies)
+            asset = StaticAsset(path, content, mtime, dependencies)
+            self.assets[path] = asset
+            logger.debug(f"Loaded static asset {path} ({asset.version})")
+        return asset
+
+    def dependencies_changed(self, asset: StaticAsset) -> bool:
+        # 只修改 JS/CSS 而不修改 HTML 时，HTML 中的版本号也要更新，否则长期缓存会继续使用旧文件
+        for path, version in asset.dependencies.items():
+            dependency = self.get(path)
+            if (dependency.version if dependency is not None else None) != version:
+                return True
+        return False
+
+    def add_versions(self, html: bytes, dependencies: Dict[str, Optional[str]]) -> bytes:
+        def replace(match: re.Match) -> str:
+            asset = self.get(match.group(2))
+            dependencies[match.group(2)] = asset.version if asset is not None else None
+            if asset is None:
+                return match.group(0)
+            return f'{match.group(1)}="/static/{match.group(2)}?v={asset.version}"'
+        return STATIC_REFERENCE.sub(replace, html.decode("utf-8")).encode("utf-8")
+
+    def response(self, request: Request, path: str) -> Response:
+        asset = self.get(path)
+        if asset is None:
+            return Response(status_code=404, content="Not Found")
+
+        encoding = choose_encoding(request.headers.get("accept-encoding"))
+        if encoding not in asset.encoded:
+            encoding = "gzip" if encoding and "gzip" in asset.encoded else None
+        etag = asset.etag(encoding)
+
+        # 带有当前版本号的地址内容永不变化，可以长期缓存
+        if request.query_params.get("v") == asset.version:
+            cache_control = f"public, max-age={self.max_age}, immutable"
+        else:
+            cache_control = "no-cache"
+        headers = {"ETag": etag, "Cache-Control": cache_control}
+        if asset.encoded:
+            headers["Vary"] = "Accept-Encoding"
+
+        if etag_matches(request, etag):
+            return Response(status_code=304, headers=headers)
+        if encoding:
+            headers["Content-Encoding"] = encoding
+            return Response(content=asset.encoded[encoding], media_type=asset.media_type, headers=headers)
+        return Response(content=asset.content, media_type=asset.media_type, headers=headers)
@@ -0,0 +1,136 @@
+import asyncio
+import json
+import logging
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.crypto import Cryptor
+from app.jsonrpc import Tactics
+from app.models import TacticsTemplate, split_emails
+from app.repositories import TACTICS_VERSION_KEY, TacticsRepository
+from app.runtime_config import get_runtime_config
+
+logger = logging.getLogger(__name__)
+
+# 由策略模板直接应答的请求在日志中记录的响应动作
+TACTICS_ACTION = "tactics_template"
+
+
+class TacticsTemplateError(ValueError):
+    pass
+
+
+def parse_template(template_json: str) -> dict:
+    # 模板可以是策略对象本身，也可以是从日志中复制的完整响应 {"code": 0, "data": {"type": "object", "data": {...}}}
+    try:
+        document = json.loads(template_json)
+    except json.JSONDecodeError as e:
+        raise TacticsTemplateError(f"template_json is not valid JSON: {e}")
+    if isinstance(document, dict) and "code" in document and isinstance(document.get("data"), dict):
+        document = document["data"].get("data")
+    if not isinstance(document, dict):
+        raise TacticsTemplateError("template_json must be a tactics object")
+    try:
+        Tactics.model_validate(document)
+    except ValidationError as e:
+        error = e.errors()[0]
+        location = ".".join(str(part) for part in error["loc"])
+        raise TacticsTemplateError(f"invalid tactics at '{location}': {error['msg']}")
+    return document
+
+
+def template_errors(template_json: str) -> List[str]:
+    try:
+        parse_template(template_json)
+    except TacticsTemplateError as e:
+        return [str(e)]
+    return []
+
+
+def render_response(tactics: dict) -> str:
+    # 保持模板原样输出，不用模型序列化补全缺省字段
+    return json.dumps({"code": 0, "data": {"type": "object", "data": tactics}})
+
+
+class PreparedTactics:
+    __slots__ = ("template_id", "name", "body", "encrypted")
+
+    def __init__(self, template: TacticsTemplate, cryptor: Cryptor):
+        self.template_id = template.id
+        self.name = template.name
+        self.body = render_response(parse_template(template.template_json))
+        # 加密结果只取决于明文，加载时算好，请求时直接返回
+        self.encrypted = cryptor.encrypt(self.body)
+
+
+class TacticsCache:
+    def __init__(self):
+        self.generation = 0
+        self.loaded_generation = -1
+        self.global_tactics: Optional[PreparedTactics] = None
+        self.by_email: Dict[str, PreparedTactics] = {}
+        self.loads = 0
+        self._lock = asyncio.Lock()
+
+    def invalidate(self):
+        self.generation += 1
+
+    def on_config_change(self, changed: Dict[str, str], raw: Dict[str, str]):
+        if TACTICS_VERSION_KEY in changed:
+            self.invalidate()
+
+    def build(self, templates: List[TacticsTemplate], cryptor: Cryptor):
+        global_tactics = None
+        by_email: Dict[str, PreparedTactics] = {}
+        for template in templates:
+            try:
+                prepared = PreparedTactics(template, cryptor)
+            except TacticsTemplateError as e:
+                # 模板在保存时已校验，这里只可能是直接改库写入的坏数据
+                logger.warning(f"Skipping invalid tactics template {template.id}: {e}")
+                continue
+            emails = split_emails(template.email)
+            if not emails:
+                global_tactics = prepared
+            for email in emails:
+                by_email[email] = prepared
+        self.global_tactics = global_tactics
+        self.by_email = by_email
+
+    async def load(self, db: AsyncSession, cryptor: Cryptor):
+        async with self._lock:
+            if self.loaded_generation == self.generation:
+                return
+            generation = self.generation
+            templates = await TacticsRepository.list_applied(db)
+            self.build(templates, cryptor)
+            self.loaded_generation = generation
+            self.loads += 1
+            logger.info(f"Loaded {len(templates)} applied tactics templates into cache")
+
+    async def find(self, db: AsyncSession, email: Optional[str], cryptor: Cryptor) -> Optional[PreparedTactics]:
+        if self.loaded_generation != self.generation:
+            await self.load(db, cryptor)
+        if email:
+            prepared = self.by_email.get(email)
+            if prepared is not None:
+                return prepared
+        return self.global_tactics
+
+    def snapshot(self) -> dict:
+        return {
+            "global": self.global_tactics.template_id if self.global_tactics else None,
+            "emails": len(self.by_email),
+            "stale": self.loaded_generation != self.generation,
+            "loads": self.loads,
+        }
+
+
+@lru_cache()
+def get_tactics_cache() -> TacticsCache:
+    cache = TacticsCache()
+    get_runtime_config().on_change(cache.on_config_change)
+    return cache
@@ -0,0 +1,376 @@
+import copy
+import json
+import logging
+import random
+import time
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from app.json_patch import PatchError, compile_patch_rule
+
+logger = logging.getLogger(__name__)
+
+UNCHANGED = object()
+
+
+class TransformError(ValueError):
+    pass
+
+
+class TransformStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def record(self, seconds: float, failed: bool = False):
+        self.calls += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        if failed:
+            self.errors += 1
+
+    def snapshot(self) -> dict:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "avg_ms": round(self.total_seconds / self.calls * 1000, 3) if self.calls else None,
+            "max_ms": round(self.max_seconds * 1000, 3),
+        }
+
+
+class Transform:
+    # 子类按需实现 respond / request / response，compile 在规则加载时调用一次
+    name = ""
+    requires_config = False
+
+    def __init__(self):
+        self.stats = TransformStats()
+
+    def parse_json(self, config: Optional[str]) -> Any:
+        if not config:
+            if self.requires_config:
+                raise TransformError(f"custom_response is required when action is '{self.name}'")
+            return None
+        try:
+            return json.loads(config)
+        except json.JSONDecodeError:
+            raise TransformError("custom_response is not valid JSON")
+
+    def compile(self, config: Optional[str]) -> Any:
+        return None
+
+    def respond(self, compiled: Any, request: dict) -> Optional[str]:
+        # 返回字符串时直接作为响应，不再请求上游
+        return None
+
+    def request(self, compiled: Any, request: dict) -> Any:
+        return UNCHANGED
+
+    def response(self, compiled: Any, response: Any) -> Any:
+        return UNCHANGED
+
+
+class PassthroughTransform(Transform):
+    name = "passthrough"
+
+
+class ReplaceTransform(Transform):
+    name = "replace"
+    requires_config = True
+
+    def compile(self, config: Optional[str]) -> str:
+        return json.dumps(self.parse_json(config))
+
+    def respond(self, compiled: str, request: dict) -> Optional[str]:
+        return compiled
+
+
+class ModifyTransform(Transform):
+    name = "modify"
+    requires_config = True
+
+    def compile(self, config: Optional[str]) -> Any:
+        return self.parse_json(config)
+
+    def request(self, compiled: Any, request: dict) -> Any:
+        # 加密时会改写请求对象，每次使用副本
+        return copy.deepcopy(compiled)
+
+
+class RandomizeAppDurationTransform(Transform):
+    name = "randomize_app_duration"
+
+    def compile(self, config: Optional[str]) -> dict:
+        try:
+            parsed = json.loads(config) if config else {}
+        except json.JSONDecodeError:
+            parsed = {}
+        if not isinstance(parsed, dict):
+            parsed = {}
+        try:
+            max_duration_ms = int(parsed.get("max_duration_minutes", 30)) * 60 * 1000
+            keep_count = int(parsed.get("keep_count", 2))
+        except (TypeError, ValueError):
+            raise TransformError("max_duration_minutes and keep_count must be integers")
+        return {
+            "config": parsed,
+            "packages": set(parsed.get("packages", ["com.kingsoft"])),
+            "max_duration_ms": max_duration_ms,
+            "keep_count": keep_count,
+        }
+
+    def request(self, compiled: dict, request_json: dict) -> Any:
+        modified_request = request_json.copy()
+        params = modified_request.get("params", {})
+        if not isinstance(params, dict):
+            return UNCHANGED
+
+        logs = params.get("logs", [])
+        if not logs or not isinstance(logs, list):
+            return UNCHANGED
+
+        target_packages = compiled["packages"]
+        max_duration_ms = compiled["max_duration_ms"]
+        keep_count = compiled["keep_count"]
+
+        filtered_logs = []
+        package_durations = {}
+        action_details = []
+
+        for log in logs:
+            if not isinstance(log, dict):
+                continue
+
+            package_name = log.get("mPackageName", "")
+            if package_name not in target_packages:
+                filtered_logs.append(log)
+                continue
+
+            begin_time = log.get("mBeginTimeStamp", 0)
+            end_time = log.get("mEndTimeStamp", 0)
+            duration = end_time - begin_time
+
+            if package_name not in package_durations:
+                package_durations[package_name] = []
+
+            package_durations[package_name].append({
+                "log": log,
+                "duration": duration,
+                "begin_time": begin_time
+            })
+
+        for package, package_logs in package_durations.items():
+            if not package_logs:
+                continue
+
+            long_logs = [p for p in package_logs if p["duration"] > max_duration_ms]
+
+            for log_info in long_logs:
+                original_duration = log_info["duration"]
+                new_duration = random.randint(1, max_duration_ms // 1000) * 1000
+                new_end_time = log_info["begin_time"] + new_duration
+
+                log_info["log"]["mEndTimeStamp"] = new_end_time
+                log_info["log"]["mDuration"] = new_duration
+
+                action_details.append({
+                    "package": package,
+                    "original_duration_ms": original_duration,
+                    "new_duration_ms": new_duration,
+                    "original_end_time": log_info["begin_time"] + original_duration,
+                    "new_end_time": new_end_time
+                })
+
+            modified_logs = [p["log"] for p in package_logs]
+
+            original_count = len(modified_logs)
+            if len(modified_logs) > keep_count:
+                indices_to_keep = sorted(random.sample(range(len(modified_logs)), keep_count))
+                modified_logs = [modified_logs[i] for i in indices_to_keep]
+                action_details.append({
+                    "action": "reduce_count",
+                    "package": package,
+                    "original_count": original_count,
+                    "new_count": keep_count
+                })
+
+            filtered_logs.extend(modified_logs)
+
+        params["logs"] = filtered_logs
+        modified_request["params"] = params
+
+        # 添加规则信息到请求中，用于日志记录
+        modified_request["_rule_info"] = {
+            "method": request_json.get("method", ""),
+            "status": "Enabled",
+            "action": "randomize_app_duration",
+            "type": "全局",
+            "config": compiled["config"],
+            "action_details": action_details
+        }
+
+        logger.info(f"Applied randomize_app_duration rule: {json.dumps(action_details)}")
+        return modified_request
+
+
+class PatchTransform(Transform):
+    name = "patch"
+    requires_config = True
+
+    def compile(self, config: Optional[str]):
+        try:
+            return compile_patch_rule(config)
+        except PatchError as e:
+            raise TransformError(str(e))
+
+    def request(self, compiled, request: dict) -> Any:
+        return compiled.request.apply(request) if compiled.request is not None else UNCHANGED
+
+    def response(self, compiled, response: Any) -> Any:
+        return compiled.response.apply(response) if compiled.response is not None else UNCHANGED
+
+
+class ChainTransform(Transform):
+    # 配置为 [{"action": "...", "config": ...}, ...]，按顺序串联其他转换，编译时展开为单个流水线
+    name = "chain"
+    requires_config = True
+
+    def __init__(self, registry: "TransformRegistry"):
+        super().__init__()
+        self.registry = registry
+
+    def compile(self, config: Optional[str]) -> List[Tuple[Transform, Any]]:
+        steps = self.parse_json(config)
+        if not isinstance(steps, list) or not steps:
+            raise TransformError("chain must be a non-empty list of steps")
+        compiled = []
+        for index, step in enumerate(steps):
+            if not isinstance(step, dict) or not isinstance(step.get("action"), str):
+                raise TransformError(f"chain step {index}: 'action' is required")
+            if step["action"] == self.name:
+                raise TransformError(f"chain step {index}: chains cannot be nested")
+            step_config = step.get("config")
+            if step_config is not None and not isinstance(step_config, str):
+                step_config = json.dumps(step_config)
+            try:
+                transform = self.registry.get(step["action"])
+                compiled.append((transform, transform.compile(step_config)))
+            except TransformError as e:
+                raise TransformError(f"chain step {index}: {e}")
+        return compiled
+
+
+def timed(transform: Transform, stage, compiled: Any, payload: Any) -> Any:
+    started = time.perf_counter()
+    try:
+        result = stage(compiled, payload)
+    except Exception:
+        transform.stats.record(time.perf_counter() - started, failed=True)
+        raise
+    transform.stats.record(time.perf_counter() - started)
+    return result
+
+
+def overrides(transform: Transform, stage: str) -> bool:
+    return getattr(type(transform), stage) is not getattr(Transform, stage)
+
+
+class Pipeline:
+    def __init__(self, steps: List[Tuple[Transform, Any]]):
+        self.steps = steps
+        # 按阶段预先筛选，请求时不再逐个判断
+        self.responders = [(t, c) for t, c in steps if overrides(t, "respond")]
+        self.requesters = [(t, c) for t, c in steps if overrides(t, "request")]
+        self.responsers = [(t, c) for t, c in steps if overrides(t, "response")]
+
+    def respond(self, request: dict) -> Tuple[Optional[str], Optional[str]]:
+        for transform, compiled in self.responders:
+            try:
+                body = timed(transform, transform.respond, compiled, request)
+            except Exception as e:
+                logger.error(f"Failed to apply {transform.name} transform: {e}")
+                continue
+            if body is not None:
+                return body, transform.name
+        return None, None
+
+    def apply_request(self, request: dict, original: str) -> Tuple[dict, List[str]]:
+        # 转换可能原地修改请求，任一步失败时整体放弃，从原始文本恢复
+        applied = []
+        try:
+            for transform, compiled in self.requesters:
+                result = timed(transform, transform.request, compiled, request)
+                if result is not UNCHANGED:
+                    request = result
+                    applied.append(transform.name)
+        except Exception as e:
+            logger.error(f"Failed to apply request transforms ({', '.join(applied) or 'none applied'}): {e}")
+            return json.loads(original), []
+        return request, applied
+
+    def apply_response(self, response: str) -> Tuple[str, List[str]]:
+        if not self.responsers:
+            return response, []
+        applied = []
+        try:
+            document = json.loads(response)
+            for transform, compiled in self.responsers:
+                result = timed(transform, transform.response, compiled, document)
+                if result is not UNCHANGED:
+                    document = result
+                    applied.append(transform.name)
+        except Exception as e:
+            # 响应不是 JSON 或转换不适用时原样返回
+            logger.error(f"Failed to apply response transforms: {e}")
+            return response, []
+        return (json.dumps(document), applied) if applied else (response, [])
+
+
+class TransformRegistry:
+    def __init__(self):
+        self.transforms: Dict[str, Transform] = {}
+
+    def register(self, transform: Transform) -> Transform:
+        self.transforms[transform.name] = transform
+        return transform
+
+    def names(self) -> List[str]:
+        return list(self.transforms)
+
+    def responder_names(self) -> Set[str]:
+        # 这些转换直接生成响应，请求不会发往上游
+        return {name for name, transform in self.transforms.items() if overrides(transform, "respond")}
+
+    def get(self, name: str) -> Transform:
+        transform = self.transforms.get(name)
+        if transform is None:
+            raise TransformError(f"invalid action '{name}'. Must be one of: {', '.join(self.transforms)}")
+        return transform
+
+    def compile(self, action: str, config: Optional[str]) -> Pipeline:
+        transform = self.get(action)
+        compiled = transform.compile(config)
+        if isinstance(transform, ChainTransform):
+            return Pipeline(compiled)
+        return Pipeline([(transform, compiled)])
+
+    def errors(self, action: str, config: Optional[str]) -> List[str]:
+        try:
+            self.compile(action, config)
+        except TransformError as e:
+            return [str(e)]
+        return []
+
+    def snapshot(self) -> List[dict]:
+        return [{"name": name, **transform.stats.snapshot()} for name, transform in self.transforms.items()]
+
+
+@lru_cache()
+def get_transform_registry() -> TransformRegistry:
+    registry = TransformRegistry()
+    for transform in (PassthroughTransform(), ReplaceTransform(), ModifyTransform(),
+                      RandomizeAppDurationTransform(), PatchTransform(), ChainTransform(registry)):
+        registry.register(transform)
+    return registry
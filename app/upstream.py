@@ -0,0 +1,189 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Dict, List, Optional, Set
+
+import httpx
+
+from app.config import Settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TARGET_URL = "https://cloud.linspirer.com:883"
+EWMA_ALPHA = 0.3
+HEALTH_CHECK_TIMEOUT = 5.0
+UNHEALTHY_AFTER_FAILED_CHECKS = 2
+MAX_EJECTION_MULTIPLIER = 8
+
+
+def parse_targets(value: Optional[str]) -> List[str]:
+    if not value:
+        return []
+    return [url.strip().rstrip("/") for url in value.split(",") if url.strip()]
+
+
+class UpstreamTarget:
+    def __init__(self, url: str):
+        self.url = url
+        self.outstanding = 0
+        self.ewma_ms: Optional[float] = None
+        self.healthy = True
+        self.failed_checks = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.ejections = 0
+        self.requests = 0
+        self.failures = 0
+
+    def available(self, now: float) -> bool:
+        return self.healthy and now >= self.ejected_until
+
+    def score(self) -> float:
+        # 未采样的目标得分为 0，保证新加入的目标会被尝试
+        return (self.ewma_ms or 0.0) * (self.outstanding + 1)
+
+    def begin(self):
+        self.outstanding += 1
+        self.requests += 1
+
+    def end(self, ok: bool, latency_ms: Optional[float] = None):
+        self.outstanding -= 1
+        if ok:
+            self.consecutive_failures = 0
+            if latency_ms is not None:
+                self.ewma_ms = latency_ms if self.ewma_ms is None else EWMA_ALPHA * latency_ms + (1 - EWMA_ALPHA) * self.ewma_ms
+        else:
+            self.failures += 1
+            self.consecutive_failures += 1
+
+    def cancel(self):
+        self.outstanding -= 1
+
+    def snapshot(self, now: float) -> dict:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "ejected": now < self.ejected_until,
+            "ejected_for": round(max(0.0, self.ejected_until - now), 3),
+            "outstanding": self.outstanding,
+            "ewma_ms": round(self.ewma_ms, 2) if self.ewma_ms is not None else None,
+            "requests": self.requests,
+            "failures": self.failures,
+            "ejections": self.ejections,
+        }
+
+
+class UpstreamPool:
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self.strategy = settings.LINSPIRER_LB_STRATEGY
+        self.targets: List[UpstreamTarget] = []
+        self._rr = 0
+        self._task: Optional[asyncio.Task] = None
+        self.reload(parse_targets(settings.LINSPIRER_TARGET_URL))
+
+    def urls(self) -> List[str]:
+        return [t.url for t in self.targets]
+
+    def reload(self, urls: List[str]):
+        if not urls or urls == self.urls():
+            return
+        # 保留仍在池中的目标的统计和健康状态
+        existing = {t.url: t for t in self.targets}
+        self.targets = [existing.get(url) or UpstreamTarget(url) for url in urls]
+        logger.info(f"Upstream targets: {', '.join(urls)}")
+
+    def resolve_config_targets(self, value: Optional[str]) -> List[str]:
+        urls = parse_targets(value)
+        # 数据库初始化时写入的默认地址不覆盖环境变量中显式配置的目标
+        if urls == [DEFAULT_TARGET_URL] and parse_targets(self.settings.LINSPIRER_TARGET_URL) != urls:
+            return []
+        return urls
+
+    def pick(self, exclude: Set[str]) -> UpstreamTarget:
+        now = time.monotonic()
+        candidates = [t for t in self.targets if t.url not in exclude and t.available(now)]
+        if not candidates:
+            # 全部不可用时仍然尝试，避免因健康检查误判而完全断开
+            candidates = [t for t in self.targets if t.url not in exclude] or self.targets
+
+        if len(candidates) == 1:
+            return candidates[0]
+        if self.strategy == "ewma":
+            # 二选一：随机取两个目标，选择延迟×并发更低的一个
+            a, b = random.sample(candidates, 2)
+            return a if a.score() <= b.score() else b
+
+        self._rr += 1
+        least = min(t.outstanding for t in candidates)
+        tied = [t for t in candidates if t.outstanding == least]
+        return tied[self._rr % len(tied)]
+
+    def record(self, target: UpstreamTarget, ok: bool, latency_ms: Optional[float] = None):
+        target.end(ok, latency_ms)
+        if ok or target.consecutive_failures < self.settings.LINSPIRER_OUTLIER_CONSECUTIVE_FAILURES:
+            return
+
+        now = time.monotonic()
+        if now < target.ejected_until:
+            return
+        ejected = sum(1 for t in self.targets if now < t.ejected_until)
+        if (ejected + 1) * 100 > len(self.targets) * self.settings.LINSPIRER_OUTLIER_MAX_EJECTION_PERCENT:
+            return
+
+        # 多次被剔除的目标剔除时间逐次加倍
+        target.ejections += 1
+        multiplier = min(MAX_EJECTION_MULTIPLIER, 2 ** (target.ejections - 1))
+        target.ejected_until = now + self.settings.LINSPIRER_OUTLIER_EJECTION_SECONDS * multiplier
+        target.consecutive_failures = 0
+        logger.warning(f"Ejected upstream {target.url} for {self.settings.LINSPIRER_OUTLIER_EJECTION_SECONDS * multiplier:.0f}s")
+
+    async def check(self, client: httpx.AsyncClient, target: UpstreamTarget):
+        try:
+            response = await client.get(target.url + self.settings.LINSPIRER_HEALTH_CHECK_PATH, timeout=HEALTH_CHECK_TIMEOUT)
+            ok = response.status_code < 500
+        except httpx.HTTPError:
+            ok = False
+
+        if ok:
+            if not target.healthy:
+                logger.info(f"Upstream {target.url} is healthy again")
+            target.healthy = True
+            target.failed_checks = 0
+        else:
+            target.failed_checks += 1
+            if target.healthy and target.failed_checks >= UNHEALTHY_AFTER_FAILED_CHECKS:
+                logger.warning(f"Upstream {target.url} failed {target.failed_checks} health checks")
+                target.healthy = False
+
+    def on_config_change(self, changed: Dict[str, str], raw: Dict[str, str]):
+        if "target_url" in changed:
+            # 配置行被删除时回到环境变量中的目标
+            urls = self.resolve_config_targets(raw.get("target_url")) or parse_targets(self.settings.LINSPIRER_TARGET_URL)
+            self.reload(urls)
+
+    async def run_health_checks(self, client: httpx.AsyncClient):
+        while True:
+            await asyncio.gather(*(self.check(client, t) for t in list(self.targets)))
+            await asyncio.sleep(self.settings.LINSPIRER_HEALTH_CHECK_INTERVAL)
+
+    def start(self, client: httpx.AsyncClient):
+        if self._task is None and self.settings.LINSPIRER_HEALTH_CHECK_INTERVAL > 0:
+            self._task = asyncio.create_task(self.run_health_checks(client))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        return {
+            "strategy": self.strategy,
+            "targets": [t.snapshot(now) for t in self.targets],
+        }
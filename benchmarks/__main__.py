@@ -0,0 +1,71 @@
+import argparse
+import sys
+
+from benchmarks import runner
+from benchmarks import bench_crypto, bench_rules, bench_middleware, bench_logs  # noqa: F401  注册基准用例
+
+DEFAULT_BASELINE = "benchmarks/baseline.json"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Micro-benchmarks for core proxy functions")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("-k", "--only", action="append", help="Only run cases whose name contains this text (repeatable)")
+    common.add_argument("--rounds", type=int, default=5, help="Timed rounds per case")
+    common.add_argument("--log-rows", type=int, default=20000, help="Rows seeded into request_logs for logs.* cases")
+
+    sub.add_parser("list", help="List available cases")
+
+    run_parser = sub.add_parser("run", parents=[common], help="Run cases and optionally save the results as a baseline")
+    run_parser.add_argument("--save", nargs="?", const=DEFAULT_BASELINE, help=f"Save results (default path: {DEFAULT_BASELINE})")
+
+    compare_parser = sub.add_parser("compare", parents=[common], help="Run cases and compare against a saved baseline")
+    compare_parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline file to compare against")
+    compare_parser.add_argument("--threshold", type=float, default=20.0, help="Fail when a case is slower by more than this percentage")
+    compare_parser.add_argument("--save", help="Also save the current results to this file")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "list":
+        for name in runner.CASES:
+            print(name)
+        return 0
+
+    names = runner.select_cases(args.only)
+    if not names:
+        print("No benchmark cases matched", file=sys.stderr)
+        return 2
+
+    if args.command == "compare":
+        baseline = runner.load(args.baseline)
+        # 只比较基线中存在的用例，新增用例仅打印结果
+        current = runner.run(names, args.rounds, args.log_rows)
+        if args.save:
+            runner.save(args.save, current)
+
+        rows = runner.compare(baseline, current, args.threshold)
+        print()
+        print(f"{'case':<60} {'baseline us':>14} {'current us':>14} {'change':>9}")
+        for row in rows:
+            base = f"{row['baseline_us']:.3f}" if row["baseline_us"] is not None else "-"
+            change = f"{row['change_pct']:+.1f}%" if row["change_pct"] is not None else "new"
+            flag = "  REGRESSED" if row["regressed"] else ""
+            print(f"{row['name']:<60} {base:>14} {row['current_us']:>14.3f} {change:>9}{flag}")
+
+        regressed = [row["name"] for row in rows if row["regressed"]]
+        if regressed:
+            print(f"\n{len(regressed)} case(s) regressed by more than {args.threshold}%", file=sys.stderr)
+            return 1
+        return 0
+
+    current = runner.run(names, args.rounds, args.log_rows)
+    if args.save:
+        runner.save(args.save, current)
+        print(f"\nSaved results to {args.save}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,33 @@
+import json
+import os
+
+from benchmarks.runner import bench
+from app.crypto import Cryptor
+
+PAYLOAD_SIZES = {"256B": 256, "4KB": 4 * 1024, "64KB": 64 * 1024, "1MB": 1024 * 1024}
+
+
+def make_cryptor() -> Cryptor:
+    return Cryptor(key=os.environ["LINSPIRER_KEY"].encode(), iv=os.environ["LINSPIRER_IV"].encode())
+
+
+def make_payload(size: int) -> str:
+    return json.dumps({"data": "x" * max(0, size - 12)})
+
+
+def register_size(label: str, size: int):
+    @bench(f"crypto.encrypt[{label}]")
+    async def encrypt_case(ctx):
+        cryptor = make_cryptor()
+        payload = make_payload(size)
+        return lambda: cryptor.encrypt(payload)
+
+    @bench(f"crypto.decrypt[{label}]")
+    async def decrypt_case(ctx):
+        cryptor = make_cryptor()
+        ciphertext = cryptor.encrypt(make_payload(size))
+        return lambda: cryptor.decrypt(ciphertext)
+
+
+for _label, _size in PAYLOAD_SIZES.items():
+    register_size(_label, _size)
@@ -0,0 +1,83 @@
+import json
+import random
+from datetime import datetime
+
+from benchmarks.runner import bench
+from app.log_partitions import ensure_partition_sync, partition_key
+from app.repositories import LogsRepository
+from app.log_render import BODY_COLUMNS, render_page
+
+METHODS = [
+    "com.linspirer.tactics.gettactics",
+    "com.linspirer.device.heartbeat",
+    "com.linspirer.device.setappusage",
+    "com.linspirer.command.getcommand",
+]
+EMAIL_COUNT = 500
+BATCH_SIZE = 5000
+
+
+def seed_logs(row_count: int):
+    def seed(conn):
+        rng = random.Random(42)
+        # 与线上写入相同，按天写入各自的分区表
+        tables = {}
+        batches = {}
+        for i in range(row_count):
+            method = METHODS[rng.randrange(len(METHODS))]
+            email = f"user{rng.randrange(EMAIL_COUNT)}@example.com"
+            request = json.dumps({"method": method, "id": i, "params": {"email": email, "model": "M", "swdid": "s"}})
+            response = json.dumps({"code": 0, "data": {"type": "object", "data": {"payload": "x" * rng.randint(64, 2048)}}})
+            created_at = datetime(2024, 1, 1 + i * 28 // row_count, i % 24, i % 60, i % 60)
+            key = partition_key(created_at)
+            if key not in tables:
+                tables[key] = ensure_partition_sync(conn, key)
+            table = tables[key]
+            batch = batches.setdefault(table, [])
+            batch.append((method, request, response, email, created_at.strftime("%Y-%m-%d %H:%M:%S")))
+            if len(batch) >= BATCH_SIZE:
+                insert(conn, table, batch)
+                batch.clear()
+        for table, batch in batches.items():
+            if batch:
+                insert(conn, table, batch)
+    return seed
+
+
+def insert(conn, table, rows):
+    conn.executemany(
+        f"INSERT INTO {table} (method, request_body, response_body, email, created_at, json_validated) VALUES (?, ?, ?, ?, ?, 1)",
+        rows
+    )
+
+
+def register_list(label: str, **filters):
+    @bench(f"logs.list[{label}]")
+    async def case(ctx):
+        session_maker = ctx.session_maker(f"logs-{ctx.log_rows}", seed_logs(ctx.log_rows))
+
+        async def list_page():
+            async with session_maker() as db:
+                await LogsRepository.list(db, limit=50, offset=0, **filters)
+        return list_page
+
+
+def register_page(label: str, bodies):
+    @bench(f"logs.page[{label}]")
+    async def case(ctx):
+        session_maker = ctx.session_maker(f"logs-{ctx.log_rows}", seed_logs(ctx.log_rows))
+
+        # 与 /api/logs 相同：只查询需要的列并直接拼接存储的 JSON 文本
+        async def render():
+            async with session_maker() as db:
+                rows, total = await LogsRepository.list_rows(db, limit=50, offset=0, bodies=bodies)
+                render_page(rows, total, bodies)
+        return render
+
+
+register_list("first-page")
+register_list("method", method="com.linspirer.device.heartbeat")
+register_list("search", search="user42@example.com")
+register_list("one-day", since=datetime(2024, 1, 14), until=datetime(2024, 1, 15))
+register_page("all-bodies", BODY_COLUMNS)
+register_page("summary", [])
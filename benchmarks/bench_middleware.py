@@ -0,0 +1,85 @@
+import copy
+import json
+import random
+
+from benchmarks.runner import bench
+from benchmarks.bench_crypto import make_cryptor
+from app.json_patch import compile_patch_rule
+from app.middleware import ProxyMiddleware
+from app.transforms import get_transform_registry
+
+LOG_COUNTS = [100, 1000, 10000]
+PACKAGES = ["com.kingsoft", "com.tencent.mm", "com.android.chrome", "com.example.reader"]
+
+
+def make_middleware() -> ProxyMiddleware:
+    async def app(scope, receive, send):
+        pass
+    return ProxyMiddleware(app, cryptor=make_cryptor())
+
+
+def make_usage_request(count: int) -> dict:
+    rng = random.Random(count)
+    logs = []
+    for i in range(count):
+        begin = 1700000000000 + i * 60000
+        duration = rng.randint(1, 120) * 60000
+        logs.append({
+            "mPackageName": PACKAGES[i % len(PACKAGES)],
+            "mBeginTimeStamp": begin,
+            "mEndTimeStamp": begin + duration,
+            "mDuration": duration,
+        })
+    return {
+        "method": "com.linspirer.device.setappusage",
+        "id": 1,
+        "params": {"email": "user@example.com", "model": "M", "swdid": "s", "logs": logs},
+    }
+
+
+def register_count(count: int):
+    @bench(f"transforms.randomize_app_duration[{count} logs]")
+    async def randomize_case(ctx):
+        transform = get_transform_registry().get("randomize_app_duration")
+        request = make_usage_request(count)
+        compiled = transform.compile(json.dumps({"packages": ["com.kingsoft", "com.tencent.mm"], "max_duration_minutes": 30, "keep_count": 2}))
+        # randomize_app_duration 会就地修改 params，每次调用使用新副本
+        return lambda: transform.request(compiled, copy.deepcopy(request))
+
+    @bench(f"transforms.chain_request[{count} logs]")
+    async def chain_case(ctx):
+        # 整条流水线：计时包装、依次应用两个转换
+        pipeline = get_transform_registry().compile("chain", json.dumps([
+            {"action": "randomize_app_duration", "config": {"packages": ["com.kingsoft"], "keep_count": 2}},
+            {"action": "patch", "config": {"request": [{"op": "replace", "path": "/params/model", "value": "Pad"}]}},
+        ]))
+        request = make_usage_request(count)
+        original = json.dumps(request)
+        return lambda: pipeline.apply_request(copy.deepcopy(request), original)
+
+    @bench(f"middleware.encrypt_request_json[{count} logs]")
+    async def encrypt_case(ctx):
+        middleware = make_middleware()
+        request = make_usage_request(count)
+        return lambda: middleware.encrypt_request_json(dict(request))
+
+
+for _count in LOG_COUNTS:
+    register_count(_count)
+
+
+def register_patch(count: int):
+    @bench(f"middleware.patch_response[{count} logs]")
+    async def patch_case(ctx):
+        # 与代理一致：解析上游响应、应用预编译补丁、重新序列化
+        body = json.dumps({"code": 0, "data": make_usage_request(count)["params"]})
+        patch = compile_patch_rule(json.dumps([
+            {"op": "replace", "path": "/data/model", "value": "Pad"},
+            {"op": "remove", "path": "/data/logs/0/mDuration"},
+            {"op": "add", "path": "/data/logs/-", "value": {"mPackageName": "com.kingsoft"}},
+        ])).response
+        return lambda: json.dumps(patch.apply(json.loads(body)))
+
+
+for _count in LOG_COUNTS:
+    register_patch(_count)
@@ -0,0 +1,150 @@
+import itertools
+import json
+
+from benchmarks.runner import bench
+from app.database import rebuild_rule_targets
+from app.repositories import RulesRepository
+from app.rule_cache import RuleCache
+
+METHOD = "com.linspirer.tactics.gettactics"
+RULE_COUNT = 300
+EMAILS_PER_RULE = 10
+
+
+def seed_rules(conn):
+    rows = []
+    for i in range(RULE_COUNT):
+        # 其余方法的规则也会出现在表里
+        method = METHOD if i % 3 == 0 else f"com.linspirer.method{i % 7}"
+        emails = ",".join(f"user{i * EMAILS_PER_RULE + j}@example.com" for j in range(EMAILS_PER_RULE))
+        rows.append((method, emails, "replace", '{"code": 0}', 1, 0, f"2024-01-01 00:{i // 60:02d}:{i % 60:02d}"))
+    rows.append((METHOD, None, "passthrough", None, 1, 1, "2023-12-31 00:00:00"))
+    conn.executemany(
+        "INSERT INTO interception_rules (method_name, email, action, custom_response, is_enabled, is_global, created_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        rows
+    )
+    rebuild_rule_targets(conn.cursor())
+
+
+def register_lookup(label: str, email):
+    @bench(f"rules.find_by_method[{label}]")
+    async def case(ctx):
+        session_maker = ctx.session_maker("rules", seed_rules)
+
+        async def lookup():
+            async with session_maker() as db:
+                await RulesRepository.find_by_method(db, METHOD, email)
+        return lookup
+
+
+def register_cached_lookup(label: str, email):
+    @bench(f"rules.cache_find[{label}]")
+    async def case(ctx):
+        session_maker = ctx.session_maker("rules", seed_rules)
+        cache = RuleCache()
+
+        async def lookup():
+            async with session_maker() as db:
+                await cache.find(db, METHOD, email)
+        return lookup
+
+
+def seed_conditional_rules(count: int):
+    def seed(conn):
+        # 按设备号区分的全局规则，外加一条只能逐条检查的正则规则
+        rows = [
+            (METHOD, json.dumps({"swdid": f"dev{i}", "launcher_version": {"gte": i % 10}}), i % 3)
+            for i in range(count)
+        ]
+        rows.append((METHOD, json.dumps({"model": {"regex": "^Pad"}}), 0))
+        conn.executemany(
+            "INSERT INTO interception_rules (method_name, email, action, custom_response, is_enabled, is_global, conditions, priority) "
+            "VALUES (?, NULL, 'passthrough', NULL, 1, 1, ?, ?)",
+            rows
+        )
+    return seed
+
+
+def register_conditions(count: int, label: str, params: dict):
+    @bench(f"rules.conditions_match[{count}-{label}]")
+    async def case(ctx):
+        session_maker = ctx.session_maker(f"rules-conditions-{count}", seed_conditional_rules(count))
+        cache = RuleCache()
+        async with session_maker() as db:
+            await cache.load(db)
+        method_rules = cache.by_method[METHOD]
+
+        # 只测内存匹配本身，不含会话开销
+        def match():
+            method_rules.find(None, params)
+        return match
+
+
+@bench("rules.bulk_upsert[300]")
+async def bulk_upsert(ctx):
+    session_maker = ctx.session_maker("rules-bulk", lambda conn: None)
+    rules = [
+        {"method_name": METHOD, "email": f"user{i}@example.com", "action": "replace", "custom_response": '{"code": 0}'}
+        for i in range(RULE_COUNT)
+    ]
+
+    async def upsert():
+        async with session_maker() as db:
+            await RulesRepository.bulk_upsert(db, rules)
+    return upsert
+
+
+# 最早创建的用户规则排在最后，曾是逐条拆分邮箱列表的最坏情况
+register_lookup("user-last", "user0@example.com")
+register_lookup("global-fallback", "nobody@example.com")
+register_lookup("no-email", None)
+register_cached_lookup("user-last", "user0@example.com")
+register_cached_lookup("global-fallback", "nobody@example.com")
+for count in (500, 5000):
+    register_conditions(count, "hit", {"swdid": "dev42", "launcher_version": 9})
+    register_conditions(count, "miss", {"swdid": "unknown", "model": "Phone"})
+
+
+def seed_method_patterns(count: int):
+    def seed(conn):
+        rows = []
+        for i in range(count):
+            rows.append((f"com.linspirer.m{i}.get", "passthrough"))
+            rows.append((f"com.linspirer.p{i}.*", "passthrough"))
+            rows.append((f"com.linspirer.g{i}.*.get", "passthrough"))
+        # 正则逐条匹配，数量随规则数增长，结果中包含这部分线性开销
+        rows.extend((rf"re:^com\.linspirer\.r{i}\.\d+$", "passthrough") for i in range(max(1, count // 100)))
+        conn.executemany(
+            "INSERT INTO interception_rules (method_name, email, action, is_enabled, is_global) VALUES (?, NULL, ?, 1, 1)",
+            rows
+        )
+    return seed
+
+
+def register_method_resolve(count: int, label: str, template: str, memo: bool = False):
+    @bench(f"rules.method_resolve[{count}-{label}]")
+    async def case(ctx):
+        session_maker = ctx.session_maker(f"rules-methods-{count}", seed_method_patterns(count))
+        cache = RuleCache()
+        async with session_maker() as db:
+            await cache.load(db)
+        # 每次换一个方法名并清空解析结果的缓存，测量的是匹配器本身而不是缓存命中
+        methods = [template.format(i=i) for i in range(min(count, 20))]
+        calls = itertools.count()
+
+        # 缓存已加载，find 不会访问数据库
+        async def resolve():
+            if not memo:
+                cache.matcher.resolved.clear()
+            await cache.find(None, methods[next(calls) % len(methods)])
+        return resolve
+
+
+for count in (100, 10000):
+    register_method_resolve(count, "exact", "com.linspirer.m{i}.get")
+    register_method_resolve(count, "prefix", "com.linspirer.p{i}.gettactics")
+    register_method_resolve(count, "glob", "com.linspirer.g{i}.tactics.get")
+    register_method_resolve(count, "regex", "com.linspirer.r{i}.42")
+    register_method_resolve(count, "miss", "com.other.method{i}")
+    register_method_resolve(count, "memo", "com.linspirer.p{i}.gettactics", memo=True)
@@ -0,0 +1,162 @@
+import asyncio
+import inspect
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 基准测试不依赖 .env，缺省时填入固定测试密钥
+os.environ.setdefault("LINSPIRER_KEY", "0123456789abcdef0123456789abcdef")
+os.environ.setdefault("LINSPIRER_IV", "0123456789abcdef")
+os.environ.setdefault("LINSPIRER_JWT_SECRET", "benchmark-secret")
+
+CASES: Dict[str, Callable[["BenchContext"], Awaitable[Callable]]] = {}
+
+MIN_ROUND_SECONDS = 0.05
+
+
+def bench(name: str):
+    def decorator(factory):
+        CASES[name] = factory
+        return factory
+    return decorator
+
+
+class BenchContext:
+    def __init__(self, log_rows: int = 20000):
+        self.log_rows = log_rows
+        self.tmpdir = tempfile.mkdtemp(prefix="linspirer-bench-")
+        self.engines = []
+        self.cache: Dict[str, Any] = {}
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.tmpdir, name)
+
+    def session_maker(self, name: str, seed: Callable[[sqlite3.Connection], None]):
+        from sqlalchemy import create_engine
+        from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+        from app.models import Base
+
+        key = "db:" + name
+        if key not in self.cache:
+            path = self.path(name + ".db")
+            sync_engine = create_engine(f"sqlite:///{path}")
+            Base.metadata.create_all(sync_engine)
+            sync_engine.dispose()
+
+            conn = sqlite3.connect(path)
+            seed(conn)
+            conn.commit()
+            conn.close()
+
+            engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+            self.engines.append(engine)
+            self.cache[key] = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        return self.cache[key]
+
+    async def close(self):
+        for engine in self.engines:
+            await engine.dispose()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+
+async def call_n(fn: Callable, n: int, is_async: bool) -> float:
+    started = time.perf_counter()
+    if is_async:
+        for _ in range(n):
+            await fn()
+    else:
+        for _ in range(n):
+            fn()
+    return time.perf_counter() - started
+
+
+async def measure(fn: Callable, rounds: int) -> Dict[str, Any]:
+    is_async = inspect.iscoroutinefunction(fn)
+    # 预热并标定单轮调用次数，使每轮至少 MIN_ROUND_SECONDS
+    number = 1
+    while True:
+        elapsed = await call_n(fn, number, is_async)
+        if elapsed >= MIN_ROUND_SECONDS or number >= 1 << 20:
+            break
+        number *= 2
+
+    per_call = []
+    for _ in range(rounds):
+        elapsed = await call_n(fn, number, is_async)
+        per_call.append(elapsed / number * 1e6)
+
+    return {
+        "number": number,
+        "rounds": rounds,
+        "min_us": round(min(per_call), 3),
+        "median_us": round(statistics.median(per_call), 3),
+    }
+
+
+async def run_cases(names: List[str], rounds: int, log_rows: int, progress: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+    ctx = BenchContext(log_rows=log_rows)
+    results = {}
+    try:
+        for name in names:
+            fn = await CASES[name](ctx)
+            results[name] = await measure(fn, rounds)
+            if progress:
+                progress(f"{name:<60} {results[name]['median_us']:>14.3f} us")
+    finally:
+        await ctx.close()
+
+    return {
+        "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+
+
+def select_cases(patterns: Optional[List[str]]) -> List[str]:
+    if not patterns:
+        return list(CASES)
+    return [name for name in CASES if any(p in name for p in patterns)]
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold_pct: float) -> List[Dict[str, Any]]:
+    rows = []
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if not base:
+            rows.append({"name": name, "baseline_us": None, "current_us": result["median_us"], "change_pct": None, "regressed": False})
+            continue
+        change = (result["median_us"] - base["median_us"]) / base["median_us"] * 100 if base["median_us"] else 0.0
+        rows.append({
+            "name": name,
+            "baseline_us": base["median_us"],
+            "current_us": result["median_us"],
+            "change_pct": round(change, 1),
+            "regressed": change > threshold_pct,
+        })
+    return rows
+
+
+def load(path: str) -> Dict[str, Any]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save(path: str, data: Dict[str, Any]):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+
+
+def run(names: List[str], rounds: int, log_rows: int) -> Dict[str, Any]:
+    return asyncio.run(run_cases(names, rounds, log_rows, progress=print))
@@ -6,17 +6,23 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from fastapi import FastAPI, Request, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, FileResponse
-from starlette.staticfiles import StaticFiles
+from fastapi.responses import JSONResponse
 import httpx
 import logging
 import json
+import math
 
+from app.compression import CompressionMiddleware
 from app.config import get_settings
 from app.crypto import Cryptor
 from app.database import init_db
+from app.devices import get_device_registry
+from app.log_archive import get_log_archive
 from app.routes import router as admin_router
 from app.middleware import AuthMiddleware, ProxyMiddleware
+from app.resilience import CircuitOpenError, get_upstream
+from app.runtime_config import get_runtime_config
+from app.static_assets import StaticAssets
 
 
 logging.basicConfig(level=logging.INFO)
@@ -33,7 +39,7 @@ cryptor = Cryptor(
 os.makedirs("./data", exist_ok=True)
 os.makedirs("./static", exist_ok=True)
 
-app.mount("/static", StaticFiles(directory="static"), name="static")
+static_assets = StaticAssets("static", settings.LINSPIRER_STATIC_MAX_AGE)
 
 app.add_middleware(
     CORSMiddleware,
@@ -45,24 +51,42 @@ app.add_middleware(
 
 app.add_middleware(AuthMiddleware)
 app.add_middleware(ProxyMiddleware, cryptor=cryptor)
+app.add_middleware(CompressionMiddleware, minimum_size=settings.LINSPIRER_COMPRESSION_MIN_SIZE)
 
 app.include_router(admin_router, prefix="/admin")
 
 
 @app.get("/admin")
-async def admin_index():
-    return FileResponse("static/index.html")
+async def admin_index(request: Request):
+    return static_assets.response(request, "index.html")
 
 
 @app.get("/admin/")
-async def admin_indexSlash():
-    return FileResponse("static/index.html")
+async def admin_indexSlash(request: Request):
+    return static_assets.response(request, "index.html")
+
+
+@app.get("/static/{path:path}")
+async def static_file(request: Request, path: str):
+    return static_assets.response(request, path)
 
 
 @app.on_event("startup")
 async def startup():
     await init_db()
     logger.info("Database initialized")
+    await get_runtime_config().start()
+    get_upstream().start()
+    get_log_archive().start()
+    get_device_registry().start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await get_device_registry().stop()
+    await get_log_archive().stop()
+    await get_upstream().aclose()
+    await get_runtime_config().stop()
 
 
 @app.get("/")
@@ -72,32 +96,31 @@ async def root():
 
 @app.post("/public-interface.php")
 async def proxy_endpoint(request: Request):
-    target_url = settings.LINSPIRER_TARGET_URL
-    
+    # 请求体为空或不是 JSON 时由代理中间件转到这里，同样经过上游连接池、超时配置和熔断器
     body = await request.body()
     headers = dict(request.headers)
     headers.pop("host", None)
     
-    async with httpx.AsyncClient(verify=False) as client:
-        try:
-            response = await client.post(
-                target_url,
-                content=body,
-                headers=headers,
-                timeout=30.0,
-            )
-            
-            return JSONResponse(
-                content=response.json() if response.headers.get("content-type", "").startswith("application/json") else {},
-                status_code=response.status_code,
-                headers=dict(response.headers),
-            )
-        except httpx.RequestError as e:
-            logger.error(f"Proxy error: {e}")
-            return JSONResponse(
-                status_code=502,
-                content={"error": f"Failed to connect to target: {str(e)}"},
-            )
+    try:
+        response = await get_upstream().post("", request.url.path, content=body, headers=headers)
+        
+        return JSONResponse(
+            content=response.json() if response.headers.get("content-type", "").startswith("application/json") else {},
+            status_code=response.status_code,
+            headers=dict(response.headers),
+        )
+    except CircuitOpenError as e:
+        return JSONResponse(
+            status_code=503,
+            content={"error": str(e)},
+            headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))},
+        )
+    except httpx.RequestError as e:
+        logger.error(f"Proxy error: {e}")
+        return JSONResponse(
+            status_code=502,
+            content={"error": f"Failed to connect to target: {str(e)}"},
+        )
 
 
 @app.middleware("http")
@@ -1,11 +1,16 @@
 const API_BASE = '/admin/api';
 const LOGS_PAGE_SIZE = 50;
+const COMMANDS_PAGE_SIZE = 50;
 
 let token = null;
 let logsPage = 1;
 let editingRuleId = null;
 let searchTimeout = null;
 let currentLogsData = {};
+let liveTailController = null;
+let commandsCursor = null;
+let shownCommands = {};
+const LIVE_TAIL_MAX_ROWS = 200;
 
 function formatChinaTime(dateStr) {
     const date = new Date(dateStr);
@@ -71,6 +76,7 @@ function showDashboard() {
 }
 
 function logout() {
+    stopLiveTail();
     localStorage.removeItem('token');
     token = null;
     document.getElementById('dashboard').classList.add('hidden');
@@ -171,6 +177,7 @@ function switchTab(tab) {
     if (tab === 'rules') loadRules();
     if (tab === 'commands') loadCommands();
     if (tab === 'logs') loadLogs();
+    else stopLiveTail();
 }
 
 async function apiRequest(url, options = {}) {
@@ -191,18 +198,28 @@ async function apiRequest(url, options = {}) {
 
 
 
-async function loadCommands() {
+async function loadCommands(append = false) {
     try {
-        const res = await apiRequest('/commands');
-        const commands = await res.json();
+        let url = `/commands?limit=${COMMANDS_PAGE_SIZE}`;
+        if (append && commandsCursor) url += `&cursor=${encodeURIComponent(commandsCursor)}`;
+        const res = await apiRequest(url);
+        const data = await res.json();
+        const commands = data.data || [];
+        commandsCursor = data.next_cursor;
         const container = document.getElementById('commandsList');
 
-        if (!commands || commands.length === 0) {
+        if (!append) shownCommands = {};
+        commands.forEach(cmd => { shownCommands[cmd.id] = cmd; });
+
+        const moreBtn = document.getElementById('commandsLoadMore');
+        if (moreBtn) moreBtn.remove();
+
+        if (!append && commands.length === 0) {
             container.innerHTML = '<div class="p-8 text-center text-gray-500">No commands in queue</div>';
             return;
         }
 
-        container.innerHTML = commands.map(cmd => `
+        const html = commands.map(cmd => `
             <div class="p-4 hover:bg-gray-50 border-b border-gray-100 last:border-b-0">
                 <div class="flex justify-between items-start">
                     <div class="flex-1">
@@ -225,11 +242,43 @@ async function loadCommands() {
                 </div>
             </div>
         `).join('');
+
+        if (append) {
+            container.insertAdjacentHTML('beforeend', html);
+        } else {
+            container.innerHTML = html;
+        }
+        if (commandsCursor) {
+            container.insertAdjacentHTML('beforeend', `
+                <div id="commandsLoadMore" class="p-4 text-center">
+                    <button onclick="loadCommands(true)" class="px-4 py-2 bg-white text-gray-700 border border-gray-300 rounded-lg text-sm font-medium hover:bg-gray-50">加载更多</button>
+                </div>
+            `);
+        }
     } catch (err) {
         document.getElementById('commandsList').innerHTML = '<div class="p-8 text-center text-red-500">Failed to load commands</div>';
     }
 }
 
+async function verifyShownCommands() {
+    const ids = Object.values(shownCommands).filter(cmd => cmd.status === 'unverified').map(cmd => cmd.id);
+    if (ids.length === 0) return;
+    if (!confirm(`Verify ${ids.length} unverified commands?`)) return;
+    try {
+        const res = await apiRequest('/commands/bulk/verify', {
+            method: 'POST',
+            body: JSON.stringify({ ids })
+        });
+        if (res.ok) {
+            loadCommands();
+        } else {
+            alert('Failed to verify commands');
+        }
+    } catch (err) {
+        alert('Error: ' + err.message);
+    }
+}
+
 async function sendCommandToDevice(commandId) {
     try {
         const btn = event.target;
@@ -282,7 +331,8 @@ async function loadLogs(method = '', search = '') {
             }
         }
         
-        let url = `/logs?page=${logsPage}&limit=${LOGS_PAGE_SIZE}`;
+        // 列表只展示请求体摘要，其余正文在打开详情时再加载
+        let url = `/logs?page=${logsPage}&limit=${LOGS_PAGE_SIZE}&bodies=request_body`;
         if (method) url += `&method=${encodeURIComponent(method)}`;
         if (search) url += `&search=${encodeURIComponent(search)}`;
 
@@ -302,19 +352,7 @@ async function loadLogs(method = '', search = '') {
             return;
         }
 
-        tbody.innerHTML = logs.map(log => `
-            <tr class="hover:bg-gray-50 cursor-pointer" onclick='showLogDetail(${log.id})'>
-                <td class="px-6 py-4 whitespace-nowrap text-sm font-medium text-gray-900">${log.method || '-'}</td>
-                <td class="px-6 py-4 whitespace-nowrap text-sm">
-                    ${log.email ? 
-                        `<span class="px-2 py-1 rounded-full text-xs bg-blue-100 text-blue-800">${escapeHtml(log.email)}</span>` : 
-                        `<span class="px-2 py-1 rounded-full text-xs bg-purple-100 text-purple-800">全局</span>`
-                    }
-                </td>
-                <td class="px-6 py-4 whitespace-nowrap text-sm text-gray-500">${formatChinaTime(log.created_at)}</td>
-                <td class="px-6 py-4 text-sm text-gray-500 font-mono truncate max-w-md">${escapeHtml(JSON.stringify(log.request_body))}</td>
-            </tr>
-        `).join('');
+        tbody.innerHTML = logs.map(renderLogRow).join('');
 
         updateLogsPagination(total, true);
     } catch (err) {
@@ -391,7 +429,7 @@ function toggleCustomResponse() {
     const section = document.getElementById('customResponseSection');
     const randomizeSection = document.getElementById('randomizeConfigSection');
     
-    if (action === 'replace' || action === 'modify') {
+    if (action === 'replace' || action === 'modify' || action === 'patch' || action === 'chain') {
         section.classList.remove('hidden');
     } else {
         section.classList.add('hidden');
@@ -582,9 +620,12 @@ function getActionDisplayName(action) {
         'passthrough': '直连',
         'modify': '修改请求',
         'replace': '覆写响应',
-        'randomize_app_duration': '随机时长'
+        'randomize_app_duration': '随机时长',
+        'patch': 'JSON 补丁',
+        'chain': '转换链'
     };
-    return actionMap[action] || action;
+    // 转换链记录的动作形如 randomize_app_duration+patch
+    return action.split('+').map(name => actionMap[name] || name).join(' + ');
 }
 
 function updateRuleScopeHint() {
@@ -754,7 +795,7 @@ async function saveRule() {
             keep_count: parseInt(keepCount, 10) || 2
         };
         customResponse = JSON.stringify(config);
-    } else if (action === 'replace' || action === 'modify') {
+    } else if (action === 'replace' || action === 'modify' || action === 'patch' || action === 'chain') {
         customResponse = document.getElementById('ruleCustomResponse').value.trim();
     }
 
@@ -982,9 +1023,96 @@ function toggleViewMode(section, mode) {
     }
 }
 
-function showLogDetail(logId) {
-    const log = currentLogsData[logId];
-    if (!log) return;
+function renderLogRow(log) {
+    return `
+            <tr class="hover:bg-gray-50 ${log.id ? 'cursor-pointer' : ''}" ${log.id ? `onclick='showLogDetail(${log.id})'` : ''}>
+                <td class="px-6 py-4 whitespace-nowrap text-sm font-medium text-gray-900">${log.method || '-'}</td>
+                <td class="px-6 py-4 whitespace-nowrap text-sm">
+                    ${log.email ? 
+                        `<span class="px-2 py-1 rounded-full text-xs bg-blue-100 text-blue-800">${escapeHtml(log.email)}</span>` : 
+                        `<span class="px-2 py-1 rounded-full text-xs bg-purple-100 text-purple-800">全局</span>`
+                    }
+                </td>
+                <td class="px-6 py-4 whitespace-nowrap text-sm text-gray-500">${formatChinaTime(log.created_at)}</td>
+                <td class="px-6 py-4 text-sm text-gray-500 font-mono truncate max-w-md">${escapeHtml(JSON.stringify(log.request_body))}</td>
+            </tr>
+        `;
+}
+
+function toggleLiveTail() {
+    if (liveTailController) {
+        stopLiveTail();
+    } else {
+        startLiveTail();
+    }
+}
+
+function stopLiveTail() {
+    if (liveTailController) {
+        liveTailController.abort();
+        liveTailController = null;
+    }
+    const btn = document.getElementById('liveTailBtn');
+    btn.className = 'px-4 py-2 bg-white text-gray-700 border border-gray-300 rounded-lg text-sm font-medium hover:bg-gray-50';
+}
+
+async function startLiveTail() {
+    // EventSource 不能携带 Authorization 头，改用 fetch 读取 SSE 流
+    const controller = new AbortController();
+    liveTailController = controller;
+    const btn = document.getElementById('liveTailBtn');
+    btn.className = 'px-4 py-2 bg-green-600 text-white border border-green-600 rounded-lg text-sm font-medium hover:bg-green-700';
+    document.getElementById('logsPagination').classList.add('hidden');
+    if (Object.keys(currentLogsData).length === 0) {
+        document.getElementById('logsTableBody').innerHTML = '';
+    }
+
+    const method = document.getElementById('logMethodFilter').value;
+    let url = '/logs/live?bodies=true';
+    if (method) url += `&method=${encodeURIComponent(method)}`;
+
+    try {
+        const res = await apiRequest(url, { signal: controller.signal });
+        if (!res.ok) throw new Error('Failed to start live tail');
+        const reader = res.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            const events = buffer.split('\n\n');
+            buffer = events.pop();
+            events.forEach(handleLiveTailEvent);
+        }
+    } catch (err) {
+        if (err.name !== 'AbortError') console.error(err);
+    }
+    if (liveTailController === controller) stopLiveTail();
+}
+
+function handleLiveTailEvent(chunk) {
+    const data = chunk.split('\n').filter(line => line.startsWith('data: ')).map(line => line.slice(6)).join('\n');
+    if (!data || chunk.startsWith('event: dropped')) return;
+    const log = JSON.parse(data);
+    if (log.id) currentLogsData[log.id] = log;
+
+    const tbody = document.getElementById('logsTableBody');
+    tbody.insertAdjacentHTML('afterbegin', renderLogRow(log));
+    while (tbody.rows.length > LIVE_TAIL_MAX_ROWS) tbody.deleteRow(-1);
+}
+
+async function showLogDetail(logId) {
+    if (!currentLogsData[logId]) return;
+    let log;
+    try {
+        const res = await apiRequest(`/logs/${logId}`);
+        if (!res.ok) throw new Error('Failed to load log');
+        log = await res.json();
+    } catch (err) {
+        alert('Error: ' + err.message);
+        return;
+    }
 
     document.getElementById('logDetailTime').textContent = `${log.method} at ${formatChinaTime(log.created_at)}`;
 
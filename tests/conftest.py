@@ -0,0 +1,15 @@
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# 导入 app 前设置必需的配置，数据库放在临时目录，不影响 ./data
+DATA_DIR = tempfile.mkdtemp(prefix="linspirer-test-")
+os.environ.setdefault("LINSPIRER_KEY", "0123456789abcdef0123456789abcdef")
+os.environ.setdefault("LINSPIRER_IV", "0123456789abcdef")
+os.environ.setdefault("LINSPIRER_JWT_SECRET", "test-secret")
+os.environ.setdefault("LINSPIRER_DB_PATH", "sqlite+aiosqlite:///" + os.path.join(DATA_DIR, "linspirer.db"))
+os.environ.setdefault("LINSPIRER_LOG_DB_PATH", "sqlite+aiosqlite:///" + os.path.join(DATA_DIR, "logs.db"))
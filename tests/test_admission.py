@@ -0,0 +1,225 @@
+import asyncio
+import time
+
+import pytest
+
+from app.admission import (
+    DEADLINE, QUEUE_FULL, RATE_LIMITED, TIMEOUT, AdmissionController, AdmissionRejected, Gate, TokenBucket,
+    parse_method_limits,
+)
+
+
+class StaticConfig:
+    def __init__(self, **values):
+        self.values = {
+            "admission_max_inflight": 0,
+            "admission_queue_size": 10,
+            "admission_queue_timeout_ms": 1000,
+            "admission_device_rate": 0.0,
+            "admission_device_burst": 1,
+            "admission_method_limits": "{}",
+        }
+        self.values.update(values)
+
+    def get(self, key):
+        return self.values[key]
+
+
+async def settle():
+    # wait_for 在单独的任务中等待，多让出几次事件循环
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_token_bucket_burst_and_refill():
+    bucket = TokenBucket(2, now=0)
+    assert bucket.take(rate=1, burst=2, now=0) == 0
+    assert bucket.take(rate=1, burst=2, now=0) == 0
+    assert bucket.take(rate=1, burst=2, now=0) == pytest.approx(1.0)
+    assert bucket.take(rate=1, burst=2, now=0.5) == pytest.approx(0.5)
+    assert bucket.take(rate=1, burst=2, now=1.0) == 0
+    # 长时间空闲后最多积累 burst 个令牌
+    for _ in range(2):
+        assert bucket.take(rate=1, burst=2, now=100) == 0
+    assert bucket.take(rate=1, burst=2, now=100) > 0
+
+
+def test_gate_admits_up_to_limit_then_hands_off_in_order():
+    async def main():
+        gate = Gate("g", 1)
+        deadline = time.monotonic() + 5
+        await gate.acquire(deadline, 10)
+        assert gate.inflight == 1
+
+        order = []
+
+        async def wait(name):
+            await gate.acquire(deadline, 10)
+            order.append(name)
+
+        tasks = [asyncio.create_task(wait(name)) for name in ("a", "b")]
+        await settle()
+        assert len(gate.waiters) == 2 and not order
+
+        gate.release(0.01)
+        # 名额直接交给队首，不会被新请求抢走
+        assert gate.inflight == 1 and len(gate.waiters) == 1
+        await settle()
+        assert order == ["a"]
+        gate.release(0.01)
+        await asyncio.gather(*tasks)
+        assert order == ["a", "b"]
+        gate.release(0.01)
+        assert gate.inflight == 0
+        assert gate.snapshot()["admitted"] == 3
+
+    asyncio.run(main())
+
+
+def test_gate_sheds_when_queue_is_full():
+    async def main():
+        gate = Gate("g", 1)
+        deadline = time.monotonic() + 5
+        await gate.acquire(deadline, 1)
+        waiter = asyncio.create_task(gate.acquire(deadline, 1))
+        await settle()
+        with pytest.raises(AdmissionRejected) as e:
+            await gate.acquire(deadline, 1)
+        assert e.value.reason == QUEUE_FULL
+        assert e.value.scope == "g"
+        gate.release(None)
+        await waiter
+        assert gate.shed == {QUEUE_FULL: 1}
+
+    asyncio.run(main())
+
+
+def test_gate_sheds_requests_that_cannot_meet_deadline():
+    async def main():
+        gate = Gate("g", 1)
+        await gate.acquire(time.monotonic() + 5, 10)
+        # 平均占用 2 秒，只剩 1 秒的请求排队也等不到
+        gate.hold = 2.0
+        with pytest.raises(AdmissionRejected) as e:
+            await gate.acquire(time.monotonic() + 1, 10)
+        assert e.value.reason == DEADLINE
+        assert e.value.retry_after == pytest.approx(2.0)
+        assert not gate.waiters
+
+        with pytest.raises(AdmissionRejected) as e:
+            await gate.acquire(time.monotonic() - 1, 10)
+        assert e.value.reason == DEADLINE
+
+    asyncio.run(main())
+
+
+def test_gate_times_out_waiters():
+    async def main():
+        gate = Gate("g", 1)
+        await gate.acquire(time.monotonic() + 5, 10)
+        with pytest.raises(AdmissionRejected) as e:
+            await gate.acquire(time.monotonic() + 0.05, 10)
+        assert e.value.reason == TIMEOUT
+        assert not gate.waiters
+        assert gate.inflight == 1
+
+    asyncio.run(main())
+
+
+def test_cancelled_waiter_leaves_queue_and_granted_slot_is_returned():
+    async def main():
+        gate = Gate("g", 1)
+        deadline = time.monotonic() + 5
+        await gate.acquire(deadline, 10)
+        waiter = asyncio.create_task(gate.acquire(deadline, 10))
+        await settle()
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert not gate.waiters
+
+        # 名额交给等待者后、等待者恢复运行前被取消，名额需要归还
+        waiter = asyncio.create_task(gate.acquire(deadline, 10))
+        await settle()
+        gate.release(None)
+        waiter.cancel()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            pass
+        else:
+            # 部分 Python 版本的 wait_for 在结果已就绪时忽略取消，此时名额归调用方所有
+            gate.release(None)
+        assert gate.inflight == 0
+        assert not gate.waiters
+
+    asyncio.run(main())
+
+
+def test_unlimited_gate_never_queues():
+    async def main():
+        gate = Gate("g", 0)
+        for _ in range(100):
+            await gate.acquire(time.monotonic() + 1, 0)
+        assert gate.inflight == 100
+
+    asyncio.run(main())
+
+
+def test_parse_method_limits():
+    assert parse_method_limits("") == "{}"
+    assert parse_method_limits('{"com.a.b": 2}') == '{"com.a.b": 2}'
+    for value in ("[]", "{", '{"a": 0}', '{"a": true}', '{"a": 1.5}'):
+        with pytest.raises(ValueError):
+            parse_method_limits(value)
+
+
+def test_controller_rate_limits_per_device():
+    async def main():
+        controller = AdmissionController(StaticConfig(admission_device_rate=0.001, admission_device_burst=1))
+        async with controller.admit("m", "a@b.c"):
+            pass
+        with pytest.raises(AdmissionRejected) as e:
+            async with controller.admit("m", "a@b.c"):
+                pass
+        assert e.value.reason == RATE_LIMITED
+        async with controller.admit("m", "other@b.c"):
+            pass
+        async with controller.admit("m", None):
+            pass
+        assert controller.shed == {RATE_LIMITED: 1}
+
+    asyncio.run(main())
+
+
+def test_controller_device_rate_is_off_by_default():
+    async def main():
+        controller = AdmissionController(StaticConfig())
+        for _ in range(10):
+            async with controller.admit("m", "a@b.c"):
+                pass
+        assert controller.admitted == 10
+        assert not controller.buckets
+
+    asyncio.run(main())
+
+
+def test_controller_method_limit_releases_on_rejection():
+    async def main():
+        controller = AdmissionController(StaticConfig(
+            admission_max_inflight=1, admission_queue_size=0, admission_method_limits='{"hot.*": 1}'
+        ))
+        async with controller.admit("hot.a", None):
+            with pytest.raises(AdmissionRejected) as e:
+                async with controller.admit("hot.b", None):
+                    pass
+            assert e.value.scope == "hot.*"
+            # 方法名额已占，全局名额满时被拒绝的请求要归还已占的方法名额
+            with pytest.raises(AdmissionRejected) as e:
+                async with controller.admit("cold", None):
+                    pass
+            assert e.value.scope == "global"
+        assert controller.gate.inflight == 0
+        assert controller.method_gates["hot.*"].inflight == 0
+
+    asyncio.run(main())
@@ -0,0 +1,129 @@
+import json
+
+import pytest
+
+from app.json_patch import PatchError, compile_patch, compile_patch_rule, parse_pointer
+from app.transforms import get_transform_registry
+
+
+def apply(operations, doc):
+    return compile_patch(operations).apply(doc)
+
+
+def test_parse_pointer_unescapes_tokens():
+    assert parse_pointer("") == ()
+    assert parse_pointer("/a~1b/m~0n/0/01") == (("a/b", None), ("m~n", None), ("0", 0), ("01", None))
+    with pytest.raises(PatchError):
+        parse_pointer("a/b")
+
+
+def test_add_and_remove():
+    doc = {"data": {"apps": ["a", "c"]}}
+    doc = apply([
+        {"op": "add", "path": "/data/apps/1", "value": "b"},
+        {"op": "add", "path": "/data/apps/-", "value": "d"},
+        {"op": "add", "path": "/data/enabled", "value": True},
+        {"op": "remove", "path": "/data/apps/0"},
+    ], doc)
+    assert doc == {"data": {"apps": ["b", "c", "d"], "enabled": True}}
+
+
+def test_replace_move_copy():
+    doc = {"a": 1, "b": {"c": 2}, "list": [1, 2]}
+    doc = apply([
+        {"op": "replace", "path": "/a", "value": 10},
+        {"op": "move", "from": "/b/c", "path": "/moved"},
+        {"op": "copy", "from": "/list", "path": "/copied"},
+    ], doc)
+    assert doc == {"a": 10, "b": {}, "list": [1, 2], "moved": 2, "copied": [1, 2]}
+    doc["copied"].append(3)
+    assert doc["list"] == [1, 2]
+
+
+def test_replace_root_returns_new_document():
+    assert apply([{"op": "replace", "path": "", "value": {"x": 1}}], {"y": 2}) == {"x": 1}
+
+
+def test_added_values_are_not_shared_between_documents():
+    patch = compile_patch([{"op": "add", "path": "/items", "value": []}])
+    first = patch.apply({})
+    first["items"].append(1)
+    assert patch.apply({}) == {"items": []}
+
+
+def test_test_operation():
+    assert apply([{"op": "test", "path": "/code", "value": 0}], {"code": 0}) == {"code": 0}
+    with pytest.raises(PatchError):
+        apply([{"op": "test", "path": "/code", "value": 0}], {"code": 1})
+
+
+@pytest.mark.parametrize("doc, operation", [
+    ({}, {"op": "remove", "path": "/missing"}),
+    ({"a": []}, {"op": "replace", "path": "/a/0", "value": 1}),
+    ({"a": [1]}, {"op": "add", "path": "/a/5", "value": 1}),
+    ({"a": 1}, {"op": "add", "path": "/a/b", "value": 1}),
+    ({}, {"op": "copy", "from": "/missing", "path": "/b"}),
+])
+def test_invalid_paths_raise(doc, operation):
+    with pytest.raises(PatchError):
+        apply([operation], doc)
+
+
+@pytest.mark.parametrize("operations", [
+    {"op": "add"},
+    [{"op": "merge", "path": "/a"}],
+    [{"op": "add", "path": "/a"}],
+    [{"op": "move", "path": "/a"}],
+    [{"op": "move", "from": "/a", "path": "/a/b"}],
+    [{"op": "remove", "path": "a"}],
+])
+def test_invalid_operations_are_rejected_at_compile_time(operations):
+    with pytest.raises(PatchError):
+        compile_patch(operations)
+
+
+def test_compile_patch_rule_splits_request_and_response():
+    rule = compile_patch_rule(json.dumps([{"op": "add", "path": "/a", "value": 1}]))
+    assert rule.request is None and rule.response is not None
+    rule = compile_patch_rule(json.dumps({"request": [{"op": "remove", "path": "/a"}]}))
+    assert rule.request is not None and rule.response is None
+    with pytest.raises(PatchError):
+        compile_patch_rule(json.dumps({"request": [], "extra": []}))
+    with pytest.raises(PatchError):
+        compile_patch_rule("not json")
+
+
+def test_failed_request_patch_rolls_back_to_original():
+    pipeline = get_transform_registry().compile("patch", json.dumps({"request": [
+        {"op": "add", "path": "/params/injected", "value": True},
+        {"op": "remove", "path": "/params/email"},
+        {"op": "test", "path": "/method", "value": "other"},
+    ]}))
+    original = json.dumps({"method": "m", "params": {"email": "a@b.c"}})
+    request = json.loads(original)
+
+    restored, applied = pipeline.apply_request(request, original)
+    assert applied == []
+    assert restored == {"method": "m", "params": {"email": "a@b.c"}}
+
+
+def test_request_patch_applies_when_all_operations_succeed():
+    pipeline = get_transform_registry().compile("patch", json.dumps({"request": [
+        {"op": "test", "path": "/method", "value": "m"},
+        {"op": "add", "path": "/params/injected", "value": True},
+    ]}))
+    original = json.dumps({"method": "m", "params": {}})
+    request, applied = pipeline.apply_request(json.loads(original), original)
+    assert applied == ["patch"]
+    assert request == {"method": "m", "params": {"injected": True}}
+
+
+def test_failed_response_patch_returns_original_text():
+    pipeline = get_transform_registry().compile("patch", json.dumps([
+        {"op": "replace", "path": "/code", "value": 0},
+        {"op": "remove", "path": "/data/missing"},
+    ]))
+    response = '{"code": 1, "data": {}}'
+    assert pipeline.apply_response(response) == (response, [])
+
+    assert pipeline.apply_response("not json") == ("not json", [])
@@ -0,0 +1,159 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+import app.repositories as repositories
+from app.log_partitions import (
+    ID_SPAN, LEGACY_TABLE, PartitionWriter, build_partitions, create_partition, expired_partitions,
+    find_partition, get_partition_writer, key_of_id, key_start, list_partitions, parse_partition_name,
+    partition_key, partition_name, write_key,
+)
+from app.models import china_now
+from app.repositories import LogsRepository
+
+
+def run_with_session(tmp_path, test):
+    # 每个用例使用独立的日志库，会话未绑定映射时回落到该引擎
+    async def main():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'logs.db'}")
+        try:
+            async with async_sessionmaker(engine, expire_on_commit=False)() as db:
+                await test(db)
+        finally:
+            await engine.dispose()
+    asyncio.run(main())
+
+
+async def table_names(db):
+    return [partition.name for partition in await list_partitions(db)]
+
+
+def test_partition_name_round_trip():
+    moment = datetime(2024, 3, 5, 23, 59)
+    key = partition_key(moment, 1)
+    assert partition_name(key) == "request_logs_20240305"
+    assert parse_partition_name(partition_name(key)) == key
+    assert key_start(key) == datetime(2024, 3, 5)
+    assert parse_partition_name(LEGACY_TABLE) is None
+    assert parse_partition_name("request_logs_20241399") is None
+    assert parse_partition_name("request_logs_2024") is None
+
+
+def test_partition_key_aligns_to_days():
+    key = partition_key(datetime(2024, 3, 5), 7)
+    assert key % 7 == 0
+    assert key_start(key) <= datetime(2024, 3, 5) < key_start(key + 7)
+
+
+def test_build_partitions_orders_and_bounds():
+    names = ["request_logs_20240303", LEGACY_TABLE, "request_logs_20240301", "other_table"]
+    partitions = build_partitions(names)
+    assert [p.name for p in partitions] == [LEGACY_TABLE, "request_logs_20240301", "request_logs_20240303"]
+    assert partitions[0].start == datetime.min
+    assert partitions[0].end == datetime(2024, 3, 1)
+    assert partitions[1].end == datetime(2024, 3, 3)
+    assert partitions[2].end == datetime.max
+
+    key = partitions[1].key
+    assert find_partition(partitions, key * ID_SPAN + 42) is partitions[1]
+    assert key_of_id(key * ID_SPAN + 42) == key
+    assert find_partition(partitions, (key + 1) * ID_SPAN) is None
+
+
+def test_expired_partitions_keep_partitions_overlapping_retention():
+    partitions = build_partitions([LEGACY_TABLE, "request_logs_20240301", "request_logs_20240305", "request_logs_20240310"])
+    expired = expired_partitions(partitions, datetime(2024, 3, 6))
+    assert [p.name for p in expired] == [LEGACY_TABLE, "request_logs_20240301"]
+    assert expired_partitions(partitions, datetime(2030, 1, 1))[-1].name == "request_logs_20240305"
+
+
+def test_write_key_reuses_covering_partition():
+    partitions = build_partitions(["request_logs_20240301"])
+    # 分区天数从 1 改为 7 后，已有分区覆盖的时间继续写入该分区
+    assert write_key(partitions, datetime(2024, 3, 1, 12), 7) == partitions[0].key
+    assert write_key(partitions, datetime(2024, 3, 2), 1) == partition_key(datetime(2024, 3, 2), 1)
+    assert write_key(build_partitions([LEGACY_TABLE]), datetime(2024, 3, 2), 1) == partition_key(datetime(2024, 3, 2), 1)
+
+
+def test_writer_rolls_over_to_a_new_partition(tmp_path):
+    async def test(db):
+        writer = PartitionWriter(days=1)
+        table, created = await writer.table_for(db, datetime(2024, 3, 1, 10))
+        assert created and table.name == "request_logs_20240301"
+        table, created = await writer.table_for(db, datetime(2024, 3, 1, 23, 59))
+        assert not created and table.name == "request_logs_20240301"
+
+        table, created = await writer.table_for(db, datetime(2024, 3, 2, 0, 0))
+        assert created and table.name == "request_logs_20240302"
+        await db.commit()
+        assert await table_names(db) == ["request_logs_20240301", "request_logs_20240302"]
+
+        # 其他进程已建好的分区不算新建
+        other = PartitionWriter(days=1)
+        _, created = await other.table_for(db, datetime(2024, 3, 2, 8))
+        assert not created
+
+    run_with_session(tmp_path, test)
+
+
+def test_partition_ids_start_at_key_span(tmp_path):
+    async def test(db):
+        table, _ = await PartitionWriter(days=1).table_for(db, datetime(2024, 3, 1))
+        result = await db.execute(table.insert().values(method="m"))
+        await db.commit()
+        id = result.inserted_primary_key[0]
+        assert key_of_id(id) == partition_key(datetime(2024, 3, 1), 1)
+
+    run_with_session(tmp_path, test)
+
+
+def test_create_drops_expired_partitions_on_rollover(tmp_path):
+    async def test(db):
+        today = partition_key(china_now().replace(tzinfo=None), 1)
+        for days in (20, 15, 5):
+            await create_partition(db, today - days)
+        await db.commit()
+        get_partition_writer().reset()
+
+        await LogsRepository.create(db, method="m", request_body="{}", response_body="{}", retention_days=7)
+        assert await table_names(db) == [partition_name(today - 15), partition_name(today - 5), partition_name(today)]
+
+        # 同一分区内的后续写入不再检查过期分区
+        await create_partition(db, today - 30)
+        await db.commit()
+        await LogsRepository.create(db, method="m", request_body="{}", response_body="{}", retention_days=7)
+        assert partition_name(today - 30) in await table_names(db)
+
+    try:
+        run_with_session(tmp_path, test)
+    finally:
+        get_partition_writer().reset()
+
+
+def test_failed_write_resets_cached_partition(tmp_path, monkeypatch):
+    async def fail(db, partitions):
+        raise RuntimeError("disk full")
+
+    async def test(db):
+        get_partition_writer().reset()
+        monkeypatch.setattr(repositories, "drop_partitions", fail)
+        with pytest.raises(RuntimeError):
+            await LogsRepository.create(db, method="m", request_body="{}", response_body="{}", retention_days=7)
+        # 回滚撤销了自增序列的初始值，缓存的分区必须清除，下次写入时重新建表并写入序列
+        assert get_partition_writer().table is None
+
+        monkeypatch.undo()
+        log_id = await LogsRepository.create(db, method="m", request_body="{}", response_body="{}")
+        today = partition_key(china_now().replace(tzinfo=None), 1)
+        assert key_of_id(log_id) == today
+        assert await table_names(db) == [partition_name(today)]
+        result = await db.execute(text(f'SELECT COUNT(*) FROM "{partition_name(today)}"'))
+        assert result.scalar() == 1
+
+    try:
+        run_with_session(tmp_path, test)
+    finally:
+        get_partition_writer().reset()
@@ -0,0 +1,45 @@
+import fnmatch
+import random
+
+import pytest
+
+from app.method_patterns import MethodMatcher, method_pattern_errors
+
+GLOBS = ["com.*.get", "a?c", "[ab]x*", "x[!a-c]y", "*", "*.*.z", "a**b", "lit[", "[]]z", "a*b*c", "*abc*", "?", "a[*]b"]
+
+
+def test_precedence_exact_prefix_then_patterns_in_order():
+    matcher = MethodMatcher()
+    matcher.add("re:^com\\.a\\..*$", "regex")
+    matcher.add("com.a.*", "short-prefix")
+    matcher.add("com.a.get*", "long-prefix")
+    matcher.add("com.?.get", "glob")
+    matcher.add("com.a.get", "exact")
+    assert matcher.resolve("com.a.get") == ["exact", "long-prefix", "short-prefix", "regex", "glob"]
+    assert matcher.resolve("com.b.get") == ["glob"]
+    assert matcher.resolve("org.a.get") == []
+
+
+@pytest.mark.parametrize("pattern", GLOBS)
+def test_glob_trie_agrees_with_fnmatch(pattern):
+    matcher = MethodMatcher()
+    matcher.add(pattern, pattern)
+    rng = random.Random(pattern)
+    samples = ["", "com.x.get", "com..get", "abc", "a.c", "xdy", "xay", "q.w.z", "lit[", "]z", "aXbYc", "zzabczz", "a*b", "ab"]
+    samples += ["".join(rng.choice("abcxyz.*[]!") for _ in range(rng.randint(0, 7))) for _ in range(300)]
+    for method in samples:
+        matcher.resolved.clear()
+        assert bool(matcher.resolve(method)) == fnmatch.fnmatchcase(method, pattern), method
+
+
+def test_many_globs_only_return_matching_ones():
+    matcher = MethodMatcher()
+    for i in range(1000):
+        matcher.add(f"com.linspirer.g{i}.*.get", i)
+    assert matcher.resolve("com.linspirer.g42.tactics.get") == [42]
+    assert matcher.resolve("com.linspirer.g42.tactics.put") == []
+
+
+def test_invalid_regex_is_reported():
+    assert method_pattern_errors("re:(") != []
+    assert method_pattern_errors("com.*.get[") == []
@@ -0,0 +1,124 @@
+import asyncio
+from collections import OrderedDict
+
+import pytest
+
+from app.config import get_settings
+from app.resilience import CLOSED, HALF_OPEN, METHOD_STATE_MAX, OPEN, CircuitBreaker, ResilientUpstream, lru_get
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=3, open_seconds=10)
+    breaker.record_failure(0)
+    breaker.record_failure(1)
+    assert breaker.state == CLOSED
+    assert breaker.allow(1)
+
+    breaker.record_failure(2)
+    assert breaker.state == OPEN
+    assert not breaker.allow(3)
+    assert breaker.short_circuited == 1
+    assert breaker.retry_after(3) == 9
+
+
+def test_success_resets_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=2, open_seconds=10)
+    breaker.record_failure(0)
+    breaker.record_success()
+    breaker.record_failure(1)
+    assert breaker.state == CLOSED
+    assert breaker.consecutive_failures == 1
+
+
+def test_half_open_allows_a_single_probe():
+    breaker = CircuitBreaker(failure_threshold=1, open_seconds=10)
+    breaker.record_failure(0)
+    assert not breaker.allow(9.9)
+
+    assert breaker.allow(10)
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow(10)
+    assert not breaker.allow(11)
+
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.allow(11)
+
+
+def test_failed_probe_reopens():
+    breaker = CircuitBreaker(failure_threshold=5, open_seconds=10)
+    for now in range(5):
+        breaker.record_failure(now)
+    assert breaker.allow(20)
+    breaker.record_failure(20)
+    assert breaker.state == OPEN
+    assert breaker.retry_after(20) == 10
+    assert not breaker.allow(29)
+    assert breaker.allow(30)
+
+
+def test_released_probe_lets_next_request_probe():
+    breaker = CircuitBreaker(failure_threshold=1, open_seconds=1)
+    breaker.record_failure(0)
+    assert breaker.allow(1)
+    assert not breaker.allow(1)
+    breaker.release()
+    assert breaker.allow(1)
+    assert breaker.state == HALF_OPEN
+
+
+def test_reset_closes_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, open_seconds=60)
+    breaker.record_failure(0)
+    breaker.reset()
+    assert breaker.state == CLOSED
+    assert breaker.allow(1)
+    assert breaker.snapshot(1)["retry_after"] == 0
+
+
+def test_lru_get_keeps_recent_methods():
+    cache = OrderedDict()
+    for index in range(METHOD_STATE_MAX):
+        lru_get(cache, f"m{index}", object)
+    first = cache["m0"]
+    assert lru_get(cache, "m0", object) is first
+
+    lru_get(cache, "new", object)
+    assert len(cache) == METHOD_STATE_MAX
+    assert "m0" in cache
+    assert "m1" not in cache
+
+
+class HedgeConfig:
+    def get(self, key):
+        return {"hedge_enabled": True, "retry_max": 0}[key]
+
+    def on_change(self, listener):
+        pass
+
+
+def test_cancelled_caller_cancels_primary_during_hedge_wait():
+    async def main():
+        upstream = ResilientUpstream(get_settings(), HedgeConfig())
+        upstream.hedge_delay = lambda method: 10.0
+        started = asyncio.Event()
+        cancelled = []
+
+        async def slow_post(method, path, content, headers, tried):
+            started.set()
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                cancelled.append(method)
+                raise
+
+        upstream._timed_post = slow_post
+        caller = asyncio.create_task(upstream._send("m", "/", "", {}, True, set()))
+        await started.wait()
+        caller.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await caller
+        await asyncio.sleep(0)
+        assert cancelled == ["m"]
+
+    asyncio.run(main())
@@ -0,0 +1,48 @@
+import argparse
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import LOG_ARCHIVE_DIR, LOG_DB_PATH
+from app.log_archive import CODEC_SUFFIXES, DEFAULT_CODEC, LogArchive, archive_logs
+from app.models import china_now
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Move old request_logs partitions into compressed archive segments, or search them")
+    parser.add_argument("--db", default=LOG_DB_PATH, help="SQLite file holding request_logs")
+    parser.add_argument("--dir", default=LOG_ARCHIVE_DIR, help="Directory for archive segments")
+    parser.add_argument("--codec", choices=list(CODEC_SUFFIXES), default=DEFAULT_CODEC)
+    parser.add_argument("--days", type=int, default=30, help="Archive partitions that ended more than this many days ago")
+    parser.add_argument("--before", help="Archive partitions that ended before this time (ISO format), overrides --days")
+    parser.add_argument("--search", action="store_true", help="Search existing segments instead of archiving")
+    parser.add_argument("--since", help="Search: only rows created at or after this time (ISO format)")
+    parser.add_argument("--until", help="Search: only rows created before this time (ISO format)")
+    parser.add_argument("--method", help="Search: only rows of this RPC method")
+    parser.add_argument("--email", help="Search: only rows of this email")
+    parser.add_argument("--limit", type=int, default=50, help="Search: maximum rows printed")
+    args = parser.parse_args(argv)
+
+    if args.search:
+        archive = LogArchive(args.dir, args.db)
+        rows, total = archive.query(
+            datetime.fromisoformat(args.since) if args.since else None,
+            datetime.fromisoformat(args.until) if args.until else None,
+            args.method, args.email, None, args.limit, 0
+        )
+        for row in rows:
+            row["created_at"] = row["created_at"].isoformat() if row["created_at"] else None
+            print(json.dumps(row, ensure_ascii=False))
+        print(f"{len(rows)} of {total} matching rows", file=sys.stderr)
+        return
+
+    before = datetime.fromisoformat(args.before) if args.before else china_now().replace(tzinfo=None) - timedelta(days=args.days)
+    for result in archive_logs(before, args.db, args.dir, args.codec):
+        print(f"{result['partition']}: {result['rows']} rows -> {result['segment'] or '(empty, dropped)'} ({result['size']} bytes)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import argparse
+import asyncio
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+
+from app.database import LOG_DB_PATH
+from app.export import CONTENT_TYPES, serialize
+from app.repositories import LogsRepository
+
+
+async def export(args):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{args.db}")
+    session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    since = datetime.fromisoformat(args.since) if args.since else None
+    until = datetime.fromisoformat(args.until) if args.until else None
+
+    async def chunks():
+        async with session_maker() as db:
+            async for rows in LogsRepository.stream(
+                db, since, until, args.method, args.email, args.action,
+                include_bodies=not args.summary_only, chunk_size=args.chunk_size
+            ):
+                yield rows
+
+    out = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        async for data in serialize(args.format, chunks(), not args.summary_only, args.gzip):
+            out.write(data)
+    finally:
+        if args.output:
+            out.close()
+        await engine.dispose()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream request_logs to NDJSON or CSV with constant memory")
+    parser.add_argument("--db", default=LOG_DB_PATH, help="SQLite file holding request_logs")
+    parser.add_argument("--format", choices=list(CONTENT_TYPES), default="ndjson")
+    parser.add_argument("--gzip", action="store_true", help="Compress the output with gzip")
+    parser.add_argument("--output", "-o", help="Output file (default: stdout)")
+    parser.add_argument("--since", help="Only rows created at or after this time (ISO format)")
+    parser.add_argument("--until", help="Only rows created before this time (ISO format)")
+    parser.add_argument("--method", help="Only rows of this RPC method")
+    parser.add_argument("--email", help="Only rows of this email")
+    parser.add_argument("--action", help="Only rows with this interception action on request or response ('none' for untouched rows)")
+    parser.add_argument("--summary-only", action="store_true", help="Omit request/response bodies")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Rows fetched per query")
+    args = parser.parse_args(argv)
+    asyncio.run(export(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import os
+import random
+import sqlite3
+import sys
+import time
+import zlib
+from datetime import datetime, timedelta
+from typing import Iterator, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import DB_PATH, LOG_DB_PATH, backfill_devices, init_db_sync, rebuild_rule_targets
+from app.log_partitions import ensure_partition_sync, partition_key, partition_names_sync
+
+BATCH_SIZE = 10000
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+# 方法分布参考线上流量：心跳和命令轮询占绝大多数，策略拉取体积最大
+METHOD_PROFILE = [
+    ("com.linspirer.device.heartbeat", 0.42, 180),
+    ("com.linspirer.command.getcommand", 0.25, 400),
+    ("com.linspirer.tactics.gettactics", 0.12, 24000),
+    ("com.linspirer.device.setappusage", 0.09, 6000),
+    ("com.linspirer.app.getapplist", 0.06, 12000),
+    ("com.linspirer.user.login", 0.03, 900),
+    ("com.linspirer.device.uploadinfo", 0.03, 1500),
+]
+ACTION_PROFILE = [
+    (None, None, 0.90),
+    ("modify", None, 0.03),
+    ("randomize_app_duration", None, 0.04),
+    (None, "replace", 0.03),
+]
+COMMAND_STATUS_PROFILE = [("unverified", 0.6), ("verified", 0.3), ("rejected", 0.1)]
+MODELS = ["HUAWEI BAH3-W59", "Lenovo TB-J606F", "MatePad 11", "Redmi Pad", "Lenovo TB-X6C6F"]
+
+
+def make_emails(count: int) -> List[str]:
+    return [f"student{i:06d}@school{i % 97:02d}.edu.cn" for i in range(count)]
+
+
+class EmailPicker:
+    # 幂律分布：少数设备产生大部分流量
+    def __init__(self, rng: random.Random, emails: List[str], skew: float):
+        self.rng = rng
+        self.emails = emails
+        weights = [1.0 / math.pow(i + 1, skew) for i in range(len(emails))]
+        total = sum(weights)
+        acc = 0.0
+        self.cumulative = []
+        for w in weights:
+            acc += w / total
+            self.cumulative.append(acc)
+
+    def pick(self) -> str:
+        x = self.rng.random()
+        lo, hi = 0, len(self.cumulative) - 1
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.cumulative[mid] < x:
+                lo = mid + 1
+            else:
+                hi = mid
+        return self.emails[lo]
+
+
+def weighted(rng: random.Random, profile, weight_index: int):
+    x = rng.random()
+    acc = 0.0
+    for item in profile:
+        acc += item[weight_index]
+        if x <= acc:
+            return item
+    return profile[-1]
+
+
+def body_size(rng: random.Random, mean: int) -> int:
+    # 对数正态分布，均值约为 mean，偶有超大响应
+    return max(16, int(rng.lognormvariate(math.log(mean) - 0.5, 1.0)))
+
+
+def filler(rng: random.Random, size: int) -> str:
+    return "".join(rng.choice("abcdefghijklmnopqrstuvwxyz0123456789") for _ in range(min(size, 64))) * (size // 64 + 1)
+
+
+def generate_logs(rng: random.Random, count: int, emails: List[str], skew: float, start: datetime, end: datetime) -> Iterator[Tuple]:
+    picker = EmailPicker(rng, emails, skew)
+    span = (end - start).total_seconds()
+    step = span / max(count, 1)
+    for i in range(count):
+        method, _, mean_size = weighted(rng, METHOD_PROFILE, 1)
+        email = picker.pick()
+        req_action, resp_action, _ = weighted(rng, ACTION_PROFILE, 2)
+        created_at = start + timedelta(seconds=i * step + rng.random() * step)
+
+        params = {"email": email, "model": rng.choice(MODELS), "swdid": f"swd{zlib.crc32(email.encode()) & 0xffffff:06x}"}
+        if method == "com.linspirer.device.setappusage":
+            params["logs"] = [{"mPackageName": "com.kingsoft", "mBeginTimeStamp": 1700000000000 + j, "mEndTimeStamp": 1700000600000 + j}
+                              for j in range(rng.randint(1, 40))]
+        request_body = json.dumps({"method": method, "id": i, "!version": 6, "client_version": "5.04", "params": params})
+        response_body = json.dumps({"code": 0, "data": {"type": "object", "data": {"blob": filler(rng, body_size(rng, mean_size))}}})
+
+        intercepted_request = request_body if req_action else None
+        intercepted_response = response_body if resp_action else None
+        yield (method, request_body, response_body, intercepted_request, intercepted_response,
+               req_action, resp_action, email, created_at.strftime(TIME_FORMAT))
+
+
+def generate_rules(rng: random.Random, count: int, emails: List[str], start: datetime) -> Iterator[Tuple]:
+    methods = [m for m, _, _ in METHOD_PROFILE]
+    for i in range(count):
+        method = rng.choice(methods)
+        is_global = i < len(methods)
+        if is_global:
+            method = methods[i]
+            email = None
+        else:
+            email = ",".join(rng.sample(emails, min(len(emails), rng.randint(1, 20))))
+        action = rng.choice(["passthrough", "modify", "replace", "randomize_app_duration"])
+        custom_response = json.dumps({"code": 0, "data": {"type": "object", "data": {}}}) if action in ("modify", "replace") else None
+        created_at = (start + timedelta(minutes=i)).strftime(TIME_FORMAT)
+        yield (method, email, action, custom_response, f"synthetic rule {i}", rng.random() < 0.9, is_global, created_at, created_at)
+
+
+def generate_commands(rng: random.Random, count: int, emails: List[str], start: datetime, end: datetime) -> Iterator[Tuple]:
+    span = (end - start).total_seconds()
+    for i in range(count):
+        status = weighted(rng, COMMAND_STATUS_PROFILE, 1)[0]
+        received_at = start + timedelta(seconds=rng.random() * span)
+        command = {
+            "id": i,
+            "cmdtype": rng.choice(["lock", "unlock", "install", "uninstall", "message"]),
+            "touser": rng.choice(emails),
+            "title": f"command {i}",
+            "priority": rng.randint(0, 3),
+            "created_at": received_at.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        processed_at = (received_at + timedelta(minutes=rng.randint(1, 600))).strftime(TIME_FORMAT) if status != "unverified" else None
+        yield (json.dumps(command), status, received_at.strftime(TIME_FORMAT), processed_at, None)
+
+
+def bulk_insert(conn: sqlite3.Connection, sql: str, rows: Iterator[Tuple], label: str, total: int):
+    started = time.perf_counter()
+    batch = []
+    done = 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            conn.executemany(sql, batch)
+            done += len(batch)
+            batch = []
+            print(f"\r{label}: {done}/{total}", end="", flush=True)
+    if batch:
+        conn.executemany(sql, batch)
+        done += len(batch)
+    conn.commit()
+    print(f"\r{label}: {done}/{total} in {time.perf_counter() - started:.1f}s")
+
+
+def insert_logs(conn: sqlite3.Connection, rows: Iterator[Tuple], total: int):
+    # 生成的日志按时间递增，逐天写入对应的分区表
+    started = time.perf_counter()
+    done = 0
+    for key, group in itertools.groupby(rows, key=lambda row: partition_key(datetime.fromisoformat(row[8][:10]))):
+        table = ensure_partition_sync(conn, key)
+        sql = (f"INSERT INTO {table} (method, request_body, response_body, intercepted_request, intercepted_response, "
+               "request_interception_action, response_interception_action, email, created_at, json_validated) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 1)")
+        while True:
+            batch = list(itertools.islice(group, BATCH_SIZE))
+            if not batch:
+                break
+            conn.executemany(sql, batch)
+            done += len(batch)
+            print(f"\rrequest_logs: {done}/{total}", end="", flush=True)
+    conn.commit()
+    print(f"\rrequest_logs: {done}/{total} in {time.perf_counter() - started:.1f}s")
+
+
+def bulk_connection(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path)
+    # 仅对本连接生效：批量导入期间关闭同步写盘
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("PRAGMA cache_size = -200000")
+    return conn
+
+
+def generate(args):
+    init_db_sync(args.db, args.log_db)
+    rng = random.Random(args.seed)
+    emails = make_emails(args.emails)
+    end = datetime.fromisoformat(args.end)
+    start = end - timedelta(days=args.days)
+
+    conn = bulk_connection(args.db)
+    log_conn = bulk_connection(args.log_db)
+    try:
+        if args.reset:
+            for table in ("interception_rules", "rule_targets", "commands", "devices", "device_methods"):
+                conn.execute(f"DELETE FROM {table}")
+            conn.commit()
+            for table in partition_names_sync(log_conn):
+                log_conn.execute(f"DROP TABLE {table}")
+            log_conn.commit()
+
+        if args.rules:
+            bulk_insert(conn,
+                "INSERT INTO interception_rules (method_name, email, action, custom_response, remark, is_enabled, is_global, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                generate_rules(random.Random(args.seed + 1), args.rules, emails, start), "interception_rules", args.rules)
+            rebuild_rule_targets(conn.cursor())
+            conn.commit()
+        if args.commands:
+            bulk_insert(conn,
+                "INSERT INTO commands (command_json, status, received_at, processed_at, notes) VALUES (?, ?, ?, ?, ?)",
+                generate_commands(random.Random(args.seed + 2), args.commands, emails, start, end), "commands", args.commands)
+        if args.logs:
+            insert_logs(log_conn, generate_logs(rng, args.logs, emails, args.email_skew, start, end), args.logs)
+            # 直接写入的日志不经过代理，设备表按日志重新汇总
+            conn.commit()
+            log_conn.commit()
+            backfill_devices(args.db, args.log_db)
+        for c in (conn, log_conn):
+            c.execute("ANALYZE")
+            c.commit()
+    finally:
+        conn.close()
+        log_conn.close()
+
+
+async def time_queries(db_path: str, log_db_path: str, repeat: int):
+    from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+    from app.models import RequestLog
+    from app.repositories import DevicesRepository, LogsRepository
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    log_engine = create_async_engine(f"sqlite+aiosqlite:///{log_db_path}")
+    session_maker = async_sessionmaker(engine, binds={RequestLog: log_engine}, class_=AsyncSession, expire_on_commit=False)
+
+    # 与管理接口使用相同的仓储调用
+    async def logs_page(db):
+        await LogsRepository.list(db, None, None, 50, 0)
+
+    async def logs_stats(db):
+        await LogsRepository.list(db, None, None, 1, 0)
+        await LogsRepository.list_methods(db)
+        await DevicesRepository.list_emails(db)
+
+    async def logs_emails(db):
+        await DevicesRepository.list_emails(db)
+
+    async def logs_search(db):
+        await LogsRepository.list(db, None, "student000042", 50, 0)
+
+    cases = [("/api/logs", logs_page), ("/api/logs?search=", logs_search),
+             ("/api/logs/stats", logs_stats), ("/api/logs/emails", logs_emails)]
+    try:
+        for label, fn in cases:
+            timings = []
+            for _ in range(repeat):
+                async with session_maker() as db:
+                    started = time.perf_counter()
+                    await fn(db)
+                    timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            print(f"{label:<24} min {timings[0]:10.1f} ms   median {timings[len(timings) // 2]:10.1f} ms")
+    finally:
+        await engine.dispose()
+        await log_engine.dispose()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk-load deterministic synthetic data for admin query benchmarking")
+    parser.add_argument("--db", default=DB_PATH, help="SQLite file to populate (created with the app schema if missing)")
+    parser.add_argument("--log-db", default=LOG_DB_PATH, help="SQLite file for request_logs")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed; the same seed always produces the same data")
+    parser.add_argument("--logs", type=int, default=1_000_000, help="Number of request_logs rows")
+    parser.add_argument("--rules", type=int, default=2000, help="Number of interception_rules rows")
+    parser.add_argument("--commands", type=int, default=50000, help="Number of commands rows")
+    parser.add_argument("--emails", type=int, default=20000, help="Distinct device emails")
+    parser.add_argument("--email-skew", type=float, default=1.1, help="Power-law exponent of traffic per email")
+    parser.add_argument("--days", type=int, default=30, help="Time span covered by the generated rows")
+    parser.add_argument("--end", default="2024-06-01T00:00:00", help="Timestamp of the newest generated row")
+    parser.add_argument("--reset", action="store_true", help="Delete existing logs, rules and commands first")
+    parser.add_argument("--time", type=int, default=0, metavar="N",
+                        help="After loading, time the queries behind the logs admin endpoints N times each")
+    args = parser.parse_args(argv)
+
+    if args.logs or args.rules or args.commands:
+        generate(args)
+    if args.time:
+        asyncio.run(time_queries(args.db, args.log_db, args.time))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import sys
+import time
+from collections import defaultdict, deque
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request, Response
+
+from app.config import get_settings
+from app.crypto import Cryptor
+from app.database import LOG_DB_PATH
+from app.log_partitions import partition_names_sync
+from app.tactics import TACTICS_ACTION
+from app.transforms import get_transform_registry
+
+logger = logging.getLogger("replay")
+
+FETCH_SIZE = 500
+# 响应由代理自己生成（策略模板或直接应答的规则）的请求没有到达上游
+LOCAL_RESPONSE_ACTIONS = get_transform_registry().responder_names() | {TACTICS_ACTION}
+
+
+class RecordedExchange:
+    def __init__(self, row: sqlite3.Row):
+        self.id = row["id"]
+        self.method = row["method"] or ""
+        self.email = row["email"]
+        self.created_at = parse_time(row["created_at"])
+        self.request = loads_or_none(row["request_body"]) or {}
+        # 上游实际收到的是规则改写后的请求
+        self.upstream_request = loads_or_none(row["intercepted_request"]) or self.request
+        self.response_body = row["response_body"] or ""
+        self.replaced = row["response_interception_action"] in LOCAL_RESPONSE_ACTIONS
+
+
+def loads_or_none(value: Optional[str]) -> Optional[Any]:
+    if not value:
+        return None
+    try:
+        return json.loads(value)
+    except json.JSONDecodeError:
+        return None
+
+
+def parse_time(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        return None
+
+
+def params_key(method: str, params: Any) -> str:
+    return method + "\x00" + json.dumps(params, sort_keys=True, ensure_ascii=False)
+
+
+def iter_exchanges(
+    db_path: str,
+    method: Optional[str] = None,
+    email: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    limit: Optional[int] = None
+) -> Iterator[RecordedExchange]:
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    conn.row_factory = sqlite3.Row
+    conditions = ""
+    args: List[Any] = []
+    if method:
+        conditions += " AND method = ?"
+        args.append(method)
+    if email:
+        conditions += " AND email = ?"
+        args.append(email)
+    if since:
+        conditions += " AND created_at >= ?"
+        args.append(since)
+    if until:
+        conditions += " AND created_at < ?"
+        args.append(until)
+
+    try:
+        # 日志按天分区，id 全局递增；回放目标通常写入同一个库，固定上界避免重放自己产生的日志
+        tables = partition_names_sync(conn)
+        max_id = 0
+        for table in reversed(tables):
+            max_id = conn.execute(f"SELECT MAX(id) FROM {table}").fetchone()[0] or 0
+            if max_id:
+                break
+        remaining = limit
+        for table in tables:
+            last_id = 0
+            while remaining is None or remaining > 0:
+                size = FETCH_SIZE if remaining is None else min(FETCH_SIZE, remaining)
+                # 按主键分块读取，每块一个短查询，不长期占用读锁
+                rows = conn.execute(
+                    f"SELECT * FROM {table} WHERE id > ? AND id <= ?{conditions} ORDER BY id LIMIT ?",
+                    [last_id, max_id, *args, size]
+                ).fetchall()
+                if not rows:
+                    break
+                for row in rows:
+                    yield RecordedExchange(row)
+                last_id = rows[-1]["id"]
+                if remaining is not None:
+                    remaining -= len(rows)
+    finally:
+        conn.close()
+
+
+def build_proxy_request(cryptor: Cryptor, exchange: RecordedExchange) -> str:
+    request = {k: v for k, v in exchange.request.items() if k != "_rule_info"}
+    if "params" in request:
+        request["params"] = cryptor.encrypt(json.dumps(request["params"]))
+    return json.dumps(request)
+
+
+class StandInUpstream:
+    def __init__(self, cryptor: Cryptor):
+        self.cryptor = cryptor
+        self.by_key: Dict[str, deque] = defaultdict(deque)
+        self.by_method: Dict[str, deque] = defaultdict(deque)
+        self.misses = 0
+        self.app = FastAPI()
+        self.app.add_api_route("/{path:path}", self.handle, methods=["POST"])
+
+    def expect(self, exchange: RecordedExchange):
+        entry = {"body": exchange.response_body, "used": False}
+        params = exchange.upstream_request.get("params", {}) if isinstance(exchange.upstream_request, dict) else {}
+        self.by_key[params_key(exchange.method, params)].append(entry)
+        self.by_method[exchange.method].append(entry)
+
+    def take(self, method: str, params: Any) -> Optional[str]:
+        # 优先精确匹配参数，随机化类规则改写过的请求按方法顺序回退
+        for queue in (self.by_key.get(params_key(method, params)), self.by_method.get(method)):
+            while queue:
+                entry = queue.popleft()
+                if not entry["used"]:
+                    entry["used"] = True
+                    return entry["body"]
+        return None
+
+    async def handle(self, request: Request, path: str):
+        try:
+            payload = json.loads(await request.body())
+            params = payload.get("params", {})
+            if isinstance(params, str):
+                params = json.loads(self.cryptor.decrypt(params))
+            body = self.take(payload.get("method", ""), params)
+        except (ValueError, AttributeError):
+            body = None
+
+        if body is None:
+            self.misses += 1
+            return Response(status_code=404, content="no recorded response")
+        return Response(content=self.cryptor.encrypt(body), media_type="application/json")
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class ReplayReport:
+    def __init__(self, max_diffs: int = 20):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.status_counts: Dict[int, int] = defaultdict(int)
+        self.errors = 0
+        self.diff_count = 0
+        self.diffs: List[Dict[str, Any]] = []
+        self.max_diffs = max_diffs
+
+    def record(self, exchange: RecordedExchange, latency_ms: float, status: int, actual: Optional[str]):
+        self.latencies[exchange.method].append(latency_ms)
+        self.status_counts[status] += 1
+        expected = loads_or_none(exchange.response_body)
+        received = loads_or_none(actual)
+        if expected is None or received is None:
+            same = (actual or "") == exchange.response_body
+        else:
+            same = expected == received
+        if not same:
+            self.diff_count += 1
+            if len(self.diffs) < self.max_diffs:
+                self.diffs.append({
+                    "log_id": exchange.id,
+                    "method": exchange.method,
+                    "status": status,
+                    "expected": exchange.response_body[:500],
+                    "actual": (actual or "")[:500],
+                })
+
+    def summary(self) -> Dict[str, Any]:
+        methods = {}
+        all_values: List[float] = []
+        for method, values in self.latencies.items():
+            values.sort()
+            all_values.extend(values)
+            methods[method] = self.stats(values)
+        all_values.sort()
+        return {
+            "total": len(all_values),
+            "errors": self.errors,
+            "status_counts": dict(self.status_counts),
+            "diff_count": self.diff_count,
+            "latency_ms": self.stats(all_values),
+            "methods": methods,
+            "diffs": self.diffs,
+        }
+
+    @staticmethod
+    def stats(values: List[float]) -> Dict[str, float]:
+        return {
+            "count": len(values),
+            "p50": round(percentile(values, 50), 2),
+            "p90": round(percentile(values, 90), 2),
+            "p95": round(percentile(values, 95), 2),
+            "p99": round(percentile(values, 99), 2),
+            "max": round(values[-1], 2) if values else 0.0,
+        }
+
+
+async def replay(args, cryptor: Cryptor) -> Dict[str, Any]:
+    report = ReplayReport(args.max_diffs)
+    upstream = None
+    server = None
+    if args.upstream_port:
+        upstream = StandInUpstream(cryptor)
+        server = uvicorn.Server(uvicorn.Config(upstream.app, host=args.upstream_host, port=args.upstream_port, log_level="warning"))
+        server_task = asyncio.create_task(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.05)
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    tasks = set()
+    target = args.proxy.rstrip("/") + "/public-interface.php"
+
+    async def fire(client: httpx.AsyncClient, exchange: RecordedExchange):
+        try:
+            body = build_proxy_request(cryptor, exchange)
+            started = time.perf_counter()
+            response = await client.post(target, content=body, headers={"Content-Type": "application/json"})
+            latency_ms = (time.perf_counter() - started) * 1000
+            try:
+                actual = cryptor.decrypt(response.text)
+            except ValueError:
+                actual = response.text
+            report.record(exchange, latency_ms, response.status_code, actual)
+        except Exception as e:
+            report.errors += 1
+            logger.warning(f"Replay of log {exchange.id} failed: {e}")
+        finally:
+            semaphore.release()
+
+    first_recorded = None
+    started_at = time.monotonic()
+    async with httpx.AsyncClient(timeout=args.timeout, limits=httpx.Limits(max_connections=args.concurrency)) as client:
+        for exchange in iter_exchanges(args.db, args.method, args.email, args.since, args.until, args.limit):
+            if args.speed > 0 and exchange.created_at is not None:
+                if first_recorded is None:
+                    first_recorded = exchange.created_at
+                delay = (exchange.created_at - first_recorded) / args.speed - (time.monotonic() - started_at)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+            await semaphore.acquire()
+            if upstream and not exchange.replaced:
+                upstream.expect(exchange)
+            task = asyncio.create_task(fire(client, exchange))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        if tasks:
+            await asyncio.gather(*tasks)
+
+    summary = report.summary()
+    summary["elapsed_s"] = round(time.monotonic() - started_at, 3)
+    if upstream:
+        summary["upstream_misses"] = upstream.misses
+        server.should_exit = True
+        await server_task
+    return summary
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Replay recorded request_logs traffic against a running proxy")
+    parser.add_argument("--db", default=LOG_DB_PATH, help="SQLite file holding request_logs")
+    parser.add_argument("--proxy", default="http://127.0.0.1:8080", help="Base URL of the proxy under test")
+    parser.add_argument("--method", help="Only replay this RPC method")
+    parser.add_argument("--email", help="Only replay traffic of this email")
+    parser.add_argument("--since", help="Only replay rows created at or after this time (YYYY-MM-DD HH:MM:SS)")
+    parser.add_argument("--until", help="Only replay rows created before this time")
+    parser.add_argument("--limit", type=int, help="Maximum number of rows to replay")
+    parser.add_argument("--speed", type=float, default=0.0,
+                        help="Timing multiplier: 1 replays at the recorded pace, 10 is ten times faster, 0 fires as fast as concurrency allows")
+    parser.add_argument("--concurrency", type=int, default=32, help="Maximum in-flight requests")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout in seconds")
+    parser.add_argument("--upstream-host", default="127.0.0.1", help="Bind address of the stand-in upstream")
+    parser.add_argument("--upstream-port", type=int, default=0,
+                        help="Serve recorded responses on this port; point LINSPIRER_TARGET_URL of the proxy at it")
+    parser.add_argument("--max-diffs", type=int, default=20, help="Number of response diffs to include in the report")
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    settings = get_settings()
+    cryptor = Cryptor(key=settings.LINSPIRER_KEY.encode(), iv=settings.LINSPIRER_IV.encode())
+
+    summary = asyncio.run(replay(args, cryptor))
+    output = json.dumps(summary, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+    return 1 if summary["errors"] or summary["diff_count"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())